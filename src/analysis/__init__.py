@@ -0,0 +1,16 @@
+from .calibration import AbcCalibration, CalibrationResult, DistanceExceeded
+from .comparison import Scenario, PairedDifference, compare_scenarios
+from .sensitivity import SensitivityAnalysis, SobolResult, MorrisResult, default_bounds
+
+__all__ = [
+    "AbcCalibration",
+    "CalibrationResult",
+    "DistanceExceeded",
+    "Scenario",
+    "PairedDifference",
+    "compare_scenarios",
+    "SensitivityAnalysis",
+    "SobolResult",
+    "MorrisResult",
+    "default_bounds"
+]
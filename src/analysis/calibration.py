@@ -0,0 +1,159 @@
+## @package calibration
+#  Approximate Bayesian computation (ABC) rejection calibration of disease parameters.
+#
+#  Candidate parameters are drawn from priors and simulated in parallel. The distance between
+#  the simulated and the observed series is accumulated day by day, and since it can only grow,
+#  a run is stopped as soon as it exceeds the acceptance threshold. Compute is therefore only
+#  spent on candidates that are still plausible.
+
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from models import SimulationParameters, UniformDistribution, IntegerDistribution
+from simulation import Simulation, StopCondition
+
+## Default priors of the calibrated parameters.
+DEFAULT_PRIORS = {
+    "transmission_rate": UniformDistribution(0.0, 1.0),
+    "incubation_period": IntegerDistribution(0, 14),
+    "infectious_period": IntegerDistribution(1, 21),
+}
+
+## Series of a StepRecord that can be compared with the observations.
+SERIES = ("susceptible", "infected", "recovered")
+
+
+##
+# Stops a run once the sum of squared differences to the observed series exceeds a threshold.
+class DistanceExceeded(StopCondition):
+    ##
+    # @param target: Observed values, one per day starting with day 1.
+    # @param threshold: Largest accepted distance.
+    # @param series: Name of the compared StepRecord field.
+    # Raises ValueError if the series is unknown.
+    def __init__(self, target, threshold, series="infected"):
+        if series not in SERIES:
+            raise ValueError(f"Unknown series: {series}")
+        self.target = target
+        self.threshold = threshold
+        self.series = series
+        self.reset()
+
+    def reset(self):
+        self.distance = 0.0
+        self.exceeded = False
+
+    def should_stop(self, record):
+        difference = getattr(record, self.series) - self.target[record.day - 1]
+        self.distance += difference * difference
+        self.exceeded = self.distance > self.threshold
+        return self.exceeded
+
+
+##
+# Result of a calibration run.
+@dataclasses.dataclass
+class CalibrationResult:
+    accepted: list        # (SimulationParameters, distance) of the accepted candidates
+    evaluated: int        # Number of simulated candidates
+    days_simulated: int   # Days simulated over all candidates
+    days_full: int        # Days all candidates would have needed without early rejection
+
+    ##
+    # Returns the share of the full simulation days that early rejection saved.
+    @property
+    def days_saved(self):
+        if self.days_full == 0:
+            return 0.0
+        return 1 - self.days_simulated / self.days_full
+
+    ##
+    # Returns the accepted values of one parameter as an array (the approximate posterior sample).
+    # @param name: Name of a SimulationParameters field.
+    def posterior(self, name):
+        return np.array([getattr(params, name) for params, _ in self.accepted])
+
+
+##
+# Simulates one candidate until the end of the target or until it is rejected.
+# Module-level so it can run in worker processes.
+# @param task: Tuple of (SimulationParameters, seed, target, threshold, series).
+# @return: Tuple of the distance (None if rejected) and the number of simulated days.
+def _evaluate(task):
+    params, seed, target, threshold, series = task
+    simulation = Simulation()
+    simulation.setup_simulation(params, seed=seed)
+    condition = DistanceExceeded(target, threshold, series)
+    days = simulation.run_simulation(len(target), [condition])
+    return (None if condition.exceeded else condition.distance), days
+
+
+class AbcCalibration:
+    ##
+    # Initializes the calibration.
+    # @param base_params: SimulationParameters providing the values that are not calibrated.
+    # @param target: Observed values of the series, one per day starting with day 1.
+    # @param threshold: Largest accepted sum of squared differences.
+    # @param priors: Dictionary of parameter name to Distribution (defaults to DEFAULT_PRIORS).
+    # @param series: Compared series: "susceptible", "infected" or "recovered".
+    # @param workers: Number of worker processes; 1 runs the candidates in this process.
+    # Raises ValueError if a prior refers to an unknown parameter or the series is unknown.
+    def __init__(self, base_params, target, threshold, priors=None, series="infected", workers=None):
+        self.priors = dict(DEFAULT_PRIORS if priors is None else priors)
+        fields = {field.name for field in dataclasses.fields(SimulationParameters)}
+        for name in self.priors:
+            if name not in fields:
+                raise ValueError(f"Unknown parameter: {name}")
+        if series not in SERIES:
+            raise ValueError(f"Unknown series: {series}")
+        self.base_params = base_params
+        self.target = [int(value) for value in target]
+        self.threshold = threshold
+        self.series = series
+        self.workers = workers
+
+    ##
+    # Draws candidate parameters from the priors.
+    # Candidates with invalid parameter combinations are rejected by SimulationParameters and redrawn.
+    # @param count: Number of candidates.
+    # @param rng: numpy random Generator.
+    # @return: List of SimulationParameters.
+    def sample_candidates(self, count, rng):
+        candidates = []
+        while len(candidates) < count:
+            missing = count - len(candidates)
+            draws = {name: prior.sample(rng, missing).tolist() for name, prior in self.priors.items()}
+            for i in range(missing):
+                values = dataclasses.asdict(self.base_params)
+                values.update({name: draws[name][i] for name in draws})
+                try:
+                    candidates.append(SimulationParameters(**values))
+                except ValueError:
+                    continue
+        return candidates
+
+    ##
+    # Runs the calibration.
+    # @param count: Number of candidates to evaluate.
+    # @param seed: Optional seed for the candidate draws and the simulation runs.
+    # @return: CalibrationResult with the accepted candidates, sorted by distance.
+    def run(self, count, seed=None):
+        rng = np.random.default_rng(seed)
+        candidates = self.sample_candidates(count, rng)
+        seeds = rng.integers(0, 2**32, count).tolist()
+        tasks = [(params, run_seed, self.target, self.threshold, self.series)
+                 for params, run_seed in zip(candidates, seeds)]
+
+        if self.workers == 1:
+            outcomes = list(map(_evaluate, tasks))
+        else:
+            with ProcessPoolExecutor(self.workers) as executor:
+                outcomes = list(executor.map(_evaluate, tasks, chunksize=max(1, count // 64)))
+
+        accepted = sorted(((params, distance) for params, (distance, _) in zip(candidates, outcomes)
+                           if distance is not None), key=lambda item: item[1])
+        return CalibrationResult(accepted=accepted,
+                                 evaluated=count,
+                                 days_simulated=sum(days for _, days in outcomes),
+                                 days_full=count * len(self.target))
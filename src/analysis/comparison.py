@@ -0,0 +1,119 @@
+## @package comparison
+#  Paired comparison of two scenarios using common random numbers.
+#
+#  Each replicate runs both scenarios with the same seed, so they share the population draw,
+#  the choice of patient zero and the contact, transmission and infection draws of every pair
+#  both scenarios consider (see RandomStreams.keyed_uniforms). The per-replicate
+#  differences of the outcome metrics then vary much less than differences of independent runs,
+#  and fewer replicates are needed for a given precision.
+
+import dataclasses
+from statistics import NormalDist
+import numpy as np
+
+from simulation import Simulation
+
+
+##
+# Peak number of infected persons.
+def peak_infected(simulation):
+    return max(simulation.stats.i_history, default=0)
+
+##
+# Day on which the number of infected persons peaked.
+def peak_day(simulation):
+    history = simulation.stats.i_history
+    return int(np.argmax(history)) + 1 if history else 0
+
+##
+# Share of the population infected at least once; reinfections of a person do not count again.
+def attack_rate(simulation):
+    return float(simulation.ever_infected.mean())
+
+## Outcome metrics compared by default.
+DEFAULT_METRICS = {
+    "peak_infected": peak_infected,
+    "peak_day": peak_day,
+    "attack_rate": attack_rate,
+}
+
+
+##
+# A scenario: simulation parameters and an optional function configuring the set-up simulation
+# (e.g. enabling social distancing or attaching an intervention schedule).
+@dataclasses.dataclass
+class Scenario:
+    params: object
+    configure: object = None
+
+
+##
+# Paired difference (scenario B minus scenario A) of one metric.
+@dataclasses.dataclass
+class PairedDifference:
+    metric: str
+    mean: float
+    std_error: float
+    ci_low: float
+    ci_high: float
+    replicates: int
+    efficiency: float   # Variance of independent differences divided by the paired variance
+
+    ##
+    # Returns True if the confidence interval excludes zero.
+    @property
+    def significant(self):
+        return self.ci_low > 0 or self.ci_high < 0
+
+
+##
+# Runs one scenario with the given seed and evaluates the metrics.
+def _run(scenario, days, seed, metrics):
+    simulation = Simulation()
+    simulation.setup_simulation(scenario.params, seed=seed)
+    if scenario.configure is not None:
+        scenario.configure(simulation)
+    simulation.run_simulation(days)
+    return [metric(simulation) for metric in metrics.values()]
+
+
+##
+# Compares two scenarios over paired replicates.
+# @param scenario_a: The baseline Scenario.
+# @param scenario_b: The compared Scenario.
+# @param days: Number of days to simulate.
+# @param replicates: Number of paired replicates (at least 2).
+# @param seed: Seed of the first replicate; replicate i uses seed + i.
+# @param metrics: Dictionary of metric name to function(simulation) -> float.
+# @param confidence: Confidence level of the intervals (normal approximation).
+# @return: Dictionary of metric name to PairedDifference.
+# Raises ValueError if fewer than 2 replicates are requested.
+def compare_scenarios(scenario_a, scenario_b, days, replicates=30, seed=0, metrics=None, confidence=0.95):
+    if replicates < 2:
+        raise ValueError("At least 2 replicates are required")
+    metrics = DEFAULT_METRICS if metrics is None else metrics
+
+    values_a = np.empty((replicates, len(metrics)))
+    values_b = np.empty((replicates, len(metrics)))
+    for i in range(replicates):
+        values_a[i] = _run(scenario_a, days, seed + i, metrics)
+        values_b[i] = _run(scenario_b, days, seed + i, metrics)
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    differences = values_b - values_a
+    mean = differences.mean(axis=0)
+    variance = differences.var(axis=0, ddof=1)
+    independent_variance = values_a.var(axis=0, ddof=1) + values_b.var(axis=0, ddof=1)
+    std_error = np.sqrt(variance / replicates)
+
+    results = {}
+    for j, name in enumerate(metrics):
+        efficiency = independent_variance[j] / variance[j] if variance[j] > 0 else float("inf")
+        results[name] = PairedDifference(metric=name,
+                                         mean=float(mean[j]),
+                                         std_error=float(std_error[j]),
+                                         ci_low=float(mean[j] - z * std_error[j]),
+                                         ci_high=float(mean[j] + z * std_error[j]),
+                                         replicates=replicates,
+                                         efficiency=float(efficiency))
+    return results
@@ -0,0 +1,279 @@
+## @package sensitivity
+#  Global sensitivity analysis of the simulation outcomes.
+#
+#  Sobol indices are estimated from a Saltelli design and Morris elementary effects from random
+#  trajectories on a grid. Parameter points are evaluated in batches on a pool of worker processes;
+#  points that are identical after rounding the integer parameters are simulated only once.
+#  The indices are updated from running sums after every batch, so partial results are available
+#  long before the study is complete.
+
+import dataclasses
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from models import SimulationParameters
+from simulation import Simulation
+from .comparison import peak_infected, attack_rate
+
+## Outcome metrics analysed by default.
+DEFAULT_METRICS = {
+    "peak_infected": peak_infected,
+    "attack_rate": attack_rate,
+}
+
+## Parameters with integer values.
+INTEGER_PARAMETERS = ("young_population", "middle_population", "old_population",
+                      "incubation_period", "infectious_period")
+
+
+##
+# Returns default ranges of all numeric parameters: the disease parameters over their plausible
+# ranges and the age group sizes from half to one and a half times their base value.
+# @param base_params: SimulationParameters providing the base group sizes.
+# @return: Dictionary of parameter name to (low, high).
+def default_bounds(base_params):
+    bounds = {}
+    for name in ("young_population", "middle_population", "old_population"):
+        size = getattr(base_params, name)
+        bounds[name] = (size // 2, size + size // 2)
+    bounds.update(transmission_rate=(0.0, 1.0), incubation_period=(0, 14), infectious_period=(1, 21))
+    return bounds
+
+
+##
+# Sobol indices estimated so far.
+@dataclasses.dataclass
+class SobolResult:
+    parameters: list    # Names of the varied parameters
+    first_order: dict   # Metric name to array of first-order indices, one per parameter
+    total: dict         # Metric name to array of total-order indices, one per parameter
+    samples: int        # Number of base samples used
+    evaluations: int    # Number of simulated parameter points (after deduplication)
+
+
+##
+# Morris screening measures estimated so far.
+@dataclasses.dataclass
+class MorrisResult:
+    parameters: list    # Names of the varied parameters
+    mu: dict            # Metric name to array of mean elementary effects
+    mu_star: dict       # Metric name to array of mean absolute elementary effects
+    sigma: dict         # Metric name to array of standard deviations of the elementary effects
+    trajectories: int   # Number of trajectories used
+    evaluations: int    # Number of simulated parameter points (after deduplication)
+
+
+##
+# Simulates one parameter point and evaluates the metrics.
+# Module-level so it can run in worker processes.
+# @param task: Tuple of (parameter values dictionary, days, seed, metrics).
+# @return: List of metric values.
+def _evaluate(task):
+    values, days, seed, metrics = task
+    simulation = Simulation()
+    simulation.setup_simulation(SimulationParameters(**values), seed=seed)
+    simulation.run_simulation(days)
+    return [float(metric(simulation)) for metric in metrics.values()]
+
+
+class SensitivityAnalysis:
+    ##
+    # Initializes the analysis.
+    # @param base_params: SimulationParameters providing the values of parameters that are not varied.
+    # @param days: Number of days simulated per parameter point.
+    # @param bounds: Optional dictionary of parameter name to (low, high) (defaults to default_bounds).
+    # @param metrics: Dictionary of metric name to function(simulation) -> float (defaults to DEFAULT_METRICS).
+    # @param seed: Seed of the sample design and of every simulation (common random numbers).
+    # @param workers: Number of worker processes; 1 evaluates the points in this process.
+    # Raises ValueError if a bound refers to an unknown parameter or is empty.
+    def __init__(self, base_params, days, bounds=None, metrics=None, seed=0, workers=None):
+        self.bounds = dict(default_bounds(base_params) if bounds is None else bounds)
+        fields = {field.name for field in dataclasses.fields(SimulationParameters)}
+        for name, (low, high) in self.bounds.items():
+            if name not in fields:
+                raise ValueError(f"Unknown parameter: {name}")
+            if high < low:
+                raise ValueError(f"Empty range for parameter: {name}")
+        self.base_params = base_params
+        self.parameters = list(self.bounds)
+        self.days = days
+        self.metrics = DEFAULT_METRICS if metrics is None else metrics
+        self.seed = seed
+        self.workers = workers
+        self.evaluations = 0
+        self.cache_hits = 0
+        self._cache = {}
+        self._low = np.array([self.bounds[name][0] for name in self.parameters], dtype=np.float64)
+        self._span = np.array([self.bounds[name][1] - self.bounds[name][0] for name in self.parameters],
+                              dtype=np.float64)
+
+    ##
+    # Estimates Sobol indices, returning the final result.
+    # @param samples: Number of base samples; the design has samples * (parameters + 2) points.
+    # @param batch_size: Number of base samples evaluated per batch.
+    # @return: SobolResult.
+    def sobol(self, samples, batch_size=64):
+        result = None
+        for result in self.iter_sobol(samples, batch_size):
+            pass
+        return result
+
+    ##
+    # Estimates Sobol indices batch by batch (Saltelli design with the Jansen estimators).
+    # @param samples: Number of base samples.
+    # @param batch_size: Number of base samples evaluated per batch.
+    # @return: Generator of SobolResult, one per finished batch.
+    def iter_sobol(self, samples, batch_size=64):
+        k = len(self.parameters)
+        m = len(self.metrics)
+        rng = np.random.default_rng(self.seed)
+        sums = {
+            "y": np.zeros(m), "y2": np.zeros(m), "count": 0,
+            "first": np.zeros((k, m)), "total": np.zeros((k, m)),
+        }
+        done = 0
+        offset = None
+        with self._executor() as executor:
+            while done < samples:
+                n = min(batch_size, samples - done)
+                a = rng.random((n, k))
+                b = rng.random((n, k))
+                mixed = np.repeat(a[np.newaxis], k, axis=0)  # mixed[i] is A with column i taken from B
+                for i in range(k):
+                    mixed[i, :, i] = b[:, i]
+                outputs = self._evaluate_points(executor, np.concatenate([a, b, mixed.reshape(k * n, k)]))
+                if offset is None:
+                    # Centering the outputs keeps the estimators' variance low; the indices do not change
+                    offset = outputs.mean(axis=0)
+                outputs = outputs - offset
+                f_a, f_b = outputs[:n], outputs[n:2 * n]
+                f_mixed = outputs[2 * n:].reshape(k, n, m)
+
+                sums["y"] += f_a.sum(axis=0) + f_b.sum(axis=0)
+                sums["y2"] += (f_a ** 2).sum(axis=0) + (f_b ** 2).sum(axis=0)
+                sums["count"] += 2 * n
+                sums["first"] += (f_b[np.newaxis] * (f_mixed - f_a[np.newaxis])).sum(axis=1)
+                sums["total"] += ((f_a[np.newaxis] - f_mixed) ** 2).sum(axis=1)
+                done += n
+
+                mean = sums["y"] / sums["count"]
+                variance = sums["y2"] / sums["count"] - mean ** 2
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    first = sums["first"] / done / variance
+                    total = sums["total"] / (2 * done) / variance
+                yield SobolResult(parameters=self.parameters,
+                                  first_order={name: first[:, j] for j, name in enumerate(self.metrics)},
+                                  total={name: total[:, j] for j, name in enumerate(self.metrics)},
+                                  samples=done,
+                                  evaluations=self.evaluations)
+
+    ##
+    # Estimates Morris measures, returning the final result.
+    # @param trajectories: Number of trajectories; each has parameters + 1 points.
+    # @param levels: Number of grid levels per parameter (even).
+    # @param batch_size: Number of trajectories evaluated per batch.
+    # @return: MorrisResult.
+    def morris(self, trajectories, levels=4, batch_size=16):
+        result = None
+        for result in self.iter_morris(trajectories, levels, batch_size):
+            pass
+        return result
+
+    ##
+    # Estimates Morris measures batch by batch.
+    # Effects are measured on the unit scale of the parameter ranges, so they are comparable between parameters.
+    # @param trajectories: Number of trajectories.
+    # @param levels: Number of grid levels per parameter (even).
+    # @param batch_size: Number of trajectories evaluated per batch.
+    # @return: Generator of MorrisResult, one per finished batch.
+    # Raises ValueError if levels is not an even number of at least 2.
+    def iter_morris(self, trajectories, levels=4, batch_size=16):
+        if levels < 2 or levels % 2:
+            raise ValueError("Number of levels must be an even number of at least 2")
+        k = len(self.parameters)
+        m = len(self.metrics)
+        delta = levels / (2 * (levels - 1))
+        rng = np.random.default_rng(self.seed)
+        sums = {"ee": np.zeros((k, m)), "abs": np.zeros((k, m)), "ee2": np.zeros((k, m))}
+        done = 0
+        with self._executor() as executor:
+            while done < trajectories:
+                n = min(batch_size, trajectories - done)
+                # Start on the lower part of the grid and step each parameter up by delta in random order
+                start = rng.integers(0, levels // 2, (n, k)) / (levels - 1)
+                order = np.argsort(rng.random((n, k)), axis=1)
+                points = np.repeat(start[:, np.newaxis], k + 1, axis=1)
+                for step in range(k):
+                    points[np.arange(n), step + 1:, order[:, step]] += delta
+                outputs = self._evaluate_points(executor, points.reshape(n * (k + 1), k)).reshape(n, k + 1, m)
+
+                effects = np.empty((n, k, m))
+                steps = (outputs[:, 1:] - outputs[:, :-1]) / delta
+                effects[np.arange(n)[:, np.newaxis], order] = steps
+                sums["ee"] += effects.sum(axis=0)
+                sums["abs"] += np.abs(effects).sum(axis=0)
+                sums["ee2"] += (effects ** 2).sum(axis=0)
+                done += n
+
+                mu = sums["ee"] / done
+                sigma = np.sqrt(np.maximum(sums["ee2"] / done - mu ** 2, 0) * done / max(done - 1, 1))
+                mu_star = sums["abs"] / done
+                yield MorrisResult(parameters=self.parameters,
+                                   mu={name: mu[:, j] for j, name in enumerate(self.metrics)},
+                                   mu_star={name: mu_star[:, j] for j, name in enumerate(self.metrics)},
+                                   sigma={name: sigma[:, j] for j, name in enumerate(self.metrics)},
+                                   trajectories=done,
+                                   evaluations=self.evaluations)
+
+    ##
+    # Converts points of the unit cube to parameter values.
+    # @param unit: Array of shape (points, parameters) with values in [0, 1].
+    # @return: List of parameter value dictionaries.
+    def to_parameters(self, unit):
+        values = self._low + unit * self._span
+        base = dataclasses.asdict(self.base_params)
+        points = []
+        for row in values.tolist():
+            point = dict(base)
+            for name, value in zip(self.parameters, row):
+                point[name] = int(round(value)) if name in INTEGER_PARAMETERS else value
+            points.append(point)
+        return points
+
+    ##
+    # Evaluates parameter points, simulating each distinct point only once per analysis.
+    # @return: Array of shape (points, metrics).
+    def _evaluate_points(self, executor, unit):
+        points = self.to_parameters(unit)
+        keys = [tuple(point[name] for name in self.parameters) for point in points]
+        missing = {}
+        for key, point in zip(keys, points):
+            if key not in self._cache and key not in missing:
+                missing[key] = point
+        self.cache_hits += len(keys) - len(missing)
+
+        tasks = [(point, self.days, self.seed, self.metrics) for point in missing.values()]
+        if executor is None:
+            outcomes = list(map(_evaluate, tasks))
+        else:
+            workers = self.workers or os.cpu_count() or 1
+            outcomes = list(executor.map(_evaluate, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+        self._cache.update(zip(missing, outcomes))
+        self.evaluations += len(missing)
+        return np.array([self._cache[key] for key in keys], dtype=np.float64)
+
+    def _executor(self):
+        if self.workers == 1:
+            return _NoExecutor()
+        return ProcessPoolExecutor(self.workers)
+
+
+##
+# Stand-in for an executor when the points are evaluated in this process.
+class _NoExecutor:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
@@ -1,11 +1,14 @@
 from .chart import Chart
 from .controlpanel import ControlPanel
 from .parameterpanel import ParameterPanel
+from .rasterview import RasterView, RasterLayout
 from .visualizer import Visualizer
 
 __all__ = [
     "Chart",
     "ControlPanel",
     "ParameterPanel",
+    "RasterView",
+    "RasterLayout",
     "Visualizer"
 ]
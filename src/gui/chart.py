@@ -62,4 +62,55 @@ class Chart(tk.Frame):
         self.ax.legend(loc='upper right')
         self.ax.grid()
         self.canvas.draw()
-        return [s_history, i_history, r_history]
\ No newline at end of file
+        return [s_history, i_history, r_history]
+
+    ##
+    # Plots a TieredHistory on the chart.
+    # Each block of aggregated days is drawn as its mean with a band from its minimum to its maximum,
+    # so the cost depends on the number of stored entries rather than on the number of simulated days.
+    # @param history: TieredHistory of the susceptible, infected and recovered counts.
+    def plot_history(self, history):
+        self.ax.cla()
+        self.ax.set_title("Outbreak Over Time")
+        self.ax.set_xlabel("Time (days)")
+        self.ax.set_ylabel("Number of People")
+        if len(history) == 0:
+            self.canvas.draw()
+            return
+
+        entries = history.entries()
+        times = entries["start"] + (entries["days"] - 1) / 2
+        for column, label in enumerate(('Susceptible', 'Infected', 'Recovered')):
+            line, = self.ax.plot(times, entries["mean"][:, column], label=label, marker='')
+            self.ax.fill_between(times, entries["min"][:, column], entries["max"][:, column],
+                                 color=line.get_color(), alpha=0.2, linewidth=0)
+        self.ax.legend(loc='upper right')
+        self.ax.grid()
+        self.canvas.draw()
+
+
+    ##
+    # Plots a progressive preview on the chart.
+    # The days simulated at full resolution are drawn solid, the approximate remainder dashed.
+    # @param s_history: List of susceptible individuals over time.
+    # @param i_history: List of infected individuals over time.
+    # @param r_history: List of recovered individuals over time.
+    # @param refined_days: Number of leading days that come from the full-resolution run.
+    def plot_preview(self, s_history, i_history, r_history, refined_days):
+        self.ax.cla()
+        self.ax.set_title("Outbreak Over Time (preview)")
+        self.ax.set_xlabel("Time (days)")
+        self.ax.set_ylabel("Number of People")
+        if not s_history:
+            self.canvas.draw()
+            return
+
+        times = list(range(len(s_history)))
+        for history, label in ((s_history, 'Susceptible'), (i_history, 'Infected'), (r_history, 'Recovered')):
+            line, = self.ax.plot(times[:refined_days + 1], history[:refined_days + 1], label=label, marker='')
+            if refined_days < len(history):
+                self.ax.plot(times[refined_days:], history[refined_days:], linestyle='--',
+                             color=line.get_color(), marker='')
+        self.ax.legend(loc='upper right')
+        self.ax.grid()
+        self.canvas.draw()
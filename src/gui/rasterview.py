@@ -0,0 +1,98 @@
+## @package rasterview
+#  Per-agent view of the population's health status.
+#  Every person is one pixel coloured by its status, and the age groups form separate bands.
+#  The view is a single matplotlib image whose array is updated in place after each step,
+#  so it can show millions of persons without one artist per person.
+
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+import numpy as np
+import tkinter as tk
+
+from models.population import AGE_GROUPS
+
+## Colours of the pixels: unused, susceptible, infected, recovered.
+STATUS_COLOURS = ("white", "tab:blue", "tab:orange", "tab:green")
+
+
+##
+# Places every person of a population on a pixel of a fixed image buffer.
+# Persons are ordered by age group and every group starts on a new row.
+class RasterLayout:
+    ##
+    # @param group: Array of the age group code of each person.
+    # @param width: Optional width of the image in pixels (defaults to the square root of the population size).
+    def __init__(self, group, width=None):
+        size = len(group)
+        self.width = width or max(1, int(np.ceil(np.sqrt(size))))
+        order = np.argsort(group, kind="stable")
+        counts = np.bincount(group, minlength=len(AGE_GROUPS))
+
+        # Rank of each person within its group, and the first row of each group's band
+        rows = -(-counts // self.width)
+        self.band_rows = np.concatenate([[0], np.cumsum(rows)])
+        group_start = np.concatenate([[0], np.cumsum(counts)])[:-1]
+        sorted_group = group[order]
+        rank = np.arange(size) - group_start[sorted_group]
+
+        self.positions = np.empty(size, dtype=np.int64)
+        self.positions[order] = self.band_rows[sorted_group] * self.width + rank
+        self.buffer = np.zeros((max(1, int(self.band_rows[-1])), self.width), dtype=np.int8)
+        self._flat = self.buffer.reshape(-1)
+
+    ##
+    # Writes the status codes into the image buffer in place.
+    # @param codes: Array of status codes, indexed by person id.
+    # @return: The updated image buffer.
+    def update(self, codes):
+        self._flat[self.positions] = codes
+        return self.buffer
+
+
+class RasterView(tk.Frame):
+    ##
+    # Initializes the raster view.
+    # @param master: The parent widget for the view.
+    def __init__(self, master: tk.Misc, *args, **kwargs):
+        super().__init__(master, *args, **kwargs)
+
+        self.figure = Figure(figsize=(4, 4), dpi=100)
+        self.ax = self.figure.add_subplot()
+        self.ax.set_title('Persons by Age Group')
+        self.ax.set_xticks([])
+        self.layout = None
+        self.image = None
+
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self)
+        self.canvas.draw()
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+    ##
+    # Lays out a population and creates the image for it.
+    # @param population: The Population to show, or None to clear the view.
+    def set_population(self, population):
+        self.ax.cla()
+        self.ax.set_title('Persons by Age Group')
+        self.ax.set_xticks([])
+        self.layout = None
+        self.image = None
+        if population is not None and len(population):
+            self.layout = RasterLayout(population.group)
+            self.image = self.ax.imshow(self.layout.buffer, cmap=ListedColormap(STATUS_COLOURS),
+                                        vmin=0, vmax=len(STATUS_COLOURS) - 1,
+                                        interpolation='nearest', aspect='auto')
+            bands = self.layout.band_rows
+            shown = bands[1:] > bands[:-1]  # Empty groups have no band
+            self.ax.set_yticks(((bands[:-1] + bands[1:]) / 2 - 0.5)[shown],
+                               labels=[name for name, band in zip(AGE_GROUPS, shown) if band])
+        self.canvas.draw_idle()
+
+    ##
+    # Shows the current status of every person.
+    # @param codes: Array of status codes, indexed by person id.
+    def show(self, codes):
+        if self.layout is None:
+            return
+        self.image.set_data(self.layout.update(codes))
+        self.canvas.draw_idle()
@@ -4,10 +4,13 @@
 #  This class is responsible for creating the GUI and managing user interactions.
 #  It provides methods to start the simulation, step through it, and reset the state.
 
+import random
 import tkinter as tk
 from .controlpanel import ControlPanel
 from .parameterpanel import ParameterPanel, SimulationParameters
 from .chart import Chart
+from .rasterview import RasterView
+from simulation import ProgressivePreview
 
 
 class Visualizer(tk.Frame):
@@ -26,6 +29,8 @@ class Visualizer(tk.Frame):
         super().__init__(master, *args, **kwargs)
 
         self.simulation = simulation
+        self.preview = None
+        self.preview_days = 100  # Days shown by the preview after the parameters are committed
         self.paramPanel = ParameterPanel(master = master)
         self.controlPanel = ControlPanel(
             master = self.master,
@@ -37,10 +42,14 @@ class Visualizer(tk.Frame):
         self.chart = Chart(
             master = self.master
         )
+        self.raster = RasterView(
+            master = self.master
+        )
 
         self.paramPanel.pack(side=tk.LEFT, fill=tk.X, pady=5)
         self.controlPanel.pack(side=tk.TOP, fill=tk.X, pady=5)
 
+        self.raster.pack(side=tk.RIGHT, fill=tk.BOTH, pady=5)
         self.chart.pack(side=tk.TOP, fill=tk.BOTH, expand=True, pady=5)
 
 
@@ -50,7 +59,12 @@ class Visualizer(tk.Frame):
     # and updates the chart with the results.
     # @param n: The number of steps to run the simulation.
     def on_step(self, n: int):
+        self.cancel_preview()
         self.simulation.run_simulation(n)
+        self.raster.show(self.simulation.status_codes())
+        if self.simulation.stats.history is not None:
+            self.chart.plot_history(self.simulation.stats.history)
+            return
         s, i, r = self.simulation.stats.get_list_report()
         self.chart.plot(s, i, r)
 
@@ -86,8 +100,10 @@ class Visualizer(tk.Frame):
     # It is called when the user wants to reset the simulation and start over.
     # @return: None
     def reset_everything(self):
+        self.cancel_preview()
         self.simulation.reset_simulation()
         self.chart.plot([], [], [])
+        self.raster.set_population(None)
         self.paramPanel.reset_fields()
 
 
@@ -97,17 +113,69 @@ class Visualizer(tk.Frame):
     # sets up the simulation with those parameters, and returns True if successful.
     # If there is an error in setting up the simulation, it prints an error message
     # and returns False.
+    # The simulation gets a fresh seed that the preview shares, so the preview shows the days
+    # the step buttons will produce (until distancing is toggled).
     # @return: True if the simulation was set up successfully, False otherwise.
     def start_simulation(self):
+        self.cancel_preview()
         params = self.load_parameters()
+        seed = random.getrandbits(32)
         try:
-            self.simulation.setup_simulation(params)
+            self.simulation.setup_simulation(params, seed=seed)
         except RuntimeError as e:
             print(f"Error loading parameters: {e}")
             return False
+        self.raster.set_population(self.simulation.population)
+        self.raster.show(self.simulation.status_codes())
+        self.show_preview(params, seed)
         return True
 
 
+    ##
+    # Shows an approximate curve of the committed parameters right away and refines it
+    # while the full-resolution run streams in from a background thread.
+    # The full-resolution run is a separate simulation, so the user's simulation stays at day 0.
+    # @param params: The committed SimulationParameters.
+    # @param seed: Seed of the user's simulation, shared by the full-resolution run.
+    def show_preview(self, params, seed=None):
+        self.cancel_preview()
+        preview = ProgressivePreview(params, self.preview_days, seed=seed)
+        approximate = preview.approximate()
+        self.chart.plot_preview(*approximate, refined_days=0)
+        self.preview = preview
+        preview.start()
+        self.after(200, self.refine_preview, preview, approximate)
+
+
+    ##
+    # Redraws the preview with the days simulated at full resolution so far.
+    # Reschedules itself until the full-resolution run has finished or the preview is cancelled.
+    # If the full-resolution run failed, it prints an error message and keeps the curve shown so far.
+    # @param preview: The ProgressivePreview being shown.
+    # @param approximate: Its approximate curve.
+    def refine_preview(self, preview, approximate):
+        if preview is not self.preview:
+            return
+        if preview.error is not None:
+            print(f"Error refining preview: {preview.error}")
+            self.preview = None
+            return
+        refined_days = len(preview.refined()[0])
+        self.chart.plot_preview(*preview.combined(approximate), refined_days=refined_days)
+        if preview.done:
+            self.preview = None
+        else:
+            self.after(200, self.refine_preview, preview, approximate)
+
+
+    ##
+    # Stops the preview shown on the chart, if any.
+    def cancel_preview(self):
+        if self.preview is not None:
+            self.preview.cancel()
+            self.preview = None
+
+
 if __name__ == "__main__":
     root = tk.Tk()
     root.title("Disease Simulation Visualizer")
@@ -1,5 +1,5 @@
 
-from .person import Person
+from .person import Person, NEVER
 from .disease import Disease
 from .population import Population
 from .policy import (
@@ -9,14 +9,31 @@ from .policy import (
 )
 from .healthstatus import HealthStatus
 from .simulationparameters import SimulationParameters
+from .randomstreams import RandomStreams
+from .contactsampler import ContactSampler, alias_table
+from .microdata import import_microdata, MICRODATA_DTYPE
+from .distribution import (
+    Distribution,
+    UniformDistribution,
+    IntegerDistribution
+)
 
 __all__ = [
     "Person",
+    "NEVER",
     "Disease",
     "Population",
     "TransmissionPolicy",
     "AlwaysTransmitPolicy",
     "RandomTransmissionPolicy",
     "HealthStatus",
-    "SimulationParameters"
+    "SimulationParameters",
+    "RandomStreams",
+    "ContactSampler",
+    "alias_table",
+    "import_microdata",
+    "MICRODATA_DTYPE",
+    "Distribution",
+    "UniformDistribution",
+    "IntegerDistribution"
 ]
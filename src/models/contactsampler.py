@@ -0,0 +1,142 @@
+## @package contactsampler
+#  Activity-weighted sampling of contact targets.
+#
+#  Persons are contacted with probability proportional to activity_level * distancing_factor,
+#  so active persons meet more people in both directions. The draws use an alias table
+#  (Walker's method), which costs one uniform number and two array lookups per contact.
+#  The table is rebuilt only after the distancing factors change, and the contacts of all
+#  infected persons of a day are drawn at once into buffers that are reused from day to day.
+#  Contacts are drawn with replacement, so a person can be met more than once on a day.
+
+import random
+import numpy as np
+
+
+##
+# Builds an alias table for sampling indices with probability proportional to their weights.
+# Small and large entries are paired in bulk: in each round every entry below the average is
+# topped up by the large entry where its cumulative deficit starts, so no per-entry Python loop is needed.
+# @param weights: Array of non-negative weights.
+# @return: Tuple of the acceptance probabilities and the alias indices.
+# Raises ValueError if the weights are empty, negative or all zero.
+def alias_table(weights):
+    weights = np.asarray(weights, dtype=np.float64)
+    size = len(weights)
+    total = weights.sum()
+    if size == 0 or (weights < 0).any() or not total > 0:
+        raise ValueError("Weights must be non-negative and not all zero")
+
+    scaled = weights * (size / total)
+    probability = np.ones(size)
+    alias = np.arange(size)
+    small = np.flatnonzero(scaled < 1)
+    large = np.flatnonzero(scaled >= 1)
+    while len(small) and len(large):
+        deficit = 1 - scaled[small]
+        start = np.cumsum(deficit) - deficit
+        excess = np.cumsum(scaled[large] - 1)
+        owner = np.searchsorted(excess, start, side="right")
+        paired = owner < len(large)  # Unpaired entries are rounding leftovers
+        if not paired.any():
+            break
+        filled, owner = small[paired], owner[paired]
+        probability[filled] = scaled[filled]
+        alias[filled] = large[owner]
+        # A large entry pays less than one more than its excess, so it stays non-negative
+        scaled[large] -= np.bincount(owner, weights=deficit[paired], minlength=len(large))
+        drained = scaled[large] < 1
+        small = np.concatenate([small[~paired], large[drained]])
+        large = large[~drained]
+    probability[small] = 1.0
+    return probability, alias
+
+
+class ContactSampler:
+    ##
+    # Initializes the sampler of a population.
+    # @param population: The Population whose persons are contacted.
+    # @param rng: Optional numpy random Generator or seed (defaults to one seeded from the random module).
+    def __init__(self, population, rng=None):
+        if rng is None:
+            rng = random.getrandbits(64)
+        self.population = population
+        self.rng = np.random.default_rng(rng)
+        self.probability = None
+        self.alias = None
+        self._stale = True
+        self._targets = np.empty(0, dtype=np.int64)
+        self._aliases = np.empty(0, dtype=np.int64)
+        self._uniform = np.empty(0, dtype=np.float64)
+        self._accept = np.empty(0, dtype=np.float64)
+        self._rejected = np.empty(0, dtype=bool)
+
+    ##
+    # Marks the alias table as outdated, e.g. after the distancing factors changed.
+    # It is rebuilt on the next draw.
+    def invalidate(self):
+        self._stale = True
+
+    ##
+    # Rebuilds the alias table from the current activity levels and distancing factors if it is outdated.
+    # @return: False if nobody can be contacted, True otherwise.
+    def rebuild(self):
+        if self._stale:
+            weights = self.population.activity_level * self.population.distancing_factor
+            if len(weights) and (weights > 0).any():
+                self.probability, self.alias = alias_table(weights)
+            else:
+                self.probability, self.alias = None, None
+            self._stale = False
+        return self.probability is not None
+
+    ##
+    # Draws the daily contacts of a set of persons.
+    # Each person gets round(activity_level * distancing_factor) contacts, at most the population size,
+    # like in Population.get_contacts. The returned arrays are views of buffers that are
+    # overwritten by the next draw.
+    # @param sources: Array of the ids of the contacting persons.
+    # @param uniforms: Optional function(persons, slots) returning keyed uniform numbers for the contact slots
+    #                  (see RandomStreams.keyed_uniforms); by default the sampler's generator is used.
+    # @return: Tuple of offsets and targets: the contacts of sources[i] are targets[offsets[i]:offsets[i + 1]].
+    def draw(self, sources, uniforms=None):
+        population = self.population
+        counts = np.rint(population.activity_level[sources] * population.distancing_factor[sources])
+        np.clip(counts, 0, len(population), out=counts)
+        offsets = np.zeros(len(sources) + 1, dtype=np.int64)
+        np.cumsum(counts.astype(np.int64), out=offsets[1:])
+        total = int(offsets[-1])
+        if total == 0 or not self.rebuild():
+            offsets.fill(0)
+            return offsets, self._targets[:0]
+        self._reserve(total)
+
+        uniform = self._uniform[:total]
+        targets = self._targets[:total]
+        if uniforms is None:
+            self.rng.random(out=uniform)
+        else:
+            counts = np.diff(offsets)
+            slots = np.arange(total) - np.repeat(offsets[:-1], counts)
+            uniform[:] = uniforms(np.repeat(sources, counts), slots)
+        # The integer part of one uniform number picks the column, the fractional part decides for the alias
+        uniform *= len(population)
+        np.copyto(targets, uniform, casting="unsafe")
+        np.minimum(targets, len(population) - 1, out=targets)
+        uniform -= targets
+        accept = np.take(self.probability, targets, out=self._accept[:total])
+        rejected = np.greater_equal(uniform, accept, out=self._rejected[:total])
+        aliases = np.take(self.alias, targets, out=self._aliases[:total])
+        np.copyto(targets, aliases, where=rejected)
+        return offsets, targets
+
+    ##
+    # Grows the buffers to hold at least a number of contacts.
+    def _reserve(self, total):
+        if total <= len(self._targets):
+            return
+        capacity = max(total, 2 * len(self._targets))
+        self._targets = np.empty(capacity, dtype=np.int64)
+        self._aliases = np.empty(capacity, dtype=np.int64)
+        self._uniform = np.empty(capacity, dtype=np.float64)
+        self._accept = np.empty(capacity, dtype=np.float64)
+        self._rejected = np.empty(capacity, dtype=bool)
@@ -2,7 +2,7 @@
 # Defines a disease with its parameters and transmission behavior.
 
 
-from .healthstatus import HealthStatus
+from .healthstatus import SUSCEPTIBLE, INFECTED
 from .policy import TransmissionPolicy, RandomTransmissionPolicy, AlwaysTransmitPolicy
 # from person import Person
 
@@ -25,11 +25,18 @@ class Disease:
     # @param source: The person attempting to transmit the disease.
     # @param target: The person who may receive the disease.
     # @param time: The current time in the simulation.
+    # @param status: Optional status codes of all persons at this time, indexed by id.
     # @return: True if the target should get infected, False otherwise.
-    def attempt_infection(self, source, target, time):
-        if source.get_status(time) != HealthStatus.Infected:
+    def attempt_infection(self, source, target, time, status=None):
+        if status is None:
+            source_status = source.status_code(time)
+            target_status = target.status_code(time)
+        else:
+            source_status = status[source.id]
+            target_status = status[target.id]
+        if source_status != INFECTED:
             return False
-        if target.get_status(time) != HealthStatus.Susceptible:
+        if target_status != SUSCEPTIBLE:
             return False
         if source.susceptibility <= 0:
             return False
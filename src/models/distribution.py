@@ -0,0 +1,52 @@
+## @package distribution
+#  Defines distributions used to draw person attributes in bulk.
+#
+#  A distribution draws the values of one attribute for a whole age group in a single
+#  vectorized call, so populations of millions of persons are created without a per-person loop.
+
+import abc
+
+
+class Distribution(abc.ABC):
+    ##
+    # Abstract method to draw values from the distribution.
+    # @param rng: numpy random Generator to draw from.
+    # @param size: Number of values to draw.
+    # @return: numpy array of `size` values.
+    @abc.abstractmethod
+    def sample(self, rng, size):
+        pass
+
+
+##
+# UniformDistribution draws floats uniformly from [low, high).
+class UniformDistribution(Distribution):
+    ##
+    # @param low: Lower bound of the values.
+    # @param high: Upper bound of the values.
+    # Raises ValueError if high is lower than low.
+    def __init__(self, low, high):
+        if high < low:
+            raise ValueError("Upper bound must not be lower than lower bound")
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, size):
+        return rng.uniform(self.low, self.high, size)
+
+
+##
+# IntegerDistribution draws integers uniformly from [low, high], both bounds included.
+class IntegerDistribution(Distribution):
+    ##
+    # @param low: Smallest value.
+    # @param high: Largest value.
+    # Raises ValueError if high is lower than low.
+    def __init__(self, low, high):
+        if high < low:
+            raise ValueError("Upper bound must not be lower than lower bound")
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, size):
+        return rng.integers(self.low, self.high, size, endpoint=True)
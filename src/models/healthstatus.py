@@ -10,4 +10,14 @@ from enum import Enum
 class HealthStatus(Enum):
     Susceptible = 1
     Infected = 2
-    Recovered = 3
\ No newline at end of file
+    Recovered = 3
+
+
+# --- Small-int status codes, matching the HealthStatus values ---
+# Used on hot paths and in arrays instead of comparing enum members.
+SUSCEPTIBLE = HealthStatus.Susceptible.value
+INFECTED = HealthStatus.Infected.value
+RECOVERED = HealthStatus.Recovered.value
+
+## HealthStatus member for each status code (index 0 is unused).
+STATUS_BY_CODE = (None, HealthStatus.Susceptible, HealthStatus.Infected, HealthStatus.Recovered)
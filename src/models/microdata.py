@@ -0,0 +1,150 @@
+## @package microdata
+#  Bulk import of population microdata.
+#
+#  A microdata file holds one record per person with an age, a susceptibility and an activity level.
+#  Files are read in fixed-size chunks straight into preallocated population arrays; every chunk is
+#  converted and validated with array operations, so no Python object is created per record and
+#  memory stays bounded by the population arrays plus one chunk.
+#
+#  Two formats are supported:
+#    - CSV with a header row naming at least the columns "age", "susceptibility" and "activity_level"
+#      (in any order, further columns are ignored), and
+#    - binary files of packed little-endian records of MICRODATA_DTYPE.
+
+import os
+import warnings
+import numpy as np
+
+from .population import Population
+
+## Columns read from a microdata file.
+MICRODATA_COLUMNS = ("age", "susceptibility", "activity_level")
+
+## Record layout of binary microdata files.
+MICRODATA_DTYPE = np.dtype([("age", "<i2"), ("susceptibility", "<f8"), ("activity_level", "<i4")])
+
+## First age of the middle and of the old age group.
+AGE_LIMITS = (25, 65)
+
+## Largest accepted age.
+MAX_AGE = 130
+
+
+##
+# Imports a population from a microdata file.
+# @param path: Path of a .csv file or a binary file of MICRODATA_DTYPE records.
+# @param chunk_rows: Number of records converted at once.
+# @param age_limits: First age of the middle and of the old age group.
+# @param delimiter: Column delimiter of CSV files.
+# @return: Population with one person per record, in file order.
+# Raises ValueError if the file is malformed or a record is invalid; the message names the first bad record.
+def import_microdata(path, chunk_rows=1 << 20, age_limits=AGE_LIMITS, delimiter=","):
+    if chunk_rows <= 0:
+        raise ValueError("Chunk size must be positive")
+    if path.endswith(".csv"):
+        chunks, size = _csv_chunks(path, chunk_rows, delimiter)
+    else:
+        chunks, size = _binary_chunks(path, chunk_rows)
+
+    susceptibility = np.empty(size, dtype=np.float64)
+    activity_level = np.empty(size, dtype=np.int32)
+    group = np.empty(size, dtype=np.int8)
+    limits = np.asarray(age_limits)
+
+    filled = 0
+    for age, susc, activity in chunks:
+        count = len(age)
+        if filled + count > size:
+            raise ValueError("Microdata file changed while it was read")
+        _validate(filled, age, susc, activity)
+        group[filled:filled + count] = np.searchsorted(limits, age, side="right")
+        susceptibility[filled:filled + count] = susc
+        activity_level[filled:filled + count] = activity
+        filled += count
+
+    if filled < size:  # Blank lines counted as records
+        susceptibility, activity_level, group = susceptibility[:filled], activity_level[:filled], group[:filled]
+    return Population.from_arrays(susceptibility, activity_level, group)
+
+
+##
+# Checks the records of one chunk.
+# @param first: Index of the first record of the chunk in the file.
+def _validate(first, age, susceptibility, activity_level):
+    checks = (
+        ("age", (age < 0) | (age > MAX_AGE) | (age != np.floor(age))),
+        ("susceptibility", ~((susceptibility >= 0) & (susceptibility <= 1))),
+        ("activity_level", (activity_level < 0) | (activity_level != np.floor(activity_level))
+         | (activity_level > np.iinfo(np.int32).max)),
+    )
+    for column, invalid in checks:
+        if invalid.any():
+            record = first + int(np.argmax(invalid)) + 1
+            raise ValueError(f"Invalid {column} in microdata record {record}")
+
+
+##
+# Opens a CSV microdata file.
+# @return: Tuple of a generator of (age, susceptibility, activity_level) chunks and an upper bound of the record count.
+def _csv_chunks(path, chunk_rows, delimiter):
+    with open(path) as f:
+        header = [name.strip() for name in f.readline().split(delimiter)]
+    missing = [name for name in MICRODATA_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"Microdata file lacks the columns: {', '.join(missing)}")
+    usecols = [header.index(name) for name in MICRODATA_COLUMNS]
+    size = max(0, _count_lines(path) - 1)
+
+    def chunks():
+        remaining = size
+        with open(path) as f:
+            f.readline()
+            while remaining > 0:
+                try:
+                    with warnings.catch_warnings():
+                        warnings.filterwarnings("ignore", "loadtxt: input contained no data")
+                        data = np.loadtxt(f, delimiter=delimiter, usecols=usecols,
+                                          max_rows=min(chunk_rows, remaining), ndmin=2, dtype=np.float64)
+                except ValueError as e:
+                    raise ValueError(f"Malformed microdata file: {e}") from e
+                if not len(data):
+                    return
+                remaining -= len(data)
+                yield data[:, 0], data[:, 1], data[:, 2]
+
+    return chunks(), size
+
+
+##
+# Opens a binary microdata file as a memory map.
+# @return: Tuple of a generator of (age, susceptibility, activity_level) chunks and the record count.
+def _binary_chunks(path, chunk_rows):
+    file_size = os.path.getsize(path)
+    if file_size % MICRODATA_DTYPE.itemsize:
+        raise ValueError("Binary microdata file is not a whole number of records")
+    size = file_size // MICRODATA_DTYPE.itemsize
+
+    def chunks():
+        if size == 0:
+            return
+        records = np.memmap(path, dtype=MICRODATA_DTYPE, mode="r")
+        for start in range(0, size, chunk_rows):
+            chunk = records[start:start + chunk_rows]
+            yield chunk["age"], chunk["susceptibility"], chunk["activity_level"]
+
+    return chunks(), size
+
+
+##
+# Counts the lines of a file, reading it in blocks.
+def _count_lines(path, block_size=1 << 24):
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            lines += block.count(b"\n")
+            last = block[-1:]
+    return lines + (last != b"\n")
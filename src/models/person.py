@@ -3,58 +3,53 @@
 #
 #  This class tracks when a person becomes infectious, when they recover,
 #  and whether they are currently able to transmit disease.
+#
+#  Persons use __slots__ and integer times (NEVER instead of math.inf) to keep
+#  object-mode populations small; status checks on hot paths compare small-int status codes.
 
-from .healthstatus import HealthStatus
+from .healthstatus import SUSCEPTIBLE, INFECTED, RECOVERED, STATUS_BY_CODE
 import random
+from math import inf
 
+## Time value for events that never happen (largest int32, so it also fits population arrays).
+NEVER = 2**31 - 1
 
-class Person:
-    ##
-    #  Construct a Person.
-    #  @param id               Unique identifier for the person.
-    #  @param susceptibility   Modifier [0.0–1.0] to scale transmission probability.
-    #  @param recovery_time    Simulation day when this person recovers.
-    #  @param infectious_time  Simulation day when this person becomes infectious.
-    #  @param activity_level   Average number of contacts per day.
-    #  @param distancing_factor Factor to reduce contacts due to social distancing.
-    def __init__(self,
-                 id,
-                 susceptibility,
-                 recovery_time,
-                 infectious_time,
-                 activity_level,
-                 distancing_factor = 1.0):
+## Number of days a recovered person stays immune.
+IMMUNITY_PERIOD = 90
 
-        self.id = id
-        self.susceptibility = susceptibility
-        self.recovery_time = recovery_time
-        self.infectious_time = infectious_time
-        self.activity_level = activity_level
-        self.distancing_factor = distancing_factor
 
+##
+#  Behavior shared by Person and PersonView.
+#  The class has no slots of its own, so subclasses decide where the attributes are stored.
+class PersonBehavior:
+    __slots__ = ()
 
     ##
     #  Process daily contacts with other persons and attempt to infect them.
     #  @param disease         The disease that is being transmitted.
     #  @param others          List of other persons that this person interacts with.
     #  @param time            The current time in the simulation.
+    #  @param status          Optional status codes of all persons at this time, indexed by id
+    #                         (e.g. the simulation's per-step status cache).
     #  @return               List of newly infected persons.
-    def interact(self, disease, others, time):
+    def interact(self, disease, others, time, status=None):
         newly_infected = []
         for other in others:
             if other.id != self.id:
-                if other.get_status(time) != HealthStatus.Susceptible:
+                code = other.status_code(time) if status is None else status[other.id]
+                if code != SUSCEPTIBLE:
                     continue
-                if disease.attempt_infection(self, other, time):
+                if disease.attempt_infection(self, other, time, status):
                     newly_infected.append(other)
 
         return newly_infected
 
     ##
     #  Determines if this person should be infected based on their susceptibility.
+    #  @param rng             Random number source (defaults to the random module).
     #  @return True if the person should be infected, False otherwise.
-    def should_infect(self):
-        return random.random() <= self.susceptibility
+    def should_infect(self, rng=random):
+        return rng.random() <= self.susceptibility
 
 
     ##
@@ -64,12 +59,19 @@ class Person:
     #  @param current_time: The current time in the simulation.
     #  @return HealthStatus.Susceptible, HealthStatus.Infected, or HealthStatus.Recovered
     def get_status(self, current_time):
-        if current_time < self.infectious_time or self.recovery_time <= current_time - 90:
-            return HealthStatus.Susceptible
-        elif self.infectious_time <= current_time < self.recovery_time:
-            return HealthStatus.Infected
-        elif self.recovery_time <= current_time:
-            return HealthStatus.Recovered
+        return STATUS_BY_CODE[self.status_code(current_time)]
+
+
+    ##
+    #  Returns the health status of this person as a small-int code (same rules as get_status).
+    #  @param current_time: The current time in the simulation.
+    #  @return SUSCEPTIBLE, INFECTED or RECOVERED
+    def status_code(self, current_time):
+        if current_time < self.infectious_time or self.recovery_time <= current_time - IMMUNITY_PERIOD:
+            return SUSCEPTIBLE
+        elif current_time < self.recovery_time:
+            return INFECTED
+        return RECOVERED
 
 
     ##
@@ -77,4 +79,76 @@ class Person:
     # @param current_time: The current time in the simulation.
     # @return True if the person is infectious, False otherwise.
     def is_infectious(self, current_time):
-        return self.infectious_time <= current_time < self.recovery_time
\ No newline at end of file
+        return self.infectious_time <= current_time < self.recovery_time
+
+
+class Person(PersonBehavior):
+    __slots__ = ("id", "susceptibility", "recovery_time", "infectious_time", "activity_level", "distancing_factor")
+
+    ##
+    #  Construct a Person.
+    #  @param id               Unique identifier for the person.
+    #  @param susceptibility   Modifier [0.0–1.0] to scale transmission probability.
+    #  @param recovery_time    Simulation day when this person recovers (NEVER if not infected).
+    #  @param infectious_time  Simulation day when this person becomes infectious (NEVER if not infected).
+    #  @param activity_level   Average number of contacts per day.
+    #  @param distancing_factor Factor to reduce contacts due to social distancing.
+    def __init__(self,
+                 id,
+                 susceptibility,
+                 recovery_time,
+                 infectious_time,
+                 activity_level,
+                 distancing_factor = 1.0):
+
+        self.id = id
+        self.susceptibility = susceptibility
+        self.recovery_time = recovery_time
+        self.infectious_time = infectious_time
+        self.activity_level = activity_level
+        self.distancing_factor = distancing_factor
+
+
+##
+#  Creates a property that reads and writes one entry of a population array.
+#  @param name  Name of the Population array attribute.
+#  @param time  True for the int32 time arrays: math.inf is then stored as NEVER.
+def _array_attribute(name, time=False):
+    def getter(self):
+        return getattr(self._population, name)[self.id]
+
+    def setter(self, value):
+        if time and value == inf:
+            value = NEVER
+        getattr(self._population, name)[self.id] = value
+
+    return property(getter, setter)
+
+
+##
+#  A Person whose attributes are stored in the arrays of a Population.
+#  Reading or writing an attribute reads or writes the population's array entry for this id,
+#  so the object and array views of the population always agree. Times set to math.inf are stored as NEVER.
+#  Each attribute read indexes an array, so passes over all persons should use the arrays instead
+#  (e.g. Population.status_codes).
+class PersonView(PersonBehavior):
+    __slots__ = ("id", "_population")
+
+    susceptibility = _array_attribute("susceptibility")
+    recovery_time = _array_attribute("recovery_time", time=True)
+    infectious_time = _array_attribute("infectious_time", time=True)
+    activity_level = _array_attribute("activity_level")
+    distancing_factor = _array_attribute("distancing_factor")
+
+    ##
+    #  Construct a view on one person of a population.
+    #  @param population  The Population holding the attribute arrays.
+    #  @param id          Index of the person in the population arrays.
+    def __init__(self, population, id):
+        self._population = population
+        self.id = id
+
+    def __repr__(self):
+        return (f"Person(id={self.id}, susceptibility={self.susceptibility}, "
+                f"infectious_time={self.infectious_time}, recovery_time={self.recovery_time}, "
+                f"activity_level={self.activity_level}, distancing_factor={self.distancing_factor})")
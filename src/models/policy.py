@@ -5,8 +5,12 @@ import abc
 import random
 
 class TransmissionPolicy(abc.ABC):
-    def __init__(self, disease):
+    ##
+    # @param disease: The disease whose transmission the policy decides.
+    # @param rng: Random number source for policies that draw (defaults to the random module).
+    def __init__(self, disease, rng=random):
         self.disease = disease
+        self.rng = rng
 
     ##
     # Abstract method to determine if transmission should occur.
@@ -35,7 +39,7 @@ class RandomTransmissionPolicy(TransmissionPolicy):
     # @param target: The person who may receive the disease.
     # @return: True if transmission occurs, False otherwise.
     def should_transmit(self, source, target):
-        return random.random() < self.disease.transmission_rate
+        return self.rng.random() < self.disease.transmission_rate
 
     def get_policy_name(self):
         return "Random Transmission Policy"
@@ -1,57 +1,253 @@
 ## @package population
 #  The Population class represents a group of individuals in the simulation.
 #  It initializes individuals with varying susceptibility and activity levels based on their age group.
+#  The attributes of each age group are drawn in bulk from pluggable distributions.
+#
+#  Per-person attributes are stored column-wise in numpy arrays (one entry per person id),
+#  so that whole-population updates such as social distancing are single array operations.
+#  The Person objects in Population.persons are views onto these arrays.
+#
+#  A population can be saved to a directory of .npy files and loaded back memory-mapped,
+#  so sweeps and worker processes reuse one generated population instead of regenerating it.
 
 
-from .person import Person
-from .healthstatus import HealthStatus
+from .person import Person, PersonView, NEVER, IMMUNITY_PERIOD
+from .healthstatus import HealthStatus, SUSCEPTIBLE, INFECTED, RECOVERED
+from .distribution import UniformDistribution, IntegerDistribution
 import random
+import json
+import os
 from math import inf
+import numpy as np
+
+# --- Age groups ---
+YOUNG = 0
+MIDDLE = 1
+OLD = 2
+AGE_GROUPS = ("young", "middle", "old")
+
+# --- Saved population format ---
+POPULATION_FORMAT_VERSION = 1
+POPULATION_COLUMNS = ("susceptibility", "activity_level", "group")
+NETWORK_COLUMNS = ("network_indptr", "network_indices")
 
 # --- Susceptibility parameters ---
-def young_susc(): return random.uniform(0.1, 0.4)
-def middle_susc(): return random.uniform(0.2, 0.7)
-def old_susc(): return random.uniform(0.4, 0.95)
+SUSCEPTIBILITY = (
+    UniformDistribution(0.1, 0.4),   # young
+    UniformDistribution(0.2, 0.7),   # middle
+    UniformDistribution(0.4, 0.95),  # old
+)
 
 # --- Activity level parameters ---
-def young_act_lvl(): return random.randint(10, 30)
-def middle_act_lvl(): return random.randint(5, 25)
-def old_act_lvl(): return random.randint(1, 15)
+ACTIVITY_LEVEL = (
+    IntegerDistribution(10, 30),  # young
+    IntegerDistribution(5, 25),   # middle
+    IntegerDistribution(1, 15),   # old
+)
+
+
+##
+# Computes the social distancing factor for the given activity levels.
+# Takes a square root to reduce the distancing factor based on activity level.
+# @param activity_level: Array (or scalar) of activity levels.
+# @return: Array of distancing factors.
+def distancing_factor(activity_level):
+    with np.errstate(divide='ignore'):
+        return 1 / (2 * np.sqrt(activity_level))
+
+
+##
+# Converts age group names or codes to an array of group codes.
+# @param groups: Iterable of group names ("young", "middle", "old") or codes (YOUNG, MIDDLE, OLD).
+# @return: numpy array of group codes.
+# Raises ValueError if a group is unknown.
+def group_codes(groups):
+    codes = []
+    for group in groups:
+        if isinstance(group, str):
+            if group not in AGE_GROUPS:
+                raise ValueError(f"Unknown age group: {group}")
+            codes.append(AGE_GROUPS.index(group))
+        elif group in (YOUNG, MIDDLE, OLD):
+            codes.append(group)
+        else:
+            raise ValueError(f"Unknown age group: {group}")
+    return np.array(codes, dtype=np.int8)
+
+
+##
+# Computes health status codes from infection time arrays, using the same rules as Person.get_status.
+# @param infectious_time: Array of infection times.
+# @param recovery_time: Array of recovery times.
+# @param time: The current time in the simulation.
+# @return: int8 numpy array of status codes.
+def compute_status_codes(infectious_time, recovery_time, time):
+    codes = np.full(len(infectious_time), RECOVERED, dtype=np.int8)
+    codes[(infectious_time <= time) & (time < recovery_time)] = INFECTED
+    codes[(time < infectious_time) | (recovery_time <= time - IMMUNITY_PERIOD)] = SUSCEPTIBLE
+    return codes
 
 
 class Population:
     ##
     # Initializes the Population class.
     # Creates a population of persons with varying susceptibility and activity levels based on age groups.
+    # Persons are ordered by age group: young first, then middle-aged, then old.
     # @param young: Number of young persons in the population.
     # @param middle: Number of middle-aged persons in the population.
     # @param old: Number of old persons in the population.
-    def __init__(self, young: int = 0, middle: int = 0, old: int = 0):
-        self.persons = []
-
-        for i in range(young + middle + old):
-            if i < young:
-                susc = young_susc
-                act_lvl = young_act_lvl
-            elif young <= i < middle:
-                susc = middle_susc
-                act_lvl = middle_act_lvl
-            else:
-                susc = old_susc
-                act_lvl = old_act_lvl
-
-            p = Person(i,
-                       susceptibility= susc(),
-                       recovery_time = inf,
-                       infectious_time = inf,
-                       activity_level = act_lvl()
-                       )
-            self.persons.append(p)
-
-        print(f"Population created with {len(self.persons)} persons: ",
+    # @param susceptibility: Optional Distribution per age group for susceptibility (defaults to SUSCEPTIBILITY).
+    # @param activity_level: Optional Distribution per age group for activity levels (defaults to ACTIVITY_LEVEL).
+    # @param rng: Optional numpy random Generator or seed. By default it is seeded from the random module,
+    #             so random.seed also makes the population reproducible.
+    def __init__(self, young: int = 0, middle: int = 0, old: int = 0,
+                 susceptibility=SUSCEPTIBILITY, activity_level=ACTIVITY_LEVEL, rng=None):
+        if rng is None:
+            rng = random.getrandbits(64)
+        rng = np.random.default_rng(rng)
+
+        sizes = (young, middle, old)
+        size = sum(sizes)
+        self.group = np.repeat(np.array([YOUNG, MIDDLE, OLD], dtype=np.int8), sizes)
+        self.susceptibility = np.empty(size, dtype=np.float64)
+        self.activity_level = np.empty(size, dtype=np.int32)
+
+        start = 0
+        for group, group_size in enumerate(sizes):
+            end = start + group_size
+            self.susceptibility[start:end] = susceptibility[group].sample(rng, group_size)
+            self.activity_level[start:end] = activity_level[group].sample(rng, group_size)
+            start = end
+
+        self.contact_network = None
+        self.reset_state()
+
+        print(f"Population created with {size} persons: ",
               f"{young} young, {middle} middle-aged, and {old} old persons.")
 
 
+    ##
+    # Creates a population from existing attribute arrays (e.g. loaded from disk).
+    # The arrays are used as they are, without copying.
+    # @param susceptibility: Array of susceptibilities.
+    # @param activity_level: Array of activity levels.
+    # @param group: Array of age group codes.
+    # @param contact_network: Optional (indptr, indices) arrays listing the possible contacts of each person.
+    # Raises ValueError if the arrays have different lengths.
+    @classmethod
+    def from_arrays(cls, susceptibility, activity_level, group, contact_network=None):
+        if not len(susceptibility) == len(activity_level) == len(group):
+            raise ValueError("Attribute arrays must have the same length")
+        population = cls.__new__(cls)
+        population.susceptibility = susceptibility
+        population.activity_level = activity_level
+        population.group = group
+        population.contact_network = None
+        if contact_network is not None:
+            population.set_contact_network(*contact_network)
+        population.reset_state()
+        return population
+
+
+    ##
+    # Resets the infection state and distancing of every person, keeping their attributes.
+    # Existing state arrays are overwritten in place, so the person views stay valid
+    # and restarting on the same population costs a few array fills.
+    def reset_state(self):
+        size = len(self.susceptibility)
+        if getattr(self, "infectious_time", None) is not None and len(self.infectious_time) == size:
+            self.infectious_time.fill(NEVER)
+            self.recovery_time.fill(NEVER)
+            self.distancing_factor.fill(1.0)
+            return
+        self.infectious_time = np.full(size, NEVER, dtype=np.int32)
+        self.recovery_time = np.full(size, NEVER, dtype=np.int32)
+        self.distancing_factor = np.ones(size, dtype=np.float64)
+        self._persons = None
+
+
+    ##
+    # Restricts the contacts of each person to a fixed set of persons.
+    # The network is given in compressed sparse row form: the possible contacts of person i
+    # are indices[indptr[i]:indptr[i + 1]].
+    # @param indptr: Array of len(population) + 1 offsets into indices.
+    # @param indices: Array of person ids.
+    # Raises ValueError if the arrays do not describe a network of this population.
+    def set_contact_network(self, indptr, indices):
+        if len(indptr) != len(self) + 1 or indptr[0] != 0 or indptr[-1] != len(indices):
+            raise ValueError("Contact network does not match the population size")
+        if len(indices) and (indices.min() < 0 or indices.max() >= len(self)):
+            raise ValueError("Contact network refers to unknown persons")
+        self.contact_network = (indptr, indices)
+
+
+    ##
+    # Returns the number of persons in each age group.
+    # @return: numpy array with one count per age group.
+    def group_sizes(self):
+        return np.bincount(self.group, minlength=len(AGE_GROUPS))
+
+
+    ##
+    # Saves the attributes, age groups and contact network to a directory of .npy files.
+    # The infection state is not saved.
+    # @param path: Directory to write to; created if it does not exist.
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in POPULATION_COLUMNS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        if self.contact_network is not None:
+            for name, array in zip(NETWORK_COLUMNS, self.contact_network):
+                np.save(os.path.join(path, f"{name}.npy"), array)
+        meta = {
+            "version": POPULATION_FORMAT_VERSION,
+            "size": len(self),
+            "group_sizes": [int(count) for count in self.group_sizes()],
+            "contact_network": self.contact_network is not None,
+        }
+        with open(os.path.join(path, "population.json"), "w") as f:
+            json.dump(meta, f)
+
+
+    ##
+    # Loads a population saved with save.
+    # By default the attribute arrays are memory-mapped read-only, so processes loading the same
+    # population share one copy in the page cache. Only the infection state is allocated.
+    # @param path: Directory written by save.
+    # @param mmap: True to memory-map the arrays, False to read them into memory.
+    # @return: The loaded Population.
+    # Raises ValueError if the directory holds an unsupported format version.
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "population.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != POPULATION_FORMAT_VERSION:
+            raise ValueError(f"Unsupported population format version: {meta['version']}")
+
+        mode = "r" if mmap else None
+        columns = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in POPULATION_COLUMNS]
+        network = None
+        if meta["contact_network"]:
+            network = tuple(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in NETWORK_COLUMNS)
+        return cls.from_arrays(*columns, contact_network=network)
+
+
+    ##
+    # Returns the number of persons in the population.
+    def __len__(self):
+        return len(self.susceptibility)
+
+
+    ##
+    # List of Person objects, one per person id.
+    # The objects are created on first access and read and write the population arrays.
+    @property
+    def persons(self):
+        if self._persons is None:
+            self._persons = [PersonView(self, i) for i in range(len(self))]
+        return self._persons
+
+
     ##
     # Prints a detailed report of each person's health status.
     # This method iterates through all persons in the population and prints their details.
@@ -83,18 +279,148 @@ class Population:
         print(f"Recovered: {status_counts[HealthStatus.Recovered]}")
 
 
+    ##
+    # Computes the health status of every person at the given time in one array operation.
+    # Uses the same rules as Person.get_status.
+    # @param time: The current time in the simulation.
+    # @return: numpy array with the HealthStatus value of each person.
+    def status_codes(self, time):
+        return compute_status_codes(self.infectious_time, self.recovery_time, time)
+
+
+    ##
+    # Counts the persons of each age group in each health status.
+    # @param time: The current time in the simulation.
+    # @param codes: Optional array of status codes for this time, as returned by status_codes.
+    # @return: numpy array of shape (age groups, 3) with Susceptible, Infected and Recovered counts.
+    def group_status_counts(self, time, codes=None):
+        if codes is None:
+            codes = self.status_codes(time)
+        counts = np.bincount(self.group * 3 + (codes - 1), minlength=3 * len(AGE_GROUPS))
+        return counts.reshape(len(AGE_GROUPS), 3)
+
+
+    ##
+    # Checks whether any infectious person can meet any susceptible person.
+    # Only infected persons with at least one daily contact and susceptible persons with
+    # a positive susceptibility count, mirroring get_contacts and Disease.attempt_infection.
+    # @param codes: Array of status codes, as returned by status_codes.
+    # @return: True if an infection is possible with the current states, False otherwise.
+    def can_spread(self, codes):
+        susceptible = (codes == SUSCEPTIBLE) & (self.susceptibility > 0)
+        if not susceptible.any():
+            return False
+        contacts = self.activity_level * self.distancing_factor
+        sources = ((codes == INFECTED) & (self.susceptibility > 0)
+                   & (self.activity_level > 0) & (self.distancing_factor > 0)
+                   & ((contacts > len(self)) | (np.round(contacts) >= 1)))
+        return bool(sources.any())
+
+
+    ##
+    # Returns the next time after the given time at which any person changes health status.
+    # Status changes happen at infectious_time (becoming infected), recovery_time (recovering)
+    # and IMMUNITY_PERIOD days after recovery_time (becoming susceptible again).
+    # @param time: The current time in the simulation.
+    # @return: The next status change time, or inf if no status changes anymore.
+    def next_transition(self, time):
+        recovery_time = self.recovery_time[self.recovery_time != NEVER]
+        next_time = inf
+        for times in (self.infectious_time, recovery_time, recovery_time.astype(np.int64) + IMMUNITY_PERIOD):
+            later = times[(times > time) & (times != NEVER)]
+            if len(later):
+                next_time = min(next_time, int(later.min()))
+        return next_time
+
+
     ##
     # Returns a list of persons that the given person can interact with.
     # The list is based on the person's activity level and distancing factor.
+    # With a contact network, the contacts are sampled from the person's neighbours only.
     # @param person: The person for whom to get contacts.
-    def get_contacts(self, person: Person):
+    # @param rng: Random number source (defaults to the random module).
+    def get_contacts(self, person: Person, rng=random):
         if person.activity_level <= 0 or person.distancing_factor <= 0:
             return []
+        if self.contact_network is not None:
+            indptr, indices = self.contact_network
+            neighbours = indices[indptr[person.id]:indptr[person.id + 1]].tolist()
+            k = min(len(neighbours), round(person.activity_level * person.distancing_factor))
+            return [self.persons[i] for i in rng.sample(neighbours, k)]
         if person.activity_level * person.distancing_factor > len(self.persons):
             return self.persons
         # Randomly sample persons based on activity level and distancing factor
-        return random.sample(self.persons,
+        return rng.sample(self.persons,
                              k = round(person.activity_level * person.distancing_factor))
 
 
+    ##
+    # Draws the contacts of a set of persons from keyed uniform numbers.
+    # The contacts are drawn like in get_contacts, but the candidate of slot j of a person only
+    # depends on the person's j-th uniform number, and duplicates are skipped. With fewer contacts
+    # a person therefore meets a prefix of the persons met with more contacts (see RandomStreams.keyed_uniforms).
+    # The slots of all persons are drawn at once; persons who drew duplicates draw further slots in another round.
+    # @param sources: Array of the ids of the contacting persons.
+    # @param uniforms: Function(persons, slots) returning the uniform numbers of arrays of person ids and slot numbers.
+    # @return: Tuple of offsets and targets: the contacts of sources[i] are targets[offsets[i]:offsets[i + 1]].
+    def contact_ids(self, sources, uniforms):
+        sources = np.asarray(sources, dtype=np.int64)
+        contacts = self.activity_level[sources] * self.distancing_factor[sources]
+        wanted = np.maximum(np.rint(contacts), 0).astype(np.int64)
+        if self.contact_network is not None:
+            indptr, indices = self.contact_network
+            start = indptr[sources]
+            size = indptr[sources + 1] - start
+            wanted = np.minimum(wanted, size)
+            everyone = np.zeros(len(sources), dtype=bool)
+        else:
+            size = np.full(len(sources), len(self), dtype=np.int64)
+            everyone = contacts > len(self)  # Meets the whole population, like in get_contacts
+            wanted[everyone] = 0
+
+        owners = np.empty(0, dtype=np.int64)
+        slots = np.empty(0, dtype=np.int64)
+        picks = np.empty(0, dtype=np.int64)
+        drawn = np.zeros(len(sources), dtype=np.int64)
+        missing = wanted
+        keep = np.empty(0, dtype=bool)
+        while missing.any():
+            # A few more slots than missing contacts, to need few rounds despite duplicates
+            count = np.where(missing > 0, 2 * missing + 4, 0)
+            new_owners = np.repeat(np.arange(len(sources)), count)
+            first = np.cumsum(count) - count
+            new_slots = np.arange(len(new_owners)) - np.repeat(first, count) + drawn[new_owners]
+            drawn += count
+            new_picks = (uniforms(sources[new_owners], new_slots) * size[new_owners]).astype(np.int64)
+            np.minimum(new_picks, size[new_owners] - 1, out=new_picks)
+
+            order = np.lexsort((np.concatenate([slots, new_slots]), np.concatenate([owners, new_owners])))
+            owners = np.concatenate([owners, new_owners])[order]
+            slots = np.concatenate([slots, new_slots])[order]
+            picks = np.concatenate([picks, new_picks])[order]
+            # The first slot of each (owner, pick) pair is kept, then the first wanted slots of each owner
+            by_pick = np.lexsort((slots, picks, owners))
+            unique = np.ones(len(owners), dtype=bool)
+            unique[by_pick[1:]] = ((owners[by_pick[1:]] != owners[by_pick[:-1]])
+                                   | (picks[by_pick[1:]] != picks[by_pick[:-1]]))
+            rank = np.cumsum(unique)
+            offsets = np.searchsorted(owners, np.arange(len(sources)))
+            rank -= np.concatenate([[0], rank])[offsets][owners]
+            keep = unique & (rank <= wanted[owners])
+            missing = wanted - np.bincount(owners[keep], minlength=len(sources))
+
+        owners, targets = owners[keep], picks[keep]
+        if self.contact_network is not None:
+            targets = np.asarray(indices[start[owners] + targets], dtype=np.int64)
+        counts = np.bincount(owners, minlength=len(sources))
+        if everyone.any():
+            counts[everyone] = len(self)
+            pieces = np.split(targets, np.cumsum(np.bincount(owners, minlength=len(sources)))[:-1])
+            targets = np.concatenate([np.arange(len(self)) if all_persons else piece
+                                      for piece, all_persons in zip(pieces, everyone)])
+        offsets = np.zeros(len(sources) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets, targets
+
+
 
@@ -0,0 +1,98 @@
+## @package randomstreams
+#  Independent random number streams for the parts of a simulation.
+#
+#  Population synthesis, the choice of patient zero, contact sampling, transmission draws,
+#  infection draws and vaccine efficacy draws each use their own stream.
+#
+#  With a seed, the contact, transmission and infection numbers are not consumed sequentially but
+#  keyed by identity: the uniform number of contact slot j of person p on day d is a hash of
+#  (seed, stream, day, person, slot) (counter-based, like Philox). Two simulations created with
+#  the same seed (common random numbers) therefore draw the same contacts and the same per-pair
+#  uniforms for every pair both of them consider, and an intervention only perturbs the pairs it
+#  actually changes instead of shifting every later draw.
+
+import random
+import numpy as np
+
+## Keyed streams (see RandomStreams.keyed_uniforms).
+CONTACTS = 1
+TRANSMISSION = 2
+INFECTION = 3
+
+_MASK = (1 << 64) - 1
+
+
+##
+# SplitMix64 finalizer of a Python integer, a bijective mixing of 64-bit values.
+def _mix_int(x):
+    x = (x + 0x9E3779B97F4A7C15) & _MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK
+    return x ^ (x >> 31)
+
+
+##
+# SplitMix64 finalizer of a uint64 array (the multiplications wrap around).
+def _mix_array(x):
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class RandomStreams:
+    ##
+    # Creates the streams.
+    # Without a seed, all streams use the global random module (so random.seed still applies)
+    # and the population and the vaccination draws are seeded from it.
+    # @param seed: Optional integer seed.
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.keyed = seed is not None  # True if keyed_uniforms can be used
+        if seed is None:
+            self.population = None
+            self.patient_zero = random
+            self.contacts = random
+            self.transmission = random
+            self.infection = random
+            self.vaccination = None
+            return
+
+        population, patient_zero, contacts, transmission, infection, vaccination = np.random.SeedSequence(seed).spawn(6)
+        self.population = np.random.default_rng(population)
+        self.patient_zero = random.Random(int(patient_zero.generate_state(1)[0]))
+        self.contacts = random.Random(int(contacts.generate_state(1)[0]))
+        self.transmission = random.Random(int(transmission.generate_state(1)[0]))
+        self.infection = random.Random(int(infection.generate_state(1)[0]))
+        self.vaccination = np.random.default_rng(vaccination)
+        self._key = int(np.random.SeedSequence(seed).generate_state(1, np.uint64)[0])
+
+    ##
+    # Returns uniform numbers keyed by identity, the same for the same key in every simulation with this seed.
+    # Raises RuntimeError if the streams have no seed.
+    # @param stream: Keyed stream (CONTACTS, TRANSMISSION or INFECTION).
+    # @param day: The simulation day.
+    # @param persons: Person id or array of person ids.
+    # @param slots: Slot number or array of slot numbers, broadcast against persons.
+    # @param salt: Optional further key, e.g. the strain of a multi-strain simulation.
+    # @return: numpy array of uniform numbers in [0, 1).
+    def keyed_uniforms(self, stream, day, persons, slots, salt=0):
+        if not self.keyed:
+            raise RuntimeError("Keyed random numbers require a seed")
+        key = _mix_int(_mix_int(_mix_int(self._key ^ stream) + salt) + int(day))
+        persons = np.asarray(persons, dtype=np.uint64)
+        slots = np.asarray(slots, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            hashed = _mix_array(_mix_array(np.uint64(key) + np.atleast_1d(persons)) + slots)
+        return (hashed >> np.uint64(11)) * (1.0 / (1 << 53))
+
+
+##
+# Random number source that returns a preset number.
+# Lets code that draws once from an rng (e.g. a TransmissionPolicy) use a keyed uniform number.
+class FixedDraw:
+    def __init__(self, value=0.0):
+        self.value = value
+
+    def random(self):
+        return self.value
@@ -0,0 +1,9 @@
+from .server import SimulationServer, ENGINES
+from .client import SimulationClient, SubmittedJob
+
+__all__ = [
+    "SimulationServer",
+    "ENGINES",
+    "SimulationClient",
+    "SubmittedJob"
+]
@@ -0,0 +1,93 @@
+## @package client
+#  Thin client for the local simulation job service.
+#
+#  Submits jobs to a running SimulationServer and iterates over the per-day results it streams back.
+
+import dataclasses
+import json
+import socket
+
+from simulation import StepRecord
+
+_RECORD_FIELDS = [field.name for field in dataclasses.fields(StepRecord)]
+
+
+##
+# A job submitted through a SimulationClient.
+# Iterating over it yields a StepRecord per simulated day as the results arrive.
+class SubmittedJob:
+    def __init__(self, connection, reader, job_id):
+        self.id = job_id
+        self.status = None
+        self.message = None
+        self._connection = connection
+        self._reader = reader
+
+    def __iter__(self):
+        for line in self._reader:
+            event = json.loads(line)
+            if "status" in event:
+                self.status = event["status"]
+                self.message = event.get("message")
+                break
+            yield StepRecord(**{name: event[name] for name in _RECORD_FIELDS})
+        self.close()
+
+    ##
+    # Closes the connection of the job. The job keeps running on the server unless it is cancelled.
+    def close(self):
+        self._reader.close()
+        self._connection.close()
+
+
+class SimulationClient:
+    ##
+    # Initializes the client.
+    # @param address: Path of the server's Unix socket, or its (host, port) tuple.
+    def __init__(self, address):
+        self.address = address
+
+    ##
+    # Submits a job to the server.
+    # @param params: SimulationParameters of the job.
+    # @param days: Number of days to simulate.
+    # @param seed: Optional seed of the run.
+    # @param engine: Engine name (see service.server.ENGINES).
+    # @param priority: Jobs with a higher priority run first.
+    # @return: SubmittedJob to iterate over the results.
+    # Raises RuntimeError if the server rejects the job.
+    def submit(self, params, days, seed=None, engine="default", priority=0):
+        connection = self._connect()
+        reader = connection.makefile("r")
+        request = {
+            "op": "submit",
+            "params": dataclasses.asdict(params),
+            "days": days,
+            "seed": seed,
+            "engine": engine,
+            "priority": priority,
+        }
+        connection.sendall((json.dumps(request) + "\n").encode())
+        reply = json.loads(reader.readline())
+        if "error" in reply:
+            reader.close()
+            connection.close()
+            raise RuntimeError(reply["error"])
+        return SubmittedJob(connection, reader, reply["job"])
+
+    ##
+    # Cancels a pending or running job.
+    # @param job_id: Id of the job.
+    # @return: True if the job was cancelled, False if it was unknown or already finished.
+    def cancel(self, job_id):
+        with self._connect() as connection, connection.makefile("r") as reader:
+            connection.sendall((json.dumps({"op": "cancel", "job": job_id}) + "\n").encode())
+            return json.loads(reader.readline())["cancelled"]
+
+    def _connect(self):
+        if isinstance(self.address, str):
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        connection.connect(self.address)
+        return connection
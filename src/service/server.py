@@ -0,0 +1,326 @@
+## @package server
+#  Local simulation job service.
+#
+#  The server accepts simulation jobs over a Unix socket or a localhost TCP port and runs them
+#  on a fixed pool of worker processes shared by all clients. Pending jobs are ordered by
+#  priority, jobs can be cancelled while pending or running, and the per-day results of a job
+#  are streamed back to the client that submitted it.
+#
+#  The protocol uses one JSON object per line. A client sends either
+#    {"op": "submit", "params": {...}, "days": 100, "seed": 1, "engine": "default", "priority": 0}
+#  and then receives {"job": id}, one {"job": id, "day": ..., "susceptible": ..., ...} line per
+#  simulated day and a final {"job": id, "status": "done" | "cancelled" | "error" | "failed"}, or
+#    {"op": "cancel", "job": id}
+#  and receives {"job": id, "cancelled": true | false}.
+
+import argparse
+import dataclasses
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import socketserver
+import stat
+import threading
+
+from models import SimulationParameters
+from simulation import Simulation
+
+## Engines a job can choose from, mapped to Simulation.skip_quiescent.
+ENGINES = {
+    "default": True,    # Fast-forwards over quiescent days
+    "stepwise": False,  # Simulates every day
+}
+
+
+##
+# Runs jobs received over a pipe until it receives None.
+# Between days the worker checks the pipe for a cancel message.
+# @param conn: Worker end of a multiprocessing Pipe.
+def _worker_main(conn):
+    while True:
+        job = conn.recv()
+        if job is None:
+            return
+        if job == "cancel":  # Cancel message for a job that has already finished
+            continue
+        try:
+            simulation = Simulation()
+            simulation.setup_simulation(SimulationParameters(**job["params"]), seed=job["seed"])
+            simulation.skip_quiescent = ENGINES[job["engine"]]
+            status = "done"
+            for record in simulation.iter_steps(job["days"]):
+                conn.send(("day", dataclasses.asdict(record)))
+                if conn.poll() and conn.recv() == "cancel":
+                    status = "cancelled"
+                    break
+            conn.send((status, None))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+##
+# A submitted job and the queue its events are delivered to.
+class Job:
+    def __init__(self, job_id, spec, priority):
+        self.id = job_id
+        self.spec = spec
+        self.priority = priority
+        self.events = queue.Queue()
+        self.cancelled = False
+        self.worker = None
+
+
+##
+# One worker process and the thread that feeds it jobs from the server's queue.
+# If the process dies (e.g. killed or out of memory), its job fails and a new process is started.
+class _Worker:
+    def __init__(self, server):
+        self.server = server
+        self._send_lock = threading.Lock()
+        self._start_process()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _start_process(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()  # Only the child holds its end, so recv raises EOFError when the child dies
+
+    def _run(self):
+        while True:
+            job = self.server.next_job(self)
+            if job is None:
+                try:
+                    self._send(None)
+                except OSError:
+                    pass
+                self.process.join()
+                return
+            try:
+                self._send(job.spec)
+                while True:
+                    kind, data = self.conn.recv()
+                    if kind == "day":
+                        job.events.put(dict(data, job=job.id))
+                        continue
+                    event = {"job": job.id, "status": kind}
+                    if data is not None:
+                        event["message"] = data
+                    break
+            except (EOFError, OSError):
+                event = {"job": job.id, "status": "failed",
+                         "message": f"Worker process exited with code {self._restart()}"}
+            self.server.finish_job(job)
+            job.events.put(event)
+
+    ##
+    # Replaces a dead worker process with a new one.
+    # @return: Exit code of the dead process.
+    def _restart(self):
+        self.process.kill()
+        self.process.join()
+        exitcode = self.process.exitcode
+        self.conn.close()
+        with self._send_lock:
+            self._start_process()
+        return exitcode
+
+    ##
+    # Asks the worker process to stop the job it is running.
+    # Does nothing if the process has died; its job then fails.
+    def cancel(self):
+        try:
+            self._send("cancel")
+        except OSError:
+            pass
+
+    def _send(self, message):
+        with self._send_lock:
+            self.conn.send(message)
+
+
+class SimulationServer:
+    ##
+    # Initializes the server and starts the worker processes.
+    # @param address: Path of a Unix socket, or a (host, port) tuple for TCP (port 0 picks a free port).
+    # @param workers: Number of worker processes (defaults to the number of CPUs).
+    def __init__(self, address, workers=None):
+        self._pending = []
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._closing = False
+
+        if isinstance(address, str):
+            # Only a stale socket is removed, never a regular file at that path
+            if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+                os.remove(address)
+            self._socket_server = _UnixServer(address, _Handler)
+        else:
+            self._socket_server = _TCPServer(address, _Handler)
+        self._socket_server.service = self
+        self.address = self._socket_server.server_address
+        self._workers = [_Worker(self) for _ in range(workers or os.cpu_count() or 1)]
+
+    ##
+    # Handles requests until shutdown is called.
+    def serve_forever(self):
+        self._socket_server.serve_forever()
+
+    ##
+    # Starts handling requests in a background thread.
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    ##
+    # Stops accepting requests, cancels pending jobs and stops the workers after their current job.
+    def shutdown(self):
+        self._socket_server.shutdown()
+        self._socket_server.server_close()
+        with self._condition:
+            self._closing = True
+            for _, _, job in self._pending:
+                self._cancel_pending(job)
+            self._pending = []
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.thread.join()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    ##
+    # Queues a job.
+    # @param spec: Dictionary with "params", "days", "seed" and "engine".
+    # @param priority: Jobs with a higher priority run first; equal priorities run in submission order.
+    # @return: The queued Job.
+    # Raises ValueError if the job specification is invalid.
+    def submit(self, spec, priority=0):
+        SimulationParameters(**spec["params"])
+        if spec["engine"] not in ENGINES:
+            raise ValueError(f"Unknown engine: {spec['engine']}")
+        if spec["days"] < 0:
+            raise ValueError("Number of days must be non-negative")
+        with self._condition:
+            if self._closing:
+                raise RuntimeError("Server is shutting down")
+            job = Job(next(self._ids), spec, priority)
+            self._jobs[job.id] = job
+            heapq.heappush(self._pending, (-priority, next(self._order), job))
+            self._condition.notify()
+        return job
+
+    ##
+    # Cancels a pending or running job.
+    # @param job_id: Id of the job.
+    # @return: True if the job was cancelled, False if it is unknown or already finished.
+    def cancel(self, job_id):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.cancelled:
+                return False
+            job.cancelled = True
+            if job.worker is not None:
+                job.worker.cancel()
+            else:
+                self._cancel_pending(job)
+        return True
+
+    ##
+    # Returns the next pending job for a worker, waiting until one is available.
+    # @param worker: The worker that will run the job.
+    # @return: The next Job, or None when the server shuts down.
+    def next_job(self, worker):
+        with self._condition:
+            while True:
+                while self._pending:
+                    _, _, job = heapq.heappop(self._pending)
+                    if not job.cancelled:
+                        job.worker = worker
+                        return job
+                if self._closing:
+                    return None
+                self._condition.wait()
+
+    ##
+    # Forgets a finished job.
+    def finish_job(self, job):
+        with self._condition:
+            self._jobs.pop(job.id, None)
+
+    def _cancel_pending(self, job):
+        self._jobs.pop(job.id, None)
+        job.events.put({"job": job.id, "status": "cancelled"})
+
+
+##
+# Handles one client connection, reading one JSON request per line.
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("op") == "submit":
+                    self._submit(request)
+                elif request.get("op") == "cancel":
+                    self._send({"job": request["job"], "cancelled": self.server.service.cancel(request["job"])})
+                else:
+                    self._send({"error": f"Unknown operation: {request.get('op')}"})
+            except (ValueError, KeyError, TypeError, RuntimeError) as e:
+                self._send({"error": str(e)})
+
+    def _submit(self, request):
+        spec = {
+            "params": request["params"],
+            "days": request["days"],
+            "seed": request.get("seed"),
+            "engine": request.get("engine", "default"),
+        }
+        job = self.server.service.submit(spec, request.get("priority", 0))
+        try:
+            self._send({"job": job.id})
+            while True:
+                event = job.events.get()
+                self._send(event)
+                if "status" in event:
+                    return
+        except OSError:
+            # The client disconnected, so nobody waits for the results anymore
+            self.server.service.cancel(job.id)
+
+    def _send(self, message):
+        self.wfile.write((json.dumps(message) + "\n").encode())
+        self.wfile.flush()
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local simulation job service.")
+    parser.add_argument("--socket", help="Path of the Unix socket to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Localhost TCP port if no socket is given")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+
+    address = args.socket if args.socket else ("127.0.0.1", args.port)
+    server = SimulationServer(address, args.workers)
+    print(f"Simulation service listening on {server.address} with {len(server._workers)} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
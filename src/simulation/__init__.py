@@ -1,7 +1,62 @@
 from .simulation import Simulation
 from .statstracker import StatsTracker
+from .tieredhistory import TieredHistory, HistoryBlock
+from .stepmetrics import StepMetrics
+from .infectionlog import InfectionLog
+from .multistrain import Strain, MultiStrainSimulation
+from .preview import ProgressivePreview, downsampled_parameters
+from .asyncsimulation import AsyncSimulation
+from .interventionschedule import (
+    Intervention,
+    SocialDistancing,
+    ActivityCap,
+    TransmissionMultiplier,
+    InterventionSchedule
+)
+from .vaccination import VaccinationCampaign, VaccinationProgram
+from .outputwriter import (
+    OutputWriter,
+    CsvWriter,
+    JsonLinesWriter,
+    NpyWriter
+)
+from .stopcondition import (
+    StepRecord,
+    StopCondition,
+    NoInfections,
+    PeakPassed,
+    AttackRateReached
+)
+from .resultcache import ResultCache, engine_version
 
 __all__ = [
     "Simulation",
-    "StatsTracker"
+    "StatsTracker",
+    "TieredHistory",
+    "HistoryBlock",
+    "StepMetrics",
+    "InfectionLog",
+    "Strain",
+    "MultiStrainSimulation",
+    "ProgressivePreview",
+    "downsampled_parameters",
+    "AsyncSimulation",
+    "Intervention",
+    "SocialDistancing",
+    "ActivityCap",
+    "TransmissionMultiplier",
+    "InterventionSchedule",
+    "VaccinationCampaign",
+    "VaccinationProgram",
+    "OutputWriter",
+    "CsvWriter",
+    "JsonLinesWriter",
+    "NpyWriter",
+    "StepRecord",
+    "StopCondition",
+    "NoInfections",
+    "PeakPassed",
+    "AttackRateReached",
+    "ResultCache",
+    "engine_version"
 ]
@@ -0,0 +1,109 @@
+## @package asyncsimulation
+#  Asyncio facade of the simulation.
+#
+#  The days are simulated in chunks on an executor, and control returns to the event loop
+#  between chunks, so many simulations can be driven from one event loop without blocking it.
+#  A simulation is only ever stepped by one chunk at a time. The lock is only held while a chunk
+#  runs, never while records are handed to the caller, so a caller that stops iterating early
+#  does not block later calls.
+
+import asyncio
+import itertools
+
+from .simulation import Simulation
+
+## Number of days simulated per executor call.
+CHUNK_DAYS = 7
+
+
+class AsyncSimulation:
+    ##
+    # Initializes the facade.
+    # @param simulation: Optional Simulation to drive (defaults to a new one).
+    # @param executor: Optional concurrent.futures executor (defaults to the event loop's default executor).
+    #                  A process pool cannot be used, the simulation stays in this process.
+    # @param chunk_days: Number of days simulated per executor call.
+    # Raises ValueError if chunk_days is not positive.
+    def __init__(self, simulation=None, executor=None, chunk_days=CHUNK_DAYS):
+        if chunk_days <= 0:
+            raise ValueError("Chunk size must be positive")
+        self.simulation = Simulation() if simulation is None else simulation
+        self.executor = executor
+        self.chunk_days = chunk_days
+        self._lock = asyncio.Lock()
+        self._running = None  # Executor call that outlived a cancelled caller
+
+    ##
+    # Returns the current time of the simulation.
+    @property
+    def current_time(self):
+        return self.simulation.current_time
+
+    ##
+    # Returns the StatsTracker of the simulation.
+    @property
+    def stats(self):
+        return self.simulation.stats
+
+    ##
+    # Sets up the simulation on the executor (see Simulation.setup_simulation).
+    async def setup(self, params, population=None, seed=None):
+        async with self._lock:
+            await self._call(self.simulation.setup_simulation, params, population, seed)
+
+    ##
+    # Runs the simulation for a number of days, one chunk at a time.
+    # @param days: The number of days to run the simulation.
+    # @param stop_conditions: Optional StopCondition objects that end the run early.
+    # @return: The number of days that were simulated.
+    # Raises RuntimeError if the simulation is not set up.
+    async def run(self, days, stop_conditions=()):
+        if stop_conditions:
+            simulated = 0
+            async for _ in self.steps(days, stop_conditions):
+                simulated += 1
+            return simulated
+
+        async with self._lock:
+            simulated = 0
+            while simulated < days:
+                simulated += await self._call(self.simulation.run_simulation, min(self.chunk_days, days - simulated))
+            return simulated
+
+    ##
+    # Simulates day after day and yields a StepRecord after each one (see Simulation.iter_steps).
+    # The records of a chunk are simulated together and then yielded one by one.
+    # Other calls may step the simulation between two chunks.
+    # @param max_days: Maximum number of days to simulate, None for no limit.
+    # @param stop_conditions: StopCondition objects checked after every day.
+    # Raises RuntimeError if the simulation is not set up.
+    async def steps(self, max_days=None, stop_conditions=()):
+        steps = self.simulation.iter_steps(max_days, stop_conditions)
+        while True:
+            async with self._lock:
+                records = await self._call(_take, steps, self.chunk_days)
+            for record in records:
+                yield record
+            if len(records) < self.chunk_days:
+                return
+
+    ##
+    # Calls a function on the executor.
+    # If the caller is cancelled the call still finishes, and the next call waits for it.
+    async def _call(self, function, *args):
+        if self._running is not None:
+            await asyncio.wait([self._running])
+            self._running = None
+        future = asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self._running = future
+            raise
+
+
+##
+# Advances a generator by up to a number of items.
+# @return: List of the items.
+def _take(iterator, count):
+    return list(itertools.islice(iterator, count))
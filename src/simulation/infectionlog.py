@@ -0,0 +1,215 @@
+## @package infectionlog
+#  Streaming log of who infected whom.
+#
+#  Every infection is stored as a (day, infector id, infectee id) row of int32 values in fixed-size
+#  chunks. Full chunks are written to .npy files when a directory is given and read back
+#  memory-mapped, so the log of a large run does not have to fit into memory: chunks() iterates
+#  over them lazily. Ancestor and descendant queries use an index over the infection events that
+#  is built when a query finds new events; it keeps only its link arrays and reads the returned
+#  rows from the chunks.
+
+import os
+import numpy as np
+
+## Columns of an infection event.
+EVENT_COLUMNS = ("day", "infector", "infectee")
+
+
+class InfectionLog:
+    ##
+    # Initializes an empty log.
+    # @param chunk_size: Number of events per chunk.
+    # @param directory: Optional directory that full chunks are spilled to; created if it does not exist.
+    # Raises ValueError if chunk_size is not positive.
+    def __init__(self, chunk_size=1 << 16, directory=None):
+        if chunk_size <= 0:
+            raise ValueError("Chunk size must be positive")
+        self.chunk_size = chunk_size
+        self.directory = directory
+        self._chunks = []  # Full chunks, in memory or memory-mapped from their files
+        self._buffer = np.empty((chunk_size, len(EVENT_COLUMNS)), dtype=np.int32)
+        self._filled = 0
+        self._index = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    ##
+    # Opens the chunks spilled to a directory by an earlier log.
+    # @param directory: Directory written by an InfectionLog.
+    # @param chunk_size: Number of events per chunk for new events.
+    # @return: InfectionLog holding the spilled events.
+    @classmethod
+    def load(cls, directory, chunk_size=1 << 16):
+        log = cls(chunk_size, directory)
+        names = sorted(name for name in os.listdir(directory) if name.startswith("chunk_") and name.endswith(".npy"))
+        log._chunks = [np.load(os.path.join(directory, name), mmap_mode="r") for name in names]
+        return log
+
+    ##
+    # Records the infections of one day.
+    # @param day: Day on which the infections happened.
+    # @param infectors: Ids of the infectors.
+    # @param infectees: Ids of the infected persons, in the same order.
+    def record(self, day, infectors, infectees):
+        infectors = np.asarray(infectors, dtype=np.int32)
+        infectees = np.asarray(infectees, dtype=np.int32)
+        start = 0
+        while start < len(infectees):
+            count = min(len(infectees) - start, self.chunk_size - self._filled)
+            rows = self._buffer[self._filled:self._filled + count]
+            rows[:, 0] = day
+            rows[:, 1] = infectors[start:start + count]
+            rows[:, 2] = infectees[start:start + count]
+            self._filled += count
+            start += count
+            if self._filled == self.chunk_size:
+                self.flush()
+
+    ##
+    # Moves the buffered events into a chunk, written to the directory if there is one.
+    def flush(self):
+        if self._filled == 0:
+            return
+        chunk = self._buffer[:self._filled].copy()
+        if self.directory is not None:
+            path = os.path.join(self.directory, f"chunk_{len(self._chunks):06d}.npy")
+            np.save(path, chunk)
+            chunk = np.load(path, mmap_mode="r")
+        self._chunks.append(chunk)
+        self._filled = 0
+
+    ##
+    # Returns the number of logged events.
+    def __len__(self):
+        return sum(len(chunk) for chunk in self._chunks) + self._filled
+
+    ##
+    # Iterates over the logged events chunk by chunk, in the order they were recorded.
+    # Spilled chunks are memory-mapped; the last item is a view of the buffered events,
+    # which is overwritten by events recorded later.
+    # @return: Generator of int32 arrays of shape (events, 3) with the columns day, infector, infectee.
+    def chunks(self):
+        yield from self._chunks
+        if self._filled:
+            yield self._buffer[:self._filled]
+
+    ##
+    # Returns all logged events in the order they were recorded, loaded into one array.
+    # Use chunks to go through a large log without loading it.
+    # @return: int32 array of shape (events, 3) with the columns day, infector, infectee.
+    def events(self):
+        parts = list(self.chunks())
+        return np.concatenate(parts) if parts else self._buffer[:0].copy()
+
+    ##
+    # Returns the events with the given positions in the log, read from their chunks.
+    # @param positions: Array of event positions (0 for the first recorded event).
+    # @return: int32 array of shape (len(positions), 3).
+    def _rows(self, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        parts = list(self.chunks())
+        starts = np.cumsum([0] + [len(part) for part in parts])
+        rows = np.empty((len(positions), len(EVENT_COLUMNS)), dtype=np.int32)
+        owners = np.searchsorted(starts, positions, side="right") - 1
+        for owner in np.unique(owners):
+            selected = owners == owner
+            rows[selected] = parts[owner][positions[selected] - starts[owner]]
+        return rows
+
+    ##
+    # Returns the chain of infections that led to a person's infection, most recent first.
+    # @param person_id: Id of the infected person.
+    # @param day: Optional day; the person's last infection on or before it is traced (default: the last infection).
+    # @return: int32 array of (day, infector, infectee) rows, empty if the person was not infected by a logged event.
+    def ancestors(self, person_id, day=None):
+        index = self._get_index()
+        event = index.infection_of(person_id, day)
+        chain = []
+        while event >= 0:
+            chain.append(event)
+            event = index.parent[event]
+        return self._rows(chain)
+
+    ##
+    # Returns all infections caused directly or indirectly by a person's infection.
+    # @param person_id: Id of the infector.
+    # @param day: Optional day; the person's last infection on or before it is traced (default: the last infection).
+    #             Persons without a logged infection, like patient zero, are traced from their own infections.
+    # @return: int32 array of (day, infector, infectee) rows in breadth-first order.
+    def descendants(self, person_id, day=None):
+        index = self._get_index()
+        event = index.infection_of(person_id, day)
+        if event >= 0:
+            frontier = index.children(np.array([event]))
+        else:
+            frontier = np.flatnonzero((index.infectors == person_id) & (index.parent == -1))
+        found = []
+        while len(frontier):
+            found.append(frontier)
+            frontier = index.children(frontier)
+        return self._rows(np.concatenate(found) if found else [])
+
+    ##
+    # Returns the index, rebuilt if events were recorded since it was built.
+    def _get_index(self):
+        if self._index is None or self._index.size != len(self):
+            self._index = _TreeIndex(self.chunks())
+        return self._index
+
+
+##
+# Links every infection event to the event that infected its infector.
+# Events are identified by their position in the log.
+class _TreeIndex:
+    ##
+    # Builds the index column by column from the chunks of a log.
+    # @param chunks: Iterable of int32 arrays of shape (events, 3).
+    def __init__(self, chunks):
+        columns = [[], [], []]
+        for chunk in chunks:
+            for column, values in zip(columns, chunk.T):
+                column.append(values)
+        days, infectors, infectees = (np.concatenate(column).astype(np.int64) if column
+                                      else np.empty(0, dtype=np.int64) for column in columns)
+        self.size = len(days)
+        self.infectors = infectors
+
+        # Events sorted by infectee and day, to find a person's last infection before a day
+        self._span = int(days.max()) + 2 if len(days) else 1
+        self._order = np.lexsort((days, infectees))
+        self._keys = infectees[self._order] * self._span + days[self._order]
+
+        # The parent of an event is the infector's last infection before the event's day
+        self.parent = self._find(infectors, days - 1)
+
+        # Children of every event in CSR form
+        has_parent = np.flatnonzero(self.parent >= 0)
+        by_parent = has_parent[np.argsort(self.parent[has_parent], kind="stable")]
+        self._children = by_parent
+        self._indptr = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.parent[has_parent], minlength=self.size), out=self._indptr[1:])
+
+    ##
+    # Returns the event of a person's last infection on or before a day, -1 if there is none.
+    def infection_of(self, person_id, day=None):
+        day = self._span - 1 if day is None else min(day, self._span - 1)
+        return int(self._find(np.array([person_id], dtype=np.int64), np.array([day], dtype=np.int64))[0])
+
+    ##
+    # Returns the events caused by the given events.
+    def children(self, events):
+        starts = self._indptr[events]
+        lengths = self._indptr[events + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return self._children[offsets]
+
+    ##
+    # Finds the last infection of each person on or before the matching day.
+    def _find(self, persons, days):
+        if not len(self._keys):
+            return np.full(len(persons), -1, dtype=np.int64)
+        queries = persons * self._span + days
+        positions = np.searchsorted(self._keys, queries, side="right") - 1
+        found = np.maximum(positions, 0)
+        valid = (positions >= 0) & (self._keys[found] // self._span == persons) & (days >= 0)
+        return np.where(valid, self._order[found], -1)
@@ -0,0 +1,197 @@
+## @package interventionschedule
+#  Declarative, time-scheduled interventions for the simulation.
+#
+#  An InterventionSchedule holds interventions with start and end days (social distancing
+#  by age group, activity caps and transmission-rate multipliers). When it is attached to a
+#  population, every intervention precomputes its per-person contact factors once. On each
+#  day where the set of active interventions changes, the schedule combines the precomputed
+#  arrays, so no per-person Python loop is needed when an intervention starts or ends.
+
+import abc
+from math import inf
+import numpy as np
+
+from models.population import distancing_factor, group_codes
+
+
+class Intervention(abc.ABC):
+    ##
+    # Initializes an intervention active on days start_day <= day < end_day.
+    # @param start_day: First day on which the intervention is active.
+    # @param end_day: First day on which the intervention is no longer active (inf for never).
+    # @param groups: Age groups the intervention applies to ("young", "middle", "old"), None for everyone.
+    # Raises ValueError if the days are invalid.
+    def __init__(self, start_day, end_day=inf, groups=None):
+        if start_day < 0:
+            raise ValueError("Start day must be non-negative")
+        if end_day <= start_day:
+            raise ValueError("End day must be after start day")
+        self.start_day = start_day
+        self.end_day = end_day
+        self.groups = None if groups is None else group_codes(groups)
+
+    ##
+    # Returns True if the intervention is active on the given day.
+    # @param day: The simulation day.
+    def is_active(self, day):
+        return self.start_day <= day < self.end_day
+
+    ##
+    # Returns a boolean mask of the persons the intervention applies to.
+    # @param population: The population the intervention is applied to.
+    def applies_to(self, population):
+        if self.groups is None:
+            return np.ones(len(population), dtype=bool)
+        return np.isin(population.group, self.groups)
+
+    ##
+    # Computes the per-person multiplier of the number of daily contacts.
+    # @param population: The population the intervention is applied to.
+    # @return: Array with one factor per person, or None if contacts are not affected.
+    def contact_factors(self, population):
+        return None
+
+    ##
+    # Returns the multiplier of the disease's transmission rate while the intervention is active.
+    def transmission_multiplier(self):
+        return 1.0
+
+    ##
+    # Abstract method to get the name of the intervention.
+    # @return: A string representing the name of the intervention.
+    @abc.abstractmethod
+    def get_intervention_name(self):
+        pass
+
+
+##
+# SocialDistancing reduces contacts the same way as the Social Distancing button,
+# but only for the selected age groups and days.
+class SocialDistancing(Intervention):
+    def contact_factors(self, population):
+        factors = np.ones(len(population))
+        mask = self.applies_to(population)
+        factors[mask] = distancing_factor(population.activity_level[mask])
+        return factors
+
+    def get_intervention_name(self):
+        return "Social Distancing"
+
+
+##
+# ActivityCap limits the number of daily contacts of the selected age groups to a maximum.
+class ActivityCap(Intervention):
+    ##
+    # Initializes the activity cap.
+    # @param start_day: First day on which the cap is active.
+    # @param end_day: First day on which the cap is no longer active (inf for never).
+    # @param cap: Maximum number of daily contacts.
+    # @param groups: Age groups the cap applies to, None for everyone.
+    # Raises ValueError if the cap is negative.
+    def __init__(self, start_day, end_day=inf, cap=0, groups=None):
+        super().__init__(start_day, end_day, groups)
+        if cap < 0:
+            raise ValueError("Activity cap must be non-negative")
+        self.cap = cap
+
+    def contact_factors(self, population):
+        factors = np.ones(len(population))
+        mask = self.applies_to(population) & (population.activity_level > self.cap)
+        factors[mask] = self.cap / population.activity_level[mask]
+        return factors
+
+    def get_intervention_name(self):
+        return f"Activity Cap ({self.cap})"
+
+
+##
+# TransmissionMultiplier scales the disease's transmission rate (e.g. masks or hygiene measures).
+class TransmissionMultiplier(Intervention):
+    ##
+    # Initializes the transmission multiplier.
+    # @param start_day: First day on which the multiplier is active.
+    # @param end_day: First day on which the multiplier is no longer active (inf for never).
+    # @param multiplier: Factor applied to the transmission rate.
+    # Raises ValueError if the multiplier is negative.
+    def __init__(self, start_day, end_day=inf, multiplier=1.0):
+        super().__init__(start_day, end_day)
+        if multiplier < 0:
+            raise ValueError("Transmission multiplier must be non-negative")
+        self.multiplier = multiplier
+
+    def transmission_multiplier(self):
+        return self.multiplier
+
+    def get_intervention_name(self):
+        return f"Transmission Multiplier ({self.multiplier})"
+
+
+class InterventionSchedule:
+    ##
+    # Initializes the schedule with a list of interventions.
+    # @param interventions: Iterable of Intervention objects.
+    def __init__(self, interventions=()):
+        self.interventions = list(interventions)
+        self.contact_factor = 1.0
+        self.transmission_multiplier = 1.0
+        self._factors = None
+        self._active = None
+
+    ##
+    # Adds an intervention to the schedule.
+    # The schedule has to be attached again before the intervention takes effect.
+    # @param intervention: The Intervention to add.
+    def add(self, intervention):
+        self.interventions.append(intervention)
+        self._factors = None
+
+    ##
+    # Precomputes the contact factors of every intervention for the given population.
+    # @param population: The population the schedule is applied to.
+    def attach(self, population):
+        self._factors = [intervention.contact_factors(population) for intervention in self.interventions]
+        self._active = None
+        self.contact_factor = 1.0
+        self.transmission_multiplier = 1.0
+
+    ##
+    # Updates the combined contact factor and transmission multiplier for the given day.
+    # The precomputed arrays are only combined when the set of active interventions changes.
+    # Raises RuntimeError if the schedule is not attached to a population.
+    # @param day: The simulation day.
+    # @return: True if the active interventions changed, False otherwise.
+    def update(self, day):
+        if self._factors is None:
+            raise RuntimeError("Intervention schedule not attached. Call attach first.")
+
+        active = tuple(i for i, intervention in enumerate(self.interventions) if intervention.is_active(day))
+        if active == self._active:
+            return False
+        self._active = active
+
+        contact_factor = 1.0
+        transmission_multiplier = 1.0
+        for i in active:
+            if self._factors[i] is not None:
+                contact_factor = contact_factor * self._factors[i]
+            transmission_multiplier *= self.interventions[i].transmission_multiplier()
+
+        self.contact_factor = contact_factor
+        self.transmission_multiplier = transmission_multiplier
+        return True
+
+    ##
+    # Returns the next day after the given day on which an intervention starts or ends.
+    # @param day: The simulation day.
+    # @return: The next change day, or inf if the schedule does not change anymore.
+    def next_change(self, day):
+        days = [d for intervention in self.interventions
+                for d in (intervention.start_day, intervention.end_day) if d > day]
+        return min(days, default=inf)
+
+    ##
+    # Returns the names of the interventions active on the given day.
+    # @param day: The simulation day.
+    def active_interventions(self, day):
+        return [intervention.get_intervention_name() for intervention in self.interventions
+                if intervention.is_active(day)]
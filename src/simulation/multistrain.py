@@ -0,0 +1,222 @@
+## @package multistrain
+#  Simulation of several co-circulating strains in one population.
+#
+#  Every strain is a Disease with its own TransmissionPolicy and its own infection times per
+#  person. Contacts are drawn once per infected person and day and shared by all strains the
+#  person carries, so adding a strain costs far less than running another simulation.
+#  Optional cross-immunity reduces the susceptibility to a strain of persons who are infected
+#  with, or still immune to, another strain.
+#  Seeded runs key the contacts and the per-pair draws by day, person and contact slot like
+#  Simulation (the strain is a further key of the draws), so a single strain reproduces Simulation.
+
+import numpy as np
+
+from models import Population, RandomStreams, NEVER
+from models.randomstreams import FixedDraw, CONTACTS, TRANSMISSION, INFECTION
+from models.healthstatus import SUSCEPTIBLE, INFECTED
+from models.population import compute_status_codes
+from .statstracker import StatsTracker
+
+
+##
+# One strain of a multi-strain simulation and its per-person state.
+class Strain:
+    ##
+    # @param disease: Disease describing the strain.
+    # @param size: Number of persons in the population.
+    def __init__(self, disease, size):
+        self.disease = disease
+        self.infectious_time = np.full(size, NEVER, dtype=np.int32)
+        self.recovery_time = np.full(size, NEVER, dtype=np.int32)
+        self.stats = StatsTracker()
+        self.new_infections = 0
+        self.cumulative_infections = 0
+
+    ##
+    # Computes the status of every person with respect to this strain.
+    # @param time: The current time in the simulation.
+    # @return: numpy array of status codes, indexed by person id.
+    def status_codes(self, time):
+        return compute_status_codes(self.infectious_time, self.recovery_time, time)
+
+    ##
+    # Infects a person with this strain.
+    # @param person_id: Id of the person.
+    # @param time: The current time in the simulation.
+    def infect(self, person_id, time):
+        self.infectious_time[person_id] = time
+        self.recovery_time[person_id] = time + self.disease.incubation_period + self.disease.infectious_period
+
+
+class MultiStrainSimulation:
+    ##
+    # Initializes the MultiStrainSimulation class.
+    def __init__(self):
+        self.population = None
+        self.strains = []
+        self.cross_immunity = None
+        self.streams = None
+        self.current_time = -1
+        self._status = None
+        self._status_time = None
+        self._draw = FixedDraw()
+
+    ##
+    # Sets up the population and one patient zero per strain.
+    # @param params: SimulationParameters providing the population sizes.
+    # @param diseases: List of Disease objects, one per strain.
+    # @param cross_immunity: Optional matrix where entry [a][b] in [0, 1] is the protection against strain a
+    #                        of a person infected with or immune to strain b. The diagonal is ignored.
+    # @param population: Optional existing Population to use instead of generating a new one.
+    # @param seed: Optional seed of the random streams.
+    # Raises ValueError if no disease is given, the cross-immunity matrix is invalid,
+    # or the population's age groups do not match the parameters.
+    def setup_simulation(self, params, diseases, cross_immunity=None, population=None, seed=None):
+        if not diseases:
+            raise ValueError("At least one strain is required")
+        if cross_immunity is not None:
+            cross_immunity = np.asarray(cross_immunity, dtype=np.float64)
+            if cross_immunity.shape != (len(diseases), len(diseases)):
+                raise ValueError("Cross-immunity matrix must have one row and column per strain")
+            if ((cross_immunity < 0) | (cross_immunity > 1)).any():
+                raise ValueError("Cross-immunity must be between 0 and 1")
+
+        self.streams = RandomStreams(seed)
+        if population is None:
+            population = Population(params.young_population,
+                                    params.middle_population,
+                                    params.old_population,
+                                    rng=self.streams.population)
+        else:
+            expected = [params.young_population, params.middle_population, params.old_population]
+            if list(population.group_sizes()) != expected:
+                raise ValueError("Population age groups do not match the simulation parameters")
+            population.reset_state()
+        self.population = population
+        self.cross_immunity = cross_immunity
+
+        self.strains = []
+        for disease in diseases:
+            disease.policy.rng = self._draw if self.streams.keyed else self.streams.transmission
+            strain = Strain(disease, len(population))
+            # Like in Simulation, patient zero stays infected at all times
+            strain.infectious_time[self.streams.patient_zero.randrange(len(population))] = 0
+            strain.cumulative_infections = 1
+            self.strains.append(strain)
+        self.current_time = 0
+        self._status_time = None
+
+    ##
+    # Runs the simulation for a number of days.
+    # @param no_days: The number of days to run the simulation.
+    # @return: The number of days that were simulated.
+    def run_simulation(self, no_days):
+        for _ in range(no_days):
+            self.simulate_step()
+        return no_days
+
+    ##
+    # Returns the status codes of all persons for every strain at the current time.
+    # @return: numpy array of shape (strains, persons).
+    def status_codes(self):
+        if self._status_time != self.current_time:
+            self._status = np.stack([strain.status_codes(self.current_time) for strain in self.strains])
+            self._status_time = self.current_time
+        return self._status
+
+    ##
+    # Simulates one day of all strains.
+    # Raises RuntimeError if the simulation is not set up before calling this method.
+    def simulate_step(self):
+        if self.current_time == -1:
+            raise RuntimeError("Simulation not set up. Call setup_simulation first.")
+
+        codes = self.status_codes()
+        statuses = [row.tobytes() for row in codes]
+        protection = self._protection(codes)
+        infected = codes == INFECTED
+        persons = self.population.persons
+
+        if self.streams.keyed:
+            infected_today = self._keyed_interactions(codes, statuses, infected)
+        else:
+            infected_today = []  # (strain index, person, infection draw)
+            for person_id in np.flatnonzero(infected.any(axis=0)):
+                person = persons[person_id]
+                # One contact draw per person and day, shared by all strains the person carries
+                contacts = self.population.get_contacts(person, self.streams.contacts)
+                if not contacts:
+                    continue
+                for index in np.flatnonzero(infected[:, person_id]):
+                    disease = self.strains[index].disease
+                    newly_infected = person.interact(disease, contacts, self.current_time, statuses[index])
+                    infected_today += [(index, target, None) for target in newly_infected]
+
+        newly_infected_ids = [set() for _ in self.strains]
+        for index, person, draw in infected_today:
+            susceptibility = person.susceptibility
+            if protection is not None:
+                susceptibility *= protection[index, person.id]
+            if draw is None:
+                draw = self.streams.infection.random()
+            if draw <= susceptibility:
+                self.strains[index].infect(person.id, self.current_time)
+                if protection is not None and person.id not in newly_infected_ids[index]:
+                    # The new infection already protects against the other strains on this day
+                    others = np.arange(len(self.strains)) != index
+                    protection[others, person.id] *= 1 - self.cross_immunity[others, index]
+                newly_infected_ids[index].add(person.id)
+
+        self.current_time += 1
+        codes = self.status_codes()
+        for strain, ids, strain_codes in zip(self.strains, newly_infected_ids, codes):
+            strain.new_infections = len(ids)
+            strain.cumulative_infections += len(ids)
+            strain.stats.record_step(self.current_time, self.population, strain_codes)
+
+    ##
+    # Draws the contacts of all infected persons from keyed uniform numbers and attempts the infections
+    # of every strain they carry (see Simulation.keyed_interactions).
+    # @param codes: Status codes of shape (strains, persons).
+    # @param statuses: The codes of each strain as bytes.
+    # @param infected: Boolean array of shape (strains, persons).
+    # @return: List of (strain index, person, infection draw) of the successful transmissions.
+    def _keyed_interactions(self, codes, statuses, infected):
+        day = self.current_time
+        keyed_uniforms = self.streams.keyed_uniforms
+        persons = self.population.persons
+        # One contact draw per person and day, shared by all strains the person carries
+        carriers = np.flatnonzero(infected.any(axis=0))
+        offsets, targets = self.population.contact_ids(
+            carriers, lambda ids, slots: keyed_uniforms(CONTACTS, day, ids, slots))
+        counts = np.diff(offsets)
+        sources = np.repeat(carriers, counts)
+        slots = np.arange(len(targets)) - np.repeat(offsets[:-1], counts)
+        transmissions = []
+        for index, strain in enumerate(self.strains):
+            possible = infected[index, sources] & (codes[index, targets] == SUSCEPTIBLE) & (targets != sources)
+            if not possible.any():
+                continue
+            transmit = keyed_uniforms(TRANSMISSION, day, sources[possible], slots[possible], salt=index).tolist()
+            infect = keyed_uniforms(INFECTION, day, sources[possible], slots[possible], salt=index).tolist()
+            for source, target, transmit_draw, infect_draw in zip(sources[possible].tolist(),
+                                                                  targets[possible].tolist(), transmit, infect):
+                self._draw.value = transmit_draw
+                if strain.disease.attempt_infection(persons[source], persons[target], day, statuses[index]):
+                    transmissions.append((index, persons[target], infect_draw))
+        return transmissions
+
+    ##
+    # Computes the susceptibility factor of every person for every strain from the cross-immunity.
+    # @param codes: Status codes of shape (strains, persons).
+    # @return: numpy array of shape (strains, persons), or None without cross-immunity.
+    def _protection(self, codes):
+        if self.cross_immunity is None:
+            return None
+        exposed = codes != SUSCEPTIBLE
+        factor = np.ones(codes.shape)
+        for a in range(len(self.strains)):
+            for b in range(len(self.strains)):
+                if a != b and self.cross_immunity[a, b] > 0:
+                    factor[a] *= np.where(exposed[b], 1 - self.cross_immunity[a, b], 1.0)
+        return factor
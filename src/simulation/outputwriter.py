@@ -0,0 +1,193 @@
+## @package outputwriter
+#  Streaming writers for the daily simulation output.
+#
+#  A writer receives the Susceptible / Infected / Recovered counts of every simulated day
+#  (and optionally the counts per age group) and writes them to a CSV, .npy or JSON-lines file.
+#  Rows are collected in a small buffer and written in bulk, so long batches can stream their
+#  results to disk with constant memory and without one write per row.
+
+import abc
+import csv
+import json
+import os
+import numpy as np
+
+from models.population import AGE_GROUPS
+
+
+class OutputWriter(abc.ABC):
+    ##
+    # Initializes the writer.
+    # @param path: Path of the output file.
+    # @param by_group: True to also write the counts per age group.
+    # @param buffer_size: Number of rows collected before they are written to the file.
+    # @param append: True to append to an existing file instead of overwriting it.
+    # Raises ValueError if the buffer size is not positive.
+    def __init__(self, path, by_group=False, buffer_size=256, append=False):
+        if buffer_size < 1:
+            raise ValueError("Buffer size must be at least 1")
+        self.path = path
+        self.by_group = by_group
+        self.buffer_size = buffer_size
+        self.append = append
+        self.columns = ["day", "susceptible", "infected", "recovered"]
+        if by_group:
+            self.columns += [f"{group}_{status}" for group in AGE_GROUPS
+                             for status in ("susceptible", "infected", "recovered")]
+        self._buffer = []
+        self._file = None
+        self._created = False  # Set once this writer has created or opened its file
+        self._closed = False
+
+    ##
+    # Adds the counts of one day to the buffer and writes the buffer when it is full.
+    # @param day: The simulation day.
+    # @param counts: Tuple of the Susceptible, Infected and Recovered counts.
+    # @param group_counts: Array of shape (age groups, 3) with the counts per age group, used if by_group is set.
+    # Raises RuntimeError if the writer is closed.
+    def write_day(self, day, counts, group_counts=None):
+        if self._closed:
+            raise RuntimeError("Output writer is closed")
+        row = [int(day), *(int(count) for count in counts)]
+        if self.by_group:
+            if group_counts is None:
+                raise ValueError("Counts per age group are required by this writer")
+            row += [int(count) for count in np.ravel(group_counts)]
+        self._buffer.append(row)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    ##
+    # Writes all buffered rows to the file. Does nothing after the writer is closed.
+    def flush(self):
+        if self._closed:
+            return
+        if self._file is None:
+            self._file = self._open()
+            self._created = True
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self._buffer = []
+        self._file.flush()
+
+    ##
+    # Writes the remaining rows and closes the file.
+    # Closing a writer again does nothing, so the file is never reopened and truncated.
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    ##
+    # Returns True if the output file exists and contains data to append to.
+    # A file this writer has created already is always appended to, never overwritten.
+    def _appending(self):
+        return ((self.append or self._created)
+                and os.path.exists(self.path) and os.path.getsize(self.path) > 0)
+
+    ##
+    # Checks that the columns of an existing file match the columns of this writer.
+    # @param columns: List of the column names found in the file.
+    # Raises ValueError if the columns differ.
+    def _check_columns(self, columns):
+        if columns != self.columns:
+            raise ValueError(f"Cannot append to {self.path}: incompatible columns")
+
+    ##
+    # Abstract method to open the output file (and write its header).
+    # @return: The opened file object.
+    @abc.abstractmethod
+    def _open(self):
+        pass
+
+    ##
+    # Abstract method to write a list of rows to the opened file.
+    # @param rows: List of rows, each a list of integers matching self.columns.
+    @abc.abstractmethod
+    def _write_rows(self, rows):
+        pass
+
+
+##
+# CsvWriter writes one comma-separated row per day, with a header row.
+class CsvWriter(OutputWriter):
+    def _open(self):
+        appending = self._appending()
+        if appending:
+            with open(self.path, newline="") as existing:
+                self._check_columns(next(csv.reader(existing), []))
+        file = open(self.path, "a" if appending else "w", newline="")
+        self._writer = csv.writer(file)
+        if not appending:
+            self._writer.writerow(self.columns)
+        return file
+
+    def _write_rows(self, rows):
+        self._writer.writerows(rows)
+
+
+##
+# JsonLinesWriter writes one JSON object per day and line.
+class JsonLinesWriter(OutputWriter):
+    def _open(self):
+        appending = self._appending()
+        if appending:
+            with open(self.path) as existing:
+                try:
+                    columns = list(json.loads(existing.readline()))
+                except ValueError:
+                    columns = []
+            self._check_columns(columns)
+        return open(self.path, "a" if appending else "w")
+
+    def _write_rows(self, rows):
+        self._file.write("".join(json.dumps(dict(zip(self.columns, row))) + "\n" for row in rows))
+
+
+##
+# NpyWriter writes a two-dimensional int64 .npy array with one row per day.
+# The header is rewritten with the current number of rows on every flush,
+# so the file is a valid .npy array after each flush and can be appended to later.
+class NpyWriter(OutputWriter):
+    def _open(self):
+        if self._appending():
+            file = open(self.path, "r+b")
+            np.lib.format.read_magic(file)
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            if fortran_order or dtype != np.int64 or shape[1:] != (len(self.columns),):
+                file.close()
+                raise ValueError(f"Cannot append to {self.path}: incompatible array")
+            self._rows = shape[0]
+            file.seek(0, os.SEEK_END)
+        else:
+            file = open(self.path, "w+b")
+            self._rows = 0
+            self._write_header(file)
+        return file
+
+    def _write_rows(self, rows):
+        self._file.write(np.asarray(rows, dtype="<i8").tobytes())
+        self._rows += len(rows)
+        self._write_header(self._file)
+        self._file.seek(0, os.SEEK_END)
+
+    ##
+    # Writes the .npy header with the current number of rows at the start of the file.
+    # numpy pads the header so that it keeps its length when the row count grows.
+    # @param file: The opened output file.
+    def _write_header(self, file):
+        file.seek(0)
+        np.lib.format.write_array_header_1_0(file, {
+            "descr": "<i8",
+            "fortran_order": False,
+            "shape": (self._rows, len(self.columns)),
+        })
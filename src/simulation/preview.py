@@ -0,0 +1,106 @@
+## @package preview
+#  Progressive preview of a simulation run.
+#
+#  A preview first runs the same parameters on a downsampled population and scales the counts
+#  back up, which takes a fraction of a second even for very large populations. The run at full
+#  resolution then continues in a background thread, and its days replace the approximate ones
+#  as they arrive. The full-resolution run is a simulation of its own; with the seed of a simulation
+#  set up from the same parameters, its days are the days that simulation will produce.
+
+import dataclasses
+import threading
+
+from .simulation import Simulation
+
+
+##
+# Returns parameters with the age groups scaled down to at most a number of persons.
+# Groups that are not empty keep at least one person.
+# @param params: SimulationParameters of the full run.
+# @param max_persons: Largest number of persons of the downsampled population.
+# @return: Tuple of the downsampled SimulationParameters and the factor from the downsampled to the full population.
+def downsampled_parameters(params, max_persons):
+    sizes = [params.young_population, params.middle_population, params.old_population]
+    total = sum(sizes)
+    if total <= max_persons:
+        return params, 1.0
+    scale = max_persons / total
+    small = [max(1, round(size * scale)) if size else 0 for size in sizes]
+    values = dataclasses.asdict(params)
+    values.update(young_population=small[0], middle_population=small[1], old_population=small[2])
+    return type(params)(**values), total / sum(small)
+
+
+class ProgressivePreview:
+    ##
+    # Initializes the preview of a run.
+    # @param params: SimulationParameters of the run.
+    # @param days: Number of days to preview.
+    # @param max_persons: Largest population simulated for the approximate curve.
+    # @param seed: Optional seed of both runs.
+    def __init__(self, params, days, max_persons=2000, seed=None):
+        self.params = params
+        self.days = days
+        self.max_persons = max_persons
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._refined = ([], [], [])
+        self._cancelled = threading.Event()
+        self._thread = None
+        self.error = None
+
+    ##
+    # Simulates the downsampled population and scales its counts to the full population.
+    # @return: Tuple of the susceptible, infected and recovered counts per day.
+    def approximate(self):
+        params, factor = downsampled_parameters(self.params, self.max_persons)
+        simulation = Simulation()
+        simulation.setup_simulation(params, seed=self.seed)
+        simulation.run_simulation(self.days)
+        return tuple([round(count * factor) for count in history] for history in simulation.stats.get_list_report())
+
+    ##
+    # Starts the full-resolution run in a background thread.
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    ##
+    # Stops the full-resolution run after its current day.
+    def cancel(self):
+        self._cancelled.set()
+
+    ##
+    # Returns True once the full-resolution run has finished, failed or was cancelled.
+    @property
+    def done(self):
+        return self._thread is not None and not self._thread.is_alive()
+
+    ##
+    # Returns the days of the full-resolution run simulated so far.
+    # @return: Tuple of copies of the susceptible, infected and recovered counts.
+    def refined(self):
+        with self._lock:
+            return tuple(list(history) for history in self._refined)
+
+    ##
+    # Returns the best available curve: refined days followed by the approximate remainder.
+    # @param approximate: Curve returned by approximate.
+    # @return: Tuple of the susceptible, infected and recovered counts per day.
+    def combined(self, approximate):
+        refined = self.refined()
+        return tuple(full + approx[len(full):] for full, approx in zip(refined, approximate))
+
+    def _run(self):
+        try:
+            simulation = Simulation()
+            simulation.setup_simulation(self.params, seed=self.seed)
+            for record in simulation.iter_steps(self.days):
+                with self._lock:
+                    self._refined[0].append(record.susceptible)
+                    self._refined[1].append(record.infected)
+                    self._refined[2].append(record.recovered)
+                if self._cancelled.is_set():
+                    return
+        except Exception as e:
+            self.error = e
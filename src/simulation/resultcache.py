@@ -0,0 +1,163 @@
+## @package resultcache
+#  On-disk cache of simulation results.
+#
+#  Results are stored under a key derived from the simulation parameters, the seed, the
+#  number of days and the engine version (a hash of the simulation source code), so a repeated
+#  run is answered with a file read and results are never reused across code changes.
+#  The cache is bounded in size and evicts the least recently used results first.
+
+import dataclasses
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+from .statstracker import StatsTracker
+from .simulation import Simulation
+
+_engine_version = None
+
+
+##
+# Returns a hash of the source code of the models and simulation packages and the numpy version.
+# Any change to the simulation logic changes the version and with it every cache key.
+# @return: Hex digest identifying the simulation engine.
+def engine_version():
+    global _engine_version
+    if _engine_version is None:
+        digest = hashlib.sha256(np.__version__.encode())
+        src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for package in ("models", "simulation"):
+            directory = os.path.join(src, package)
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".py"):
+                    digest.update(name.encode())
+                    with open(os.path.join(directory, name), "rb") as f:
+                        digest.update(f.read())
+        _engine_version = digest.hexdigest()
+    return _engine_version
+
+
+##
+# Converts numpy values (e.g. the seeds and parameters drawn by the sensitivity analysis) for json.dumps,
+# so they give the same key as the equal Python values.
+# Raises TypeError for other values that JSON cannot represent.
+def _json_value(value):
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Cannot use {type(value).__name__} in a cache key")
+
+
+class ResultCache:
+    ##
+    # Initializes the cache.
+    # @param directory: Directory holding the cached results; created if it does not exist.
+    # @param max_bytes: Maximum total size of the cached results.
+    # Raises ValueError if max_bytes is not positive.
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        if max_bytes <= 0:
+            raise ValueError("Maximum cache size must be positive")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    ##
+    # Computes the cache key of a run.
+    # @param params: SimulationParameters of the run.
+    # @param seed: Seed of the run.
+    # @param no_days: Number of simulated days.
+    # @return: Hex digest identifying the run.
+    def key(self, params, seed, no_days):
+        description = {
+            "params": dataclasses.asdict(params),
+            "seed": seed,
+            "days": no_days,
+            "engine": engine_version(),
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=_json_value).encode()).hexdigest()
+
+    ##
+    # Returns the cached statistics for a key and marks them as recently used.
+    # @param key: Cache key, as returned by key.
+    # @return: StatsTracker with the cached histories, or None if the key is not cached.
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                stats = StatsTracker.from_histories(data["s"].tolist(), data["i"].tolist(), data["r"].tolist())
+            os.utime(path)  # The file may have been evicted concurrently in the meantime
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            return None
+        return stats
+
+    ##
+    # Stores the statistics of a run and evicts old results if the cache is too large.
+    # The file is written to a temporary name first, so readers never see partial results.
+    # @param key: Cache key, as returned by key.
+    # @param stats: StatsTracker of the run.
+    def put(self, key, stats):
+        s, i, r = stats.get_list_report()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, s=np.asarray(s, dtype=np.int64), i=np.asarray(i, dtype=np.int64),
+                     r=np.asarray(r, dtype=np.int64))
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    ##
+    # Removes the least recently used results until the cache fits into max_bytes.
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    ##
+    # Returns the statistics of a seeded run, simulating it only if it is not cached.
+    # Runs without a seed cannot be reproduced, so they are always simulated and never cached.
+    # @param params: SimulationParameters of the run.
+    # @param no_days: Number of days to simulate.
+    # @param seed: Seed of the run, or None for an unseeded run.
+    # @return: StatsTracker with the histories of the run.
+    def run(self, params, no_days, seed):
+        if seed is None:
+            simulation = Simulation()
+            simulation.setup_simulation(params)
+            simulation.run_simulation(no_days)
+            return simulation.stats
+
+        key = self.key(params, seed, no_days)
+        stats = self.get(key)
+        if stats is not None:
+            self.hits += 1
+            return stats
+
+        self.misses += 1
+        simulation = Simulation()
+        simulation.setup_simulation(params, seed=seed)
+        simulation.run_simulation(no_days)
+        self.put(key, simulation.stats)
+        return simulation.stats
+
+    ##
+    # Returns the path of the file holding the results for a key.
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
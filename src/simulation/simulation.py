@@ -7,8 +7,19 @@ from models import Disease
 from models import Population
 from models import SimulationParameters
 from models import RandomTransmissionPolicy
+from models import RandomStreams
+from models.randomstreams import FixedDraw, CONTACTS, TRANSMISSION, INFECTION
+from models import ContactSampler
+from models.healthstatus import SUSCEPTIBLE, INFECTED, RECOVERED
+from models.population import distancing_factor
 from .statstracker import StatsTracker
-import random
+from .stepmetrics import StepMetrics
+from .stopcondition import StepRecord
+import numpy as np
+from math import inf
+
+# Number of days skipped at once when no status will ever change again
+QUIESCENT_CHUNK = 365
 
 class Simulation:
     ##
@@ -18,48 +29,255 @@ class Simulation:
     ):
         self.population = None
         self.disease = None
-        self.policy = None
         self.stats = None
+        self.metrics = None
+        self.streams = None
         self.current_time = -1
+        self.social_distancing = False
+        self.interventions = None
+        self.vaccination = None
+        self.base_transmission_rate = None
+        self.writers = []
+        self.new_infections = 0
+        self.cumulative_infections = 0
+        self.ever_infected = None  # Boolean array of the persons infected at least once in this run
+        self.skip_quiescent = True
+        self.weighted_contacts = False  # Draw contact targets weighted by activity (see ContactSampler)
+        self.contact_sampler = None
+        self.infection_log = None  # Optional InfectionLog receiving every (day, infector, infectee)
+        self.history_days = None  # Bounds the stats history to this many full-resolution days (see StatsTracker)
+        self.reuse_population = True  # Restart seeded runs on the last generated population if the sizes and seed match
+        self._template = None  # (group sizes, seed, Population) of the last generated population
+        self._status = None
+        self._status_time = None
+        self._draw = FixedDraw()  # Transmission policy rng of seeded runs, set to the keyed uniform of each pair
 
 
     ##
     # Sets up the simulation with the given parameters.
-    # This method initializes the population, disease, and policy based on the provided parameters.
+    # This method initializes the population and disease based on the provided parameters.
     # It also sets the initial state of the simulation, including patient zero.
     #
     # @param params: SimulationParameters object containing the configuration for the simulation.
-    def setup_simulation(self, params : SimulationParameters):
-        self.population = Population(params.young_population,
-                                     params.middle_population,
-                                     params.old_population)
+    # @param population: Optional existing Population (e.g. loaded with Population.load) to use instead of
+    #                    generating a new one. Its infection state is reset.
+    #                    Without it, a seeded run reuses the last generated population if its group sizes and
+    #                    seed match (see reuse_population), and only its infection state is reset.
+    #                    Unseeded runs always draw a new population.
+    # @param seed: Optional seed of the simulation's random streams, which makes the run reproducible.
+    #              Simulations with the same seed share their random numbers (common random numbers):
+    #              contacts and per-pair draws are keyed by day, person and contact slot, so they do not
+    #              shift when another scenario draws more or fewer numbers. Without a seed the random module is used.
+    # Raises ValueError if the population's age groups do not match the parameters.
+    def setup_simulation(self, params : SimulationParameters, population=None, seed=None):
+        self.streams = RandomStreams(seed)
+        if population is None:
+            sizes = (params.young_population, params.middle_population, params.old_population)
+            population = self._template_population(sizes, seed)
+            if population is None:
+                population = Population(*sizes, rng=self.streams.population)
+                self._template = (sizes, seed, population)
+            else:
+                population.reset_state()
+        else:
+            expected = [params.young_population, params.middle_population, params.old_population]
+            if list(population.group_sizes()) != expected:
+                raise ValueError("Population age groups do not match the simulation parameters")
+            population.reset_state()
+        self.population = population
 
         self.disease = Disease(params.disease_name,
                                params.transmission_rate,
                                params.incubation_period,
                                params.infectious_period)
+        self.disease.policy.rng = self._draw if self.streams.keyed else self.streams.transmission
 
-        self.policy = RandomTransmissionPolicy(self.disease)
-        self.stats = StatsTracker()
+        self.contact_sampler = None
+        if self.weighted_contacts and self.population.contact_network is None:
+            self.contact_sampler = ContactSampler(self.population, self.streams.contacts.getrandbits(64))
+        self.stats = StatsTracker(self.history_days)
+        self.social_distancing = False
+        self.base_transmission_rate = self.disease.transmission_rate
+        self.new_infections = 0
+        self.cumulative_infections = 1  # Patient zero
+        self.invalidate_status()
 
         # -------------------- Patient Zero ------------------------- #
         # Infect patient zero to start the simulation
-        patient_zero = random.choice(self.population.persons)
+        patient_zero = self.streams.patient_zero.randrange(len(self.population))
         # --- Option 1 ---
-        patient_zero.infectious_time = 0  # To make the plots more interesting, we keep the patient zero infected at all times
+        self.population.infectious_time[patient_zero] = 0  # To make the plots more interesting, we keep the patient zero infected at all times
+        self.ever_infected = np.zeros(len(self.population), dtype=bool)
+        self.ever_infected[patient_zero] = True
+        self.metrics = StepMetrics(self.population, patient_zero)
         # --- Option 2 ---
-        # self.disease.infect(patient_zero, self.current_time) # Uncomment this line if you want to make patient zero behave like a normal infection
+        # self.disease.infect(self.population.persons[patient_zero], self.current_time) # Uncomment this line if you want to make patient zero behave like a normal infection
         # ----------------------------------------------------------- #
         self.current_time = 0
 
+        if self.interventions is not None:
+            self.interventions.attach(self.population)
+            self.apply_interventions()
+        if self.vaccination is not None:
+            self.vaccination.attach(self.population)
+
+
+    ##
+    # Returns the last generated population if it can be reused for the given sizes and seed.
+    # Only seeded runs reuse it: the same seed would draw the same population again.
+    # @param sizes: Tuple of the young, middle and old group sizes.
+    # @param seed: Seed of the new run.
+    # @return: The Population, or None if a new one has to be generated.
+    def _template_population(self, sizes, seed):
+        if not self.reuse_population or self._template is None or seed is None:
+            return None
+        template_sizes, template_seed, population = self._template
+        if template_sizes != sizes or template_seed != seed:
+            return None
+        return population
+
 
     ##
     # Runs the simulation for a specified number of days.
     # This method repeatedly calls simulate_step to advance the simulation.
     # @param no_days: The number of days to run the simulation.
-    def run_simulation(self, no_days):
-        for i in range(no_days):
-            self.simulate_step()
+    # @param stop_conditions: Optional StopCondition objects that end the run early.
+    # @return: The number of days that were simulated.
+    def run_simulation(self, no_days, stop_conditions=()):
+        if stop_conditions:
+            days = 0
+            for _ in self.iter_steps(no_days, stop_conditions):
+                days += 1
+            return days
+
+        days = 0
+        while days < no_days:
+            quiet = self.quiescent_days(no_days - days) if self.skip_quiescent else 0
+            if quiet:
+                self.skip_days(quiet)
+                days += quiet
+            else:
+                self.simulate_step()
+                days += 1
+        return days
+
+
+    ##
+    # Simulates day after day and yields a StepRecord after each one.
+    # The generator ends after max_days days or as soon as a stop condition is met
+    # (the record of that day is still yielded).
+    # Raises RuntimeError if the simulation is not set up before calling this method.
+    # @param max_days: Maximum number of days to simulate, None for no limit.
+    # @param stop_conditions: StopCondition objects checked after every day.
+    def iter_steps(self, max_days=None, stop_conditions=()):
+        if self.current_time == -1:
+            raise RuntimeError("Simulation not set up. Call setup_simulation first.")
+
+        for condition in stop_conditions:
+            condition.reset()
+
+        days = 0
+        while max_days is None or days < max_days:
+            quiet = 0
+            if self.skip_quiescent:
+                quiet = self.quiescent_days(None if max_days is None else max_days - days)
+            # Quiescent days are skipped one by one, so the stop conditions see each of them
+            for _ in range(quiet or 1):
+                if quiet:
+                    self.skip_days(1)
+                else:
+                    self.simulate_step()
+                days += 1
+                record = self.step_record()
+                yield record
+                # Every condition sees every day, so stateful conditions stay up to date
+                if any([condition.should_stop(record) for condition in stop_conditions]):
+                    return
+
+
+    ##
+    # Returns a StepRecord with the state of the simulation after the last simulated day.
+    def step_record(self):
+        return StepRecord(day=self.current_time,
+                          susceptible=self.stats.s_history[-1],
+                          infected=self.stats.i_history[-1],
+                          recovered=self.stats.r_history[-1],
+                          new_infections=self.new_infections,
+                          cumulative_infections=self.cumulative_infections)
+
+
+    ##
+    # Returns the number of days from the current day on which nothing can change.
+    # A day is quiescent if no infection is possible and no person changes health status
+    # or intervention starts or ends before the following day.
+    # @param max_days: Maximum number of days to return, None for no limit.
+    # @return: Number of days that can be skipped, 0 if the current day has to be simulated.
+    def quiescent_days(self, max_days=None):
+        if self.current_time == -1:
+            raise RuntimeError("Simulation not set up. Call setup_simulation first.")
+
+        if self.interventions is not None:
+            self.apply_interventions()
+
+        codes = self.status_codes()
+        no_transmission = (isinstance(self.disease.policy, RandomTransmissionPolicy)
+                           and self.disease.transmission_rate <= 0)
+        if not no_transmission and self.population.can_spread(codes):
+            return 0
+
+        next_change = self.population.next_transition(self.current_time)
+        if self.interventions is not None:
+            next_change = min(next_change, self.interventions.next_change(self.current_time))
+        if self.vaccination is not None:
+            # Doses due on the current day are given by its step, so the day must not be skipped
+            next_change = min(next_change, self.vaccination.next_change(self.current_time - 1))
+        # The day before the next change is simulated normally, it records the change
+        days = min(inf if max_days is None else max_days, next_change - 1 - self.current_time)
+        if days == inf:
+            return QUIESCENT_CHUNK
+        return max(0, int(days))
+
+
+    ##
+    # Advances the simulation over quiescent days without simulating them.
+    # The statistics and writers receive the unchanged counts for every skipped day.
+    # Only valid for days counted by quiescent_days.
+    # @param days: Number of days to skip.
+    def skip_days(self, days):
+        codes = self.status_codes()
+        counts = np.bincount(codes, minlength=RECOVERED + 1)[SUSCEPTIBLE:]
+        self.stats.record_repeated(counts, days)
+        self.metrics.record_repeated(self.current_time + 1, days, counts[INFECTED - SUSCEPTIBLE])
+        if self.writers:
+            group_counts = None
+            if any(writer.by_group for writer in self.writers):
+                group_counts = self.population.group_status_counts(self.current_time, codes)
+            for day in range(self.current_time + 1, self.current_time + days + 1):
+                for writer in self.writers:
+                    writer.write_day(day, counts, group_counts)
+        self.new_infections = 0
+        self.current_time += days
+        # Nobody changes status on skipped days, so the cached codes stay valid
+        self._status_time = self.current_time
+
+
+    ##
+    # Returns the status codes of all persons at the current time.
+    # The codes are computed once per day and shared by the step, the statistics and the writers.
+    # Call invalidate_status after changing infection times from outside the simulation.
+    # @return: numpy array of status codes, indexed by person id.
+    def status_codes(self):
+        if self._status_time != self.current_time:
+            self._status = self.population.status_codes(self.current_time)
+            self._status_time = self.current_time
+        return self._status
+
+
+    ##
+    # Discards the cached status codes, so they are recomputed on the next use.
+    def invalidate_status(self):
+        self._status = None
+        self._status_time = None
 
 
     ##
@@ -73,20 +291,59 @@ class Simulation:
         if self.current_time == -1:
             raise RuntimeError("Simulation not set up. Call setup_simulation first.")
 
-        infected_today = [] # List of people infected this day
-        for person in self.population.persons:
-            if not person.is_infectious(self.current_time):
-                continue
-            contacts = self.population.get_contacts(person)
-            newly_infected = person.interact(self.disease, contacts, self.current_time)
-            infected_today += newly_infected
+        if self.interventions is not None:
+            self.apply_interventions()
+        if self.vaccination is not None:
+            # Updates the cached status codes of the protected persons in place
+            self.vaccination.vaccinate(self.current_time, self.population, self.status_codes(),
+                                       self.streams.vaccination)
+
+        codes = self.status_codes()
+        status = codes.tobytes()  # One byte per person, cheap to index for every contact
+        persons = self.population.persons
+
+        # (infector id, person, infection draw) of the transmissions this day;
+        # the draw is None for unseeded runs, which use the infection stream
+        infected_today = []
+        if self.contact_sampler is not None:
+            infected_today = self.sampled_interactions(codes, status)
+        elif self.streams.keyed:
+            infected_today = self.keyed_interactions(codes, status)
+        else:
+            for person_id in np.flatnonzero(codes == INFECTED):
+                person = persons[person_id]
+                contacts = self.population.get_contacts(person, self.streams.contacts)
+                newly_infected = person.interact(self.disease, contacts, self.current_time, status)
+                infected_today += [(person_id, target, None) for target in newly_infected]
 
-        for person in infected_today:
-            if person.should_infect():
+        # The first successful infector of a person is credited with the infection
+        newly_infected_ids = set()
+        infectors = []
+        infectees = []
+        infection_draw = FixedDraw()
+        for infector_id, person, draw in infected_today:
+            if draw is not None:
+                infection_draw.value = draw
+            if person.should_infect(self.streams.infection if draw is None else infection_draw):
                 self.disease.infect(person, self.current_time)
+                if person.id not in newly_infected_ids:
+                    newly_infected_ids.add(person.id)
+                    infectors.append(infector_id)
+                    infectees.append(person.id)
+        self.new_infections = len(infectees)
+        self.cumulative_infections += self.new_infections
+        self.ever_infected[infectees] = True
+        infector_days = self.population.infectious_time[infectors].tolist()
+        if self.infection_log is not None:
+            self.infection_log.record(self.current_time, infectors, infectees)
 
         self.current_time += 1
-        self.stats.record_step(self.current_time, self.population)
+        self.invalidate_status()
+        self.stats.record_step(self.current_time, self.population, self.status_codes())
+        self.metrics.record_step(self.current_time, infectors, infectees, infector_days,
+                                 self.stats.i_history[-1])
+        if self.writers:
+            self.write_outputs()
 
         # --- Uncomment the following lines to see detailed reports (for debugging) ---
         """
@@ -95,11 +352,104 @@ class Simulation:
         """
 
 
+    ##
+    # Draws the contacts of all infected persons with the contact sampler and attempts the infections.
+    # In seeded runs the contacts are drawn from uniform numbers keyed by day, person and contact slot.
+    # @param codes: Status codes of the current day.
+    # @param status: The same codes as bytes.
+    # @return: List of (infector id, person, infection draw) of the successful transmissions.
+    def sampled_interactions(self, codes, status):
+        infected = np.flatnonzero(codes == INFECTED)
+        uniforms = None
+        if self.streams.keyed:
+            day = self.current_time
+            uniforms = lambda persons, slots: self.streams.keyed_uniforms(CONTACTS, day, persons, slots)
+        offsets, targets = self.contact_sampler.draw(infected, uniforms)
+        return self.attempt_interactions(infected, offsets, targets, codes, status)
+
+
+    ##
+    # Draws the contacts of all infected persons from keyed uniform numbers and attempts the infections.
+    # Used by seeded runs: the contacts of a person, and the transmission and infection draws of each
+    # contact slot, only depend on the seed, the day, the person and the slot.
+    # @param codes: Status codes of the current day.
+    # @param status: The same codes as bytes.
+    # @return: List of (infector id, person, infection draw) of the successful transmissions.
+    def keyed_interactions(self, codes, status):
+        infected = np.flatnonzero(codes == INFECTED)
+        day = self.current_time
+        offsets, targets = self.population.contact_ids(
+            infected, lambda persons, slots: self.streams.keyed_uniforms(CONTACTS, day, persons, slots))
+        return self.attempt_interactions(infected, offsets, targets, codes, status)
+
+
+    ##
+    # Attempts the infections of the drawn contacts.
+    # Contacts that cannot lead to an infection (with oneself, or with persons who are not susceptible
+    # or have no susceptibility) are filtered out with array operations before any Person object is used.
+    # In seeded runs the per-pair draws are keyed by day, infector and contact slot.
+    # @param infected: Array of the ids of the infected persons.
+    # @param offsets: Offsets of the contacts of each infected person in targets.
+    # @param targets: Array of the ids of the contacted persons.
+    # @param codes: Status codes of the current day.
+    # @param status: The same codes as bytes.
+    # @return: List of (infector id, person, infection draw) of the successful transmissions.
+    def attempt_interactions(self, infected, offsets, targets, codes, status):
+        counts = np.diff(offsets)
+        sources = np.repeat(infected, counts)
+        susceptibility = self.population.susceptibility
+        possible = ((codes[targets] == SUSCEPTIBLE) & (targets != sources)
+                    & (susceptibility[targets] > 0) & (susceptibility[sources] > 0))
+        sources, candidates = sources[possible], targets[possible]
+        if self.streams.keyed:
+            slots = (np.arange(len(targets)) - np.repeat(offsets[:-1], counts))[possible]
+            transmit = self.streams.keyed_uniforms(TRANSMISSION, self.current_time, sources, slots).tolist()
+            infect = self.streams.keyed_uniforms(INFECTION, self.current_time, sources, slots).tolist()
+        else:
+            transmit = infect = [None] * len(sources)
+
+        persons = self.population.persons
+        transmissions = []
+        for source, target, transmit_draw, infect_draw in zip(sources.tolist(), candidates.tolist(), transmit, infect):
+            self._draw.value = transmit_draw
+            if self.disease.attempt_infection(persons[source], persons[target], self.current_time, status):
+                transmissions.append((source, persons[target], infect_draw))
+        return transmissions
+
+
+    ##
+    # Adds a writer that receives the counts of every simulated day.
+    # @param writer: OutputWriter object.
+    def add_writer(self, writer):
+        self.writers.append(writer)
+
+
+    ##
+    # Flushes and closes all writers and removes them from the simulation.
+    def close_writers(self):
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+
+    ##
+    # Passes the counts of the current day to every writer.
+    # The counts per age group are only computed if a writer needs them.
+    def write_outputs(self):
+        counts = (self.stats.s_history[-1], self.stats.i_history[-1], self.stats.r_history[-1])
+        group_counts = None
+        if any(writer.by_group for writer in self.writers):
+            group_counts = self.population.group_status_counts(self.current_time, self.status_codes())
+        for writer in self.writers:
+            writer.write_day(self.current_time, counts, group_counts)
+
+
     ##
     # Resets the simulation to its initial state.
-    # This method clears the population, disease, policy, and stats,
+    # This method clears the population, disease, and stats,
     # and resets the current time to -1.
     # It is useful for starting a new simulation without having to recreate the Simulation object.
+    # The last generated population is kept as a template, so a restart with the same sizes does not rebuild it.
     # @return: None
     def reset_simulation(self):
         """
@@ -108,9 +458,17 @@ class Simulation:
         """
         self.population = None
         self.disease = None
-        self.policy = None
         self.stats = None
+        self.metrics = None
+        self.streams = None
+        self.contact_sampler = None
         self.current_time = -1
+        self.social_distancing = False
+        self.base_transmission_rate = None
+        self.new_infections = 0
+        self.cumulative_infections = 0
+        self.ever_infected = None
+        self.invalidate_status()
         print("Simulation has been reset.")
 
 
@@ -119,15 +477,68 @@ class Simulation:
     # This method adjusts the distancing factor for each person in the population.
     # If social distancing is enabled, it increases the distancing factor based on the person's activity level.
     # If social distancing is disabled, it resets the distancing factor to 1.0.
+    # Scheduled interventions stay in effect on top of the toggle.
     # Raises RuntimeError if the simulation is not set up before calling this method.
     # @param enable: True to enable social distancing, False to disable.
     def toggle_social_distancing(self, enable: bool):
         if self.population is None:
             raise RuntimeError("Simulation not set up. Call setup_simulation first.")
 
-        for person in self.population.persons:
-            if enable:
-                person.distancing_factor = 1 / (2 * person.activity_level ** 0.5)  # Take a square root to reduce the distancing factor based on activity level
-            else:
-                person.distancing_factor = 1.0
+        self.social_distancing = enable
+        self.update_distancing()
+
+
+    ##
+    # Recomputes the distancing factor of every person as one array update.
+    # Combines the social distancing toggle with the contact factors of the active interventions.
+    def update_distancing(self):
+        if self.social_distancing:
+            factor = distancing_factor(self.population.activity_level)
+        else:
+            factor = 1.0
+        if self.interventions is not None:
+            factor = factor * self.interventions.contact_factor
+        self.population.distancing_factor[:] = factor
+        if self.contact_sampler is not None:
+            self.contact_sampler.invalidate()
+
 
+    ##
+    # Attaches a schedule of interventions to the simulation.
+    # The interventions are applied automatically at the start of the scheduled days.
+    # If the simulation is already set up, the schedule takes effect from the current day.
+    # @param schedule: InterventionSchedule object, or None to remove the schedule.
+    def set_interventions(self, schedule):
+        had_schedule = self.interventions is not None
+        self.interventions = schedule
+        if self.population is None:
+            return
+        if schedule is not None:
+            schedule.attach(self.population)
+            self.apply_interventions()
+        elif had_schedule:
+            self.disease.transmission_rate = self.base_transmission_rate
+            self.update_distancing()
+
+
+    ##
+    # Attaches a vaccination program to the simulation.
+    # Doses are given at the start of every simulated day on which a campaign is active.
+    # If the simulation is already set up, the program takes effect from the current day.
+    # @param program: VaccinationProgram object, or None to remove the program.
+    def set_vaccination(self, program):
+        self.vaccination = program
+        if program is not None and self.population is not None:
+            program.attach(self.population)
+
+
+    ##
+    # Applies the interventions scheduled for the current day.
+    # The distancing factors and the transmission rate are only updated when the set of
+    # active interventions changes.
+    def apply_interventions(self):
+        if not self.interventions.update(self.current_time):
+            return
+        self.update_distancing()
+        self.disease.transmission_rate = min(1.0, self.base_transmission_rate
+                                             * self.interventions.transmission_multiplier)
@@ -2,36 +2,77 @@
 #  Tracks the health status of the population over time.
 #  This class records the number of susceptible, infected, and recovered individuals
 
-from models import HealthStatus
+from collections import deque
+from models.healthstatus import SUSCEPTIBLE, INFECTED, RECOVERED
+import numpy as np
+
+from .tieredhistory import TieredHistory
 
 class StatsTracker:
     ##
     #  Initialize the StatsTracker with empty histories for each health status.
-    def __init__(self):
-        self.s_history = []
-        self.i_history = []
-        self.r_history = []
+    #  @param full_resolution_days: If given, memory is bounded: the histories only keep this many
+    #                               recent days, and the whole run is kept at decreasing resolution
+    #                               in self.history (see TieredHistory).
+    #  @param tier_options: Further keyword arguments for TieredHistory.
+    def __init__(self, full_resolution_days=None, **tier_options):
+        if full_resolution_days is None:
+            self.s_history = []
+            self.i_history = []
+            self.r_history = []
+            self.history = None
+        else:
+            self.s_history = deque(maxlen=full_resolution_days)
+            self.i_history = deque(maxlen=full_resolution_days)
+            self.r_history = deque(maxlen=full_resolution_days)
+            self.history = TieredHistory(full_days=full_resolution_days, **tier_options)
+
+    ##
+    # Create a StatsTracker holding existing histories (e.g. loaded from a result cache).
+    # @param s_history: List of susceptible counts.
+    # @param i_history: List of infected counts.
+    # @param r_history: List of recovered counts.
+    @classmethod
+    def from_histories(cls, s_history, i_history, r_history):
+        stats = cls()
+        stats.s_history = list(s_history)
+        stats.i_history = list(i_history)
+        stats.r_history = list(r_history)
+        return stats
 
     ##
     # Record the health status of the population at a given time step.
     # @param time: The current time step in the simulation.
     # @param population: The population object containing persons' data.
-    def record_step(self, time, population):
-        status_counts = {
-            HealthStatus.Susceptible: 0,
-            HealthStatus.Infected: 0,
-            HealthStatus.Recovered: 0
-        }
+    # @param status: Optional array of status codes at this time (see Population.status_codes),
+    #                computed from the population if not given.
+    def record_step(self, time, population, status=None):
+        if status is None:
+            status = population.status_codes(time)
+        counts = np.bincount(status, minlength=RECOVERED + 1)
 
-        for person in population.persons:
-            status_counts[person.get_status(time)] += 1
+        self.s_history.append(int(counts[SUSCEPTIBLE]))
+        self.i_history.append(int(counts[INFECTED]))
+        self.r_history.append(int(counts[RECOVERED]))
+        if self.history is not None:
+            self.history.append((counts[SUSCEPTIBLE], counts[INFECTED], counts[RECOVERED]))
 
-        self.s_history.insert(time, status_counts[HealthStatus.Susceptible])
-        self.i_history.insert(time, status_counts[HealthStatus.Infected])
-        self.r_history.insert(time, status_counts[HealthStatus.Recovered])
+    ##
+    # Record the same health status counts for several consecutive time steps at once.
+    # Used when the simulation skips days on which no person changes status.
+    # @param counts: Tuple of the Susceptible, Infected and Recovered counts.
+    # @param days: Number of time steps to record.
+    def record_repeated(self, counts, days):
+        susceptible, infected, recovered = (int(count) for count in counts)
+        self.s_history.extend([susceptible] * days)
+        self.i_history.extend([infected] * days)
+        self.r_history.extend([recovered] * days)
+        if self.history is not None:
+            self.history.extend_repeated((susceptible, infected, recovered), days)
 
     ##
     # Generate a summary report of the health status history (for plotting).
+    # With bounded memory the sequences only cover the most recent days.
     # @return A tuple containing three lists: susceptible, infected, and recovered counts over time.
     def get_list_report(self):
         return self.s_history, self.i_history, self.r_history
@@ -0,0 +1,114 @@
+## @package stepmetrics
+#  Epidemiological metrics collected as a by-product of the simulation step.
+#
+#  The step already knows which infector caused which new infection, so incidence per age group,
+#  secondary infections per infector and the running peak and attack rate are updated from the
+#  day's new infections only, without further passes over the population.
+
+import numpy as np
+
+from models.population import AGE_GROUPS
+
+
+class StepMetrics:
+    ##
+    # Initializes empty metrics for a population.
+    # @param population: The simulated Population.
+    # @param patient_zero: Id of the person infected at setup, counted in the cohort of day 0.
+    def __init__(self, population, patient_zero=None):
+        self.population_size = len(population)
+        self.group = population.group
+        self.new_by_group = []          # Per day: tuple of new infections per age group
+        self.infectors = []             # Per day: number of distinct persons that infected someone
+        self.cohort_size = [0]          # Per infection day: number of persons infected on that day
+        self.cohort_secondary = [0]     # Per infection day: infections caused by that day's cohort
+        self.cumulative_infections = 0
+        self.total_by_group = [0] * len(AGE_GROUPS)
+        self.peak_infected = 0
+        self.peak_day = None
+        if patient_zero is not None:
+            self.cohort_size[0] = 1
+            self.cumulative_infections = 1
+            self.total_by_group[int(self.group[patient_zero])] = 1
+
+    ##
+    # Records the infections of one simulated day.
+    # @param day: The day recorded after the step; its infections are dated to the day before.
+    # @param infectors: Ids of the infectors, one per new infection.
+    # @param infectees: Ids of the newly infected persons, in the same order.
+    # @param infector_days: Infection days of the infectors, in the same order.
+    # @param infected: Number of infected persons after the day.
+    def record_step(self, day, infectors, infectees, infector_days, infected):
+        infectees = np.asarray(infectees, dtype=np.int64)
+        by_group = tuple(np.bincount(self.group[infectees], minlength=len(AGE_GROUPS)).tolist())
+        self.new_by_group.append(by_group)
+        self.total_by_group = [total + new for total, new in zip(self.total_by_group, by_group)]
+        self.infectors.append(len(set(infectors)))
+
+        self._ensure_day(day - 1)
+        self.cohort_size[day - 1] += len(infectees)
+        for infector_day in infector_days:
+            self._ensure_day(infector_day)
+            self.cohort_secondary[infector_day] += 1
+        self.cumulative_infections += len(infectees)
+        self._update_peak(day, infected)
+
+    ##
+    # Records several consecutive days without infections.
+    # @param day: The first of the days.
+    # @param days: Number of days.
+    # @param infected: Number of infected persons on these days.
+    def record_repeated(self, day, days, infected):
+        empty = (0,) * len(AGE_GROUPS)
+        self.new_by_group.extend([empty] * days)
+        self.infectors.extend([0] * days)
+        self._update_peak(day, infected)
+
+    ##
+    # Returns the number of new infections per day and age group.
+    # @return: numpy array of shape (days, age groups).
+    def incidence_by_group(self):
+        return np.array(self.new_by_group, dtype=np.int64).reshape(len(self.new_by_group), len(AGE_GROUPS))
+
+    ##
+    # Returns the case reproduction number of every infection day: the mean number of persons
+    # infected by those who were infected on that day. The values of recent days are still
+    # growing while their cohort is infectious.
+    # @return: numpy array indexed by infection day, NaN for days without infections.
+    def reproduction_numbers(self):
+        size = np.array(self.cohort_size, dtype=np.float64)
+        secondary = np.array(self.cohort_secondary, dtype=np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(size > 0, secondary / size, np.nan)
+
+    ##
+    # Returns the share of the population infected so far.
+    @property
+    def attack_rate(self):
+        if self.population_size == 0:
+            return 0.0
+        return self.cumulative_infections / self.population_size
+
+    ##
+    # Returns the running summaries of the run.
+    # @return: Dictionary with the "peak_infected", "peak_day", "attack_rate", "cumulative_infections"
+    #          and the total "infections_by_group".
+    def summary(self):
+        return {
+            "peak_infected": self.peak_infected,
+            "peak_day": self.peak_day,
+            "attack_rate": self.attack_rate,
+            "cumulative_infections": self.cumulative_infections,
+            "infections_by_group": dict(zip(AGE_GROUPS, self.total_by_group)),
+        }
+
+    def _update_peak(self, day, infected):
+        if self.peak_day is None or infected > self.peak_infected:
+            self.peak_infected = int(infected)
+            self.peak_day = day
+
+    def _ensure_day(self, day):
+        if day >= len(self.cohort_size):
+            missing = day + 1 - len(self.cohort_size)
+            self.cohort_size.extend([0] * missing)
+            self.cohort_secondary.extend([0] * missing)
@@ -0,0 +1,113 @@
+## @package stopcondition
+#  Per-day step records and conditions for stopping a simulation early.
+#
+#  Simulation.iter_steps yields a StepRecord after every simulated day and stops as soon
+#  as one of the given stop conditions is met, so runs end once they have answered their question.
+
+import abc
+from dataclasses import dataclass
+
+
+##
+# Light record of the state of the simulation after one simulated day.
+@dataclass(frozen=True)
+class StepRecord:
+    day: int
+    susceptible: int
+    infected: int
+    recovered: int
+    new_infections: int
+    cumulative_infections: int
+
+    ##
+    # Returns the number of persons in the population.
+    @property
+    def population_size(self):
+        return self.susceptible + self.infected + self.recovered
+
+    ##
+    # Returns the share of the population infected so far.
+    @property
+    def attack_rate(self):
+        if self.population_size == 0:
+            return 0.0
+        return self.cumulative_infections / self.population_size
+
+
+class StopCondition(abc.ABC):
+    ##
+    # Abstract method to decide whether the simulation should stop after the given day.
+    # Called once for every simulated day, in order.
+    # @param record: StepRecord of the day that was just simulated.
+    # @return: True to stop the simulation, False to continue.
+    @abc.abstractmethod
+    def should_stop(self, record):
+        pass
+
+    ##
+    # Clears any state kept between days. Called before a new run starts.
+    def reset(self):
+        pass
+
+
+##
+# Stops when nobody is infected anymore.
+# Because patient zero stays infected forever, the condition can also stop
+# when patient zero is the only infected person left.
+class NoInfections(StopCondition):
+    ##
+    # @param ignore_patient_zero: True to stop when only patient zero is infected.
+    def __init__(self, ignore_patient_zero=False):
+        self.ignore_patient_zero = ignore_patient_zero
+
+    def should_stop(self, record):
+        return record.infected <= (1 if self.ignore_patient_zero else 0)
+
+
+##
+# Stops once the number of infected persons has passed its peak.
+# The peak counts as passed when the infected count stayed below the highest count
+# seen so far for `patience` days and has dropped by at least `min_drop` (share of the peak).
+class PeakPassed(StopCondition):
+    ##
+    # @param patience: Number of days the count has to stay below the peak.
+    # @param min_drop: Required drop below the peak, as a share of the peak [0.0-1.0].
+    # Raises ValueError if a parameter is invalid.
+    def __init__(self, patience=7, min_drop=0.0):
+        if patience < 1:
+            raise ValueError("Patience must be at least 1 day")
+        if not (0.0 <= min_drop <= 1.0):
+            raise ValueError("Minimum drop must be between 0 and 1")
+        self.patience = patience
+        self.min_drop = min_drop
+        self.reset()
+
+    def reset(self):
+        self.peak = 0
+        self.peak_day = None
+        self.days_below = 0
+
+    def should_stop(self, record):
+        if record.infected >= self.peak:
+            self.peak = record.infected
+            self.peak_day = record.day
+            self.days_below = 0
+            return False
+        self.days_below += 1
+        return (self.days_below >= self.patience
+                and record.infected <= self.peak * (1 - self.min_drop))
+
+
+##
+# Stops once the given share of the population has been infected.
+class AttackRateReached(StopCondition):
+    ##
+    # @param target: Cumulative attack rate [0.0-1.0] at which to stop.
+    # Raises ValueError if the target is not between 0 and 1.
+    def __init__(self, target):
+        if not (0.0 <= target <= 1.0):
+            raise ValueError("Target attack rate must be between 0 and 1")
+        self.target = target
+
+    def should_stop(self, record):
+        return record.attack_rate >= self.target
@@ -0,0 +1,198 @@
+## @package tieredhistory
+#  Multi-resolution history of the daily health status counts with bounded memory.
+#
+#  The most recent days are kept at full resolution. Older days are aggregated into blocks
+#  holding the minimum, sum and maximum of each series, and older blocks are merged into
+#  coarser tiers. Every tier holds at most a fixed number of entries, so memory stays bounded
+#  for arbitrarily long runs, and plotting or summarizing the whole run costs O(entries)
+#  instead of O(days).
+
+from collections import deque
+import numpy as np
+
+
+##
+# Aggregate of the counts of consecutive days.
+class HistoryBlock:
+    __slots__ = ("start", "days", "min", "sum", "max")
+
+    ##
+    # @param start: First day covered by the block (days count from 0, like the StatsTracker histories).
+    # @param days: Number of days covered.
+    # @param min: Tuple with the minimum of each series.
+    # @param sum: Tuple with the sum of each series.
+    # @param max: Tuple with the maximum of each series.
+    def __init__(self, start, days, min, sum, max):
+        self.start = start
+        self.days = days
+        self.min = min
+        self.sum = sum
+        self.max = max
+
+    ##
+    # Merges consecutive blocks into one block.
+    # @param blocks: Blocks ordered by day.
+    @classmethod
+    def merge(cls, blocks):
+        return cls(blocks[0].start,
+                   sum(block.days for block in blocks),
+                   tuple(map(min, zip(*(block.min for block in blocks)))),
+                   tuple(map(sum, zip(*(block.sum for block in blocks)))),
+                   tuple(map(max, zip(*(block.max for block in blocks)))))
+
+    ##
+    # Returns the mean of each series over the block.
+    @property
+    def mean(self):
+        return tuple(total / self.days for total in self.sum)
+
+
+class TieredHistory:
+    ##
+    # Initializes an empty history.
+    # @param series: Names of the recorded series.
+    # @param full_days: Number of recent days kept at full resolution.
+    # @param block_days: Number of days aggregated into one block of the first tier.
+    # @param factor: Number of blocks of one tier merged into one block of the next tier.
+    # @param tier_size: Maximum number of blocks per tier.
+    # @param tiers: Number of aggregated tiers. The last tier merges its own oldest blocks when full.
+    # Raises ValueError if a size is too small.
+    def __init__(self, series=("susceptible", "infected", "recovered"),
+                 full_days=365, block_days=7, factor=4, tier_size=256, tiers=3):
+        if full_days < 1 or block_days < 1 or tiers < 1:
+            raise ValueError("History sizes must be at least 1")
+        if factor < 2 or tier_size < factor:
+            raise ValueError("Merge factor must be at least 2 and not larger than the tier size")
+        self.series = tuple(series)
+        self.full_days = full_days
+        self.block_days = block_days
+        self.factor = factor
+        self.tier_size = tier_size
+        self.recent = deque()
+        self.tiers = [deque() for _ in range(tiers)]
+        self.days = 0  # Number of recorded days
+        self._peak = [None] * len(self.series)
+        self._peak_day = [None] * len(self.series)
+        self._total = [0] * len(self.series)
+
+    ##
+    # Records the counts of the next day.
+    # @param counts: Tuple with one count per series.
+    def append(self, counts):
+        counts = tuple(int(count) for count in counts)
+        day = self.days
+        self.days += 1
+        for i, count in enumerate(counts):
+            self._total[i] += count
+            if self._peak[i] is None or count > self._peak[i]:
+                self._peak[i] = count
+                self._peak_day[i] = day
+
+        self.recent.append(counts)
+        if len(self.recent) >= self.full_days + self.block_days:
+            start = day - len(self.recent) + 1
+            days = [self.recent.popleft() for _ in range(self.block_days)]
+            columns = tuple(zip(*days))
+            self._push(0, HistoryBlock(start, self.block_days, tuple(map(min, columns)),
+                                       tuple(map(sum, columns)), tuple(map(max, columns))))
+
+    ##
+    # Records the same counts for several consecutive days.
+    # The result is the same as appending the counts day by day, but blocks holding only the repeated
+    # counts are filled arithmetically, so the cost depends on the number of blocks and not of days.
+    # @param counts: Tuple with one count per series.
+    # @param days: Number of days.
+    def extend_repeated(self, counts, days):
+        if days <= 0:
+            return
+        counts = tuple(int(count) for count in counts)
+        for i, count in enumerate(counts):
+            self._total[i] += count * days
+            if self._peak[i] is None or count > self._peak[i]:
+                self._peak[i] = count
+                self._peak_day[i] = self.days
+
+        first = self.days - len(self.recent)
+        self.days += days
+        # Same number of blocks as cut by append: afterwards between full_days and full_days + block_days - 1 recent days remain
+        blocks = max(0, (len(self.recent) + days - self.full_days) // self.block_days)
+        repeated = days  # Repeated days not yet stored in a block
+        for i in range(blocks):
+            start = first + i * self.block_days
+            if self.recent:
+                # The block still starts with recorded days
+                values = [self.recent.popleft() for _ in range(min(self.block_days, len(self.recent)))]
+                fill = self.block_days - len(values)
+                repeated -= fill
+                values += [counts] * fill
+            else:
+                repeated -= self.block_days
+                values = None
+            if values is None or values.count(values[0]) == self.block_days:
+                same = counts if values is None else values[0]
+                block = HistoryBlock(start, self.block_days, same,
+                                     tuple(count * self.block_days for count in same), same)
+            else:
+                columns = tuple(zip(*values))
+                block = HistoryBlock(start, self.block_days, tuple(map(min, columns)),
+                                     tuple(map(sum, columns)), tuple(map(max, columns)))
+            self._push(0, block)
+        self.recent.extend([counts] * repeated)
+
+    ##
+    # Adds a block to a tier, moving the oldest blocks to the next tier when the tier is full.
+    def _push(self, level, block):
+        tier = self.tiers[level]
+        tier.append(block)
+        if len(tier) <= self.tier_size:
+            return
+        merged = HistoryBlock.merge([tier.popleft() for _ in range(self.factor)])
+        if level + 1 < len(self.tiers):
+            self._push(level + 1, merged)
+        else:
+            tier.appendleft(merged)
+
+    ##
+    # Returns the counts of the days kept at full resolution.
+    # @return: Tuple of the first recent day and an array of shape (days, series).
+    def recent_days(self):
+        first = self.days - len(self.recent)
+        return first, np.array(self.recent, dtype=np.int64).reshape(len(self.recent), len(self.series))
+
+    ##
+    # Returns the whole history, oldest first, with one entry per block or recent day.
+    # @return: Dictionary of numpy arrays: "start" and "days" per entry, and "min", "mean", "max"
+    #          of shape (entries, series).
+    def entries(self):
+        blocks = [block for tier in reversed(self.tiers) for block in tier]
+        first, recent = self.recent_days()
+        start = np.concatenate([[block.start for block in blocks], np.arange(first, self.days)])
+        days = np.concatenate([[block.days for block in blocks], np.ones(len(recent))])
+        shape = (len(blocks), len(self.series))
+        minimum = np.array([block.min for block in blocks], dtype=np.float64).reshape(shape)
+        mean = np.array([block.mean for block in blocks], dtype=np.float64).reshape(shape)
+        maximum = np.array([block.max for block in blocks], dtype=np.float64).reshape(shape)
+        return {
+            "start": start.astype(np.int64),
+            "days": days.astype(np.int64),
+            "min": np.concatenate([minimum, recent]),
+            "mean": np.concatenate([mean, recent]),
+            "max": np.concatenate([maximum, recent]),
+        }
+
+    ##
+    # Returns the number of stored entries (blocks and recent days).
+    def __len__(self):
+        return len(self.recent) + sum(len(tier) for tier in self.tiers)
+
+    ##
+    # Summarizes the whole run without looking at the stored entries.
+    # @return: Dictionary per series with its "peak", "peak_day", "mean" and "last" value.
+    def summary(self):
+        last = self.recent[-1] if self.recent else (None,) * len(self.series)
+        return {name: {
+            "peak": self._peak[i],
+            "peak_day": self._peak_day[i],
+            "mean": self._total[i] / self.days if self.days else None,
+            "last": last[i],
+        } for i, name in enumerate(self.series)}
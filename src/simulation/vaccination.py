@@ -0,0 +1,168 @@
+## @package vaccination
+#  Targeted vaccination campaigns.
+#
+#  A campaign gives a limited number of doses per day to the susceptible persons it targets,
+#  in order of a priority (oldest age group, highest activity level or highest susceptibility first).
+#  The recipients of a day are chosen with a partial sort of the priority array, which costs
+#  linear time in the number of candidates, and are immunized with a few array writes.
+#
+#  Vaccines are all-or-nothing: a recipient is protected with the campaign's efficacy as probability.
+#  Protected persons become immune like recovered persons (and are counted as recovered),
+#  so their immunity wanes after IMMUNITY_PERIOD days like immunity after an infection.
+#  Every person receives at most one dose per campaign.
+
+from math import inf
+import random
+import numpy as np
+
+from models.healthstatus import SUSCEPTIBLE, RECOVERED
+from models.population import group_codes
+
+## Priorities of the recipients: persons with higher values are vaccinated first.
+PRIORITIES = {
+    "age": lambda population: population.group,
+    "activity": lambda population: population.activity_level,
+    "susceptibility": lambda population: population.susceptibility,
+}
+
+
+class VaccinationCampaign:
+    ##
+    # Initializes a campaign active on days start_day <= day < end_day.
+    # @param start_day: First day on which doses are given.
+    # @param daily_doses: Number of doses given per day.
+    # @param end_day: First day on which no doses are given anymore (inf for never).
+    # @param priority: Order of the recipients, one of PRIORITIES.
+    # @param groups: Age groups the campaign targets ("young", "middle", "old"), None for everyone.
+    # @param efficacy: Probability that a dose protects its recipient.
+    # Raises ValueError if a parameter is invalid.
+    def __init__(self, start_day, daily_doses, end_day=inf, priority="age", groups=None, efficacy=1.0):
+        if start_day < 0:
+            raise ValueError("Start day must be non-negative")
+        if end_day <= start_day:
+            raise ValueError("End day must be after start day")
+        if daily_doses < 0:
+            raise ValueError("Daily doses must be non-negative")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown vaccination priority: {priority}")
+        if not 0 <= efficacy <= 1:
+            raise ValueError("Efficacy must be between 0 and 1")
+        self.start_day = start_day
+        self.end_day = end_day
+        self.daily_doses = int(daily_doses)
+        self.priority = priority
+        self.groups = None if groups is None else group_codes(groups)
+        self.efficacy = efficacy
+        self.doses_given = 0
+        self._priority = None
+        self._unvaccinated = None
+
+    ##
+    # Returns True if the campaign gives doses on the given day.
+    # @param day: The simulation day.
+    def is_active(self, day):
+        return self.start_day <= day < self.end_day and self.daily_doses > 0
+
+    ##
+    # Precomputes the priority of every person and marks the targeted persons as unvaccinated.
+    # @param population: The population the campaign is applied to.
+    def attach(self, population):
+        self._priority = PRIORITIES[self.priority](population)
+        if self.groups is None:
+            self._unvaccinated = np.ones(len(population), dtype=bool)
+        else:
+            self._unvaccinated = np.isin(population.group, self.groups)
+        self.doses_given = 0
+
+    ##
+    # Returns True if the campaign still has persons left to vaccinate.
+    def has_candidates(self):
+        return bool(self._unvaccinated.any())
+
+    ##
+    # Chooses the recipients of the day's doses and marks them as vaccinated.
+    # Persons who are not susceptible on this day are skipped and stay eligible.
+    # Recipients with equal priority are chosen in no particular order.
+    # @param codes: Array of status codes of the day, indexed by person id.
+    # @return: Array of the ids of the recipients.
+    def select(self, codes):
+        candidates = np.flatnonzero(self._unvaccinated & (codes == SUSCEPTIBLE))
+        if len(candidates) > self.daily_doses:
+            # Partial sort: the highest priorities end up in the first daily_doses places
+            chosen = np.argpartition(-self._priority[candidates], self.daily_doses - 1)[:self.daily_doses]
+            candidates = candidates[chosen]
+        self._unvaccinated[candidates] = False
+        self.doses_given += len(candidates)
+        return candidates
+
+
+class VaccinationProgram:
+    ##
+    # Initializes the program with a list of campaigns.
+    # @param campaigns: Iterable of VaccinationCampaign objects.
+    def __init__(self, campaigns=()):
+        self.campaigns = list(campaigns)
+        self.protected = 0
+        self.last_doses = 0
+        self._attached = False
+
+    ##
+    # Adds a campaign to the program.
+    # The program has to be attached again before the campaign takes effect.
+    # @param campaign: The VaccinationCampaign to add.
+    def add(self, campaign):
+        self.campaigns.append(campaign)
+        self._attached = False
+
+    ##
+    # Prepares every campaign for the given population.
+    # @param population: The population the program is applied to.
+    def attach(self, population):
+        for campaign in self.campaigns:
+            campaign.attach(population)
+        self.protected = 0
+        self.last_doses = 0
+        self._attached = True
+
+    ##
+    # Gives the doses of the active campaigns and immunizes the protected recipients.
+    # Campaigns are served in order, so a person targeted by several campaigns gets the dose of the first.
+    # Raises RuntimeError if the program is not attached to a population.
+    # @param day: The simulation day.
+    # @param population: The population the program is attached to.
+    # @param codes: Array of status codes of the day; it is updated for the protected recipients.
+    # @param rng: Optional numpy Generator for the efficacy draws (defaults to one seeded from the random module).
+    # @return: Array of the ids of the protected recipients.
+    def vaccinate(self, day, population, codes, rng=None):
+        if not self._attached:
+            raise RuntimeError("Vaccination program not attached. Call attach first.")
+
+        self.last_doses = 0
+        protected = []
+        for campaign in self.campaigns:
+            if not campaign.is_active(day):
+                continue
+            recipients = campaign.select(codes)
+            self.last_doses += len(recipients)
+            if campaign.efficacy < 1 and len(recipients):
+                if rng is None:
+                    rng = np.random.default_rng(random.getrandbits(64))
+                recipients = recipients[rng.random(len(recipients)) < campaign.efficacy]
+            # Protected persons recover immediately without being infectious
+            population.infectious_time[recipients] = day
+            population.recovery_time[recipients] = day
+            codes[recipients] = RECOVERED
+            protected.append(recipients)
+
+        protected = np.concatenate(protected) if protected else np.empty(0, dtype=np.int64)
+        self.protected += len(protected)
+        return protected
+
+    ##
+    # Returns the next day after the given day on which doses may be given.
+    # @param day: The simulation day.
+    # @return: The next vaccination day, or inf if no campaign gives doses anymore.
+    def next_change(self, day):
+        days = [max(day + 1, campaign.start_day) for campaign in self.campaigns
+                if campaign.end_day > day + 1 and campaign.daily_doses > 0 and campaign.has_candidates()]
+        return min(days, default=inf)
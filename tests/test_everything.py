@@ -3,6 +3,15 @@
 import unittest
 import random
 import math
+import os
+import csv
+import json
+import tempfile
+import socket
+import asyncio
+import dataclasses
+from unittest import mock
+import numpy as np
 
 from models import (
     SimulationParameters,
@@ -11,9 +20,46 @@ from models import (
     RandomTransmissionPolicy,
     AlwaysTransmitPolicy,
     Disease,
-    Population
+    Population,
+    NEVER,
+    UniformDistribution,
+    IntegerDistribution,
+    ContactSampler,
+    RandomStreams,
+    alias_table
+)
+from models.randomstreams import CONTACTS, TRANSMISSION
+from models.microdata import import_microdata, MICRODATA_DTYPE
+from models.memoryreport import person_memory_report
+from models.person import PersonView
+from service import SimulationServer, SimulationClient
+from gui.rasterview import RasterLayout
+from analysis import AbcCalibration, DistanceExceeded, Scenario, compare_scenarios, SensitivityAnalysis
+from analysis.comparison import attack_rate
+from simulation import (
+    StatsTracker,
+    TieredHistory,
+    InfectionLog,
+    MultiStrainSimulation,
+    ProgressivePreview,
+    downsampled_parameters,
+    AsyncSimulation,
+    Simulation,
+    InterventionSchedule,
+    VaccinationCampaign,
+    VaccinationProgram,
+    SocialDistancing,
+    ActivityCap,
+    TransmissionMultiplier,
+    CsvWriter,
+    JsonLinesWriter,
+    NpyWriter,
+    StepRecord,
+    NoInfections,
+    PeakPassed,
+    AttackRateReached,
+    ResultCache
 )
-from simulation import StatsTracker
 
 
 class TestSimulationParameters(unittest.TestCase):
@@ -72,6 +118,32 @@ class TestPerson(unittest.TestCase):
         person2 = Person(id=2, susceptibility=0.5, recovery_time=0, infectious_time=0, activity_level=1)
         self.assertEqual(person2.get_status(90), HealthStatus.Susceptible)
 
+    def test_status_code_matches_status(self):
+        for time in (0, 5, 9, 10, 99, 100):
+            self.assertEqual(self.person.status_code(time), self.person.get_status(time).value)
+
+    def test_slots_and_never(self):
+        person = Person(id=3, susceptibility=0.5, recovery_time=NEVER, infectious_time=NEVER, activity_level=1)
+        self.assertFalse(hasattr(person, '__dict__'))
+        self.assertEqual(person.get_status(10**6), HealthStatus.Susceptible)
+
+    def test_memory_report(self):
+        report = person_memory_report(2000)
+        self.assertLess(report['slotted'], report['legacy'])
+        self.assertLess(report['population'], report['legacy'])
+        self.assertLess(3 * report['arrays'], report['legacy'])
+        self.assertIn('array_pass', report)
+
+    def test_person_view_has_no_unused_slots(self):
+        self.assertEqual(PersonView.__slots__, ("id", "_population"))
+        self.assertLess(PersonView.__basicsize__, Person.__basicsize__)
+        view = Population(3, 0, 0).persons[1]
+        self.assertFalse(hasattr(view, '__dict__'))
+        view.activity_level = 7
+        self.assertEqual(view._population.activity_level[1], 7)
+        view.recovery_time = math.inf
+        self.assertEqual(view._population.recovery_time[1], NEVER)
+
     def test_is_infectious(self):
         self.assertFalse(self.person.is_infectious(4))
         self.assertTrue(self.person.is_infectious(5))
@@ -126,6 +198,15 @@ class TestDisease(unittest.TestCase):
         self.target.recovery_time = math.inf
         self.assertTrue(self.disease.attempt_infection(self.source, self.target, 1))
 
+    def test_attempt_infection_uses_status_cache(self):
+        # The cache says the target is already infected, so its own times are not consulted
+        self.target.infectious_time = math.inf
+        self.target.recovery_time = math.inf
+        self.source.id, self.target.id = 0, 1
+        status = bytes([HealthStatus.Infected.value, HealthStatus.Infected.value])
+        self.assertFalse(self.disease.attempt_infection(self.source, self.target, 1, status))
+        self.assertEqual(self.source.interact(self.disease, [self.target], 1, status), [])
+
     def test_infect_sets_times(self):
         person = Person(id=3, susceptibility=0.1, recovery_time=math.inf, infectious_time=math.inf, activity_level=1)
         self.disease.infect(person, time=5)
@@ -139,6 +220,23 @@ class TestPopulation(unittest.TestCase):
         pop = Population(2, 1, 1)
         self.assertEqual(len(pop.persons), 4)
 
+    def test_group_boundaries(self):
+        pop = Population(2, 5, 3)
+        self.assertEqual(list(pop.group), [0] * 2 + [1] * 5 + [2] * 3)
+        middle = pop.activity_level[2:7]
+        self.assertTrue(((middle >= 5) & (middle <= 25)).all())
+        old = pop.susceptibility[7:]
+        self.assertTrue(((old >= 0.4) & (old < 0.95)).all())
+
+    def test_custom_distributions_and_seed(self):
+        fixed = (UniformDistribution(0.5, 0.5),) * 3
+        activity = (IntegerDistribution(3, 3),) * 3
+        pop = Population(4, 4, 4, susceptibility=fixed, activity_level=activity, rng=1)
+        self.assertTrue((pop.susceptibility == 0.5).all())
+        self.assertTrue((pop.activity_level == 3).all())
+        a, b = Population(5, 5, 5, rng=7), Population(5, 5, 5, rng=7)
+        self.assertTrue((a.susceptibility == b.susceptibility).all())
+
     def test_get_contacts_no_activity(self):
         pop = Population(1, 0, 0)
         p = pop.persons[0]
@@ -155,6 +253,205 @@ class TestPopulation(unittest.TestCase):
         self.assertEqual(set(contacts), set(pop.persons))
 
 
+class TestContactSampler(unittest.TestCase):
+    def test_alias_table_preserves_weights(self):
+        weights = np.array([0, 1, 2, 3, 100, 0.5, 7], dtype=np.float64)
+        probability, alias = alias_table(weights)
+        mass = probability.copy()
+        np.add.at(mass, alias, 1 - probability)
+        np.testing.assert_allclose(mass, weights * len(weights) / weights.sum())
+        with self.assertRaises(ValueError):
+            alias_table(np.zeros(3))
+
+    def test_draws_follow_activity(self):
+        pop = Population(4, 0, 0, activity_level=(IntegerDistribution(1, 1),) * 3, rng=1)
+        pop.activity_level[:] = [0, 1, 3, 6000]
+        sampler = ContactSampler(pop, rng=2)
+        offsets, targets = sampler.draw(np.array([3]))
+        self.assertEqual(offsets.tolist(), [0, 4])  # At most the population size
+        pop.activity_level[3] = 6
+        sampler.invalidate()
+        offsets, targets = sampler.draw(np.full(2000, 2))
+        counts = np.bincount(targets, minlength=4)
+        self.assertEqual(len(targets), 6000)
+        self.assertEqual(counts[0], 0)
+        np.testing.assert_allclose(counts[1:] / 6000, [0.1, 0.3, 0.6], atol=0.03)
+
+    def test_buffers_are_reused(self):
+        pop = Population(50, 0, 0, rng=3)
+        sampler = ContactSampler(pop, rng=4)
+        first = sampler.draw(np.arange(10))[1]
+        second = sampler.draw(np.arange(5))[1]
+        self.assertTrue(np.shares_memory(first, second))
+
+    def test_distancing_rebuilds_table(self):
+        pop = Population(20, 0, 0, rng=3)
+        sampler = ContactSampler(pop, rng=4)
+        sampler.draw(np.arange(20))
+        pop.distancing_factor[10:] = 0
+        sampler.invalidate()
+        offsets, targets = sampler.draw(np.arange(10))
+        self.assertTrue((targets < 10).all())
+        self.assertEqual(offsets[-1], np.minimum(pop.activity_level[:10], 20).sum())
+        pop.distancing_factor[:] = 0
+        sampler.invalidate()
+        self.assertEqual(len(sampler.draw(np.arange(10))[1]), 0)
+
+    def test_weighted_simulation(self):
+        params = SimulationParameters(100, 100, 50, 'Flu', 0.3, 1, 3)
+        reports = []
+        for _ in range(2):
+            sim = Simulation()
+            sim.weighted_contacts = True
+            sim.setup_simulation(params, seed=5)
+            sim.run_simulation(15)
+            reports.append(sim.stats.get_list_report())
+        self.assertEqual(reports[0], reports[1])
+        s, i, r = reports[0]
+        self.assertTrue(all(a + b + c == 250 for a, b, c in zip(s, i, r)))
+        self.assertGreater(sim.cumulative_infections, 1)
+        sim.toggle_social_distancing(True)
+        self.assertTrue(sim.contact_sampler._stale)
+
+
+class TestPopulationStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pop = Population(3, 4, 5)
+        indptr = np.arange(0, 25, 2)
+        indices = (np.arange(24) // 2 + 1 + np.arange(24) % 2) % 12  # Person i meets i + 1 and i + 2
+        self.pop.set_contact_network(indptr, indices)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_and_load(self):
+        self.pop.save(self.tmp.name)
+        loaded = Population.load(self.tmp.name)
+        self.assertIsInstance(loaded.susceptibility, np.memmap)
+        self.assertFalse(loaded.susceptibility.flags.writeable)
+        self.assertTrue((loaded.susceptibility == self.pop.susceptibility).all())
+        self.assertEqual(list(loaded.group_sizes()), [3, 4, 5])
+        self.assertTrue((loaded.infectious_time == NEVER).all())
+        self.assertTrue((loaded.contact_network[1] == self.pop.contact_network[1]).all())
+
+    def test_contacts_follow_network(self):
+        person = self.pop.persons[0]
+        contacts = self.pop.get_contacts(person)
+        self.assertEqual(sorted(c.id for c in contacts), [1, 2])
+
+    def test_setup_with_loaded_population(self):
+        self.pop.save(self.tmp.name)
+        loaded = Population.load(self.tmp.name)
+        sim = Simulation()
+        sim.setup_simulation(SimulationParameters(3, 4, 5, 'Flu', 0.5, 1, 2), loaded)
+        self.assertIs(sim.population, loaded)
+        sim.run_simulation(3)
+        with self.assertRaises(ValueError):
+            sim.setup_simulation(SimulationParameters(1, 1, 1, 'Flu', 0.5, 1, 2), loaded)
+
+
+class TestPopulationTemplate(unittest.TestCase):
+    params = SimulationParameters(50, 50, 50, 'Flu', 0.5, 1, 3)
+
+    def test_restart_reuses_population(self):
+        sim = Simulation()
+        sim.setup_simulation(self.params, seed=4)
+        population = sim.population
+        persons = population.persons
+        sim.run_simulation(20)
+        first = sim.stats.get_list_report()
+        sim.reset_simulation()
+        with mock.patch('simulation.simulation.Population') as build:
+            sim.setup_simulation(self.params, seed=4)
+        build.assert_not_called()
+        self.assertIs(sim.population, population)
+        self.assertIs(sim.population.persons, persons)
+        sim.run_simulation(20)
+        self.assertEqual(sim.stats.get_list_report(), first)
+
+    def test_restart_matches_fresh_simulation(self):
+        sim = Simulation()
+        sim.setup_simulation(self.params, seed=4)
+        sim.toggle_social_distancing(True)
+        sim.run_simulation(10)
+        sim.setup_simulation(self.params, seed=4)
+        sim.run_simulation(15)
+        fresh = Simulation()
+        fresh.setup_simulation(self.params, seed=4)
+        fresh.run_simulation(15)
+        self.assertEqual(sim.stats.get_list_report(), fresh.stats.get_list_report())
+
+    def test_unseeded_restart_draws_new_population(self):
+        sim = Simulation()
+        sim.setup_simulation(self.params)
+        population = sim.population
+        sim.setup_simulation(self.params)
+        self.assertIsNot(sim.population, population)
+
+    def test_changed_sizes_build_new_population(self):
+        sim = Simulation()
+        sim.setup_simulation(self.params)
+        population = sim.population
+        sim.setup_simulation(SimulationParameters(50, 50, 10, 'Flu', 0.5, 1, 3))
+        self.assertIsNot(sim.population, population)
+        sim.reuse_population = False
+        population = sim.population
+        sim.setup_simulation(SimulationParameters(50, 50, 10, 'Flu', 0.5, 1, 3))
+        self.assertIsNot(sim.population, population)
+
+
+class TestMicrodataImport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_csv(self, lines):
+        path = os.path.join(self.tmp.name, 'people.csv')
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_csv_in_chunks(self):
+        rows = [f'{i},{age},{0.1 * (i % 10):.1f},{i % 7}' for i, age in enumerate([3, 30, 70, 24, 25, 64, 65])]
+        path = self.write_csv(['id,age,susceptibility,activity_level'] + rows)
+        population = import_microdata(path, chunk_rows=2)
+        self.assertEqual(population.group.tolist(), [0, 1, 2, 0, 1, 1, 2])
+        np.testing.assert_allclose(population.susceptibility, [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6])
+        self.assertEqual(population.activity_level.tolist(), [0, 1, 2, 3, 4, 5, 6])
+        self.assertEqual(population.activity_level.dtype, np.int32)
+
+    def test_binary_records(self):
+        records = np.zeros(5, dtype=MICRODATA_DTYPE)
+        records['age'] = [10, 40, 80, 90, 1]
+        records['susceptibility'] = 0.5
+        records['activity_level'] = [1, 2, 3, 4, 5]
+        path = os.path.join(self.tmp.name, 'people.bin')
+        records.tofile(path)
+        population = import_microdata(path, chunk_rows=2)
+        self.assertEqual(list(population.group_sizes()), [2, 1, 2])
+        self.assertEqual(population.activity_level.tolist(), [1, 2, 3, 4, 5])
+        sim = Simulation()
+        sim.setup_simulation(SimulationParameters(2, 1, 2, 'Flu', 0.5, 1, 2), population)
+        sim.run_simulation(3)
+
+    def test_invalid_records(self):
+        header = 'age,susceptibility,activity_level'
+        with self.assertRaisesRegex(ValueError, 'susceptibility in microdata record 2'):
+            import_microdata(self.write_csv([header, '30,0.5,3', '40,1.5,3']), chunk_rows=1)
+        with self.assertRaisesRegex(ValueError, 'age in microdata record 1'):
+            import_microdata(self.write_csv([header, '-1,0.5,3']))
+        with self.assertRaisesRegex(ValueError, 'lacks the columns: activity_level'):
+            import_microdata(self.write_csv(['age,susceptibility', '30,0.5']))
+        with self.assertRaises(ValueError):
+            import_microdata(self.write_csv([header, '30,abc,3']))
+        path = os.path.join(self.tmp.name, 'broken.bin')
+        with open(path, 'wb') as f:
+            f.write(b'123')
+        with self.assertRaises(ValueError):
+            import_microdata(path)
+
+
 class TestStatsTracker(unittest.TestCase):
     def test_record_and_report(self):
         pop = Population(1, 1, 0)
@@ -166,6 +463,821 @@ class TestStatsTracker(unittest.TestCase):
         self.assertEqual(i_history[0], 0)
         self.assertEqual(r_history[0], 0)
 
+    def test_record_with_status_codes(self):
+        pop = Population(2, 1, 0)
+        tracker = StatsTracker()
+        tracker.record_step(0, pop, np.array([1, 2, 2], dtype=np.int8))
+        self.assertEqual(tracker.get_list_report(), ([1], [2], [0]))
+
+    def test_simulation_shares_status_codes(self):
+        sim = Simulation()
+        sim.setup_simulation(SimulationParameters(10, 10, 10, 'Flu', 0.5, 1, 2))
+        sim.skip_quiescent = False
+        with mock.patch.object(sim.population, 'status_codes', wraps=sim.population.status_codes) as codes:
+            sim.run_simulation(5)
+        # One computation for the first day, then one per simulated day
+        self.assertEqual(codes.call_count, 6)
+
+
+class TestTieredHistory(unittest.TestCase):
+    def test_memory_is_bounded(self):
+        history = TieredHistory(full_days=10, block_days=2, factor=2, tier_size=4, tiers=2)
+        for day in range(10_000):
+            history.append((day, 1, 2))
+        self.assertLessEqual(len(history), 10 + 2 + 4 + 4)
+        self.assertEqual(history.days, 10_000)
+
+    def test_entries_cover_every_day(self):
+        history = TieredHistory(full_days=5, block_days=3, factor=2, tier_size=3, tiers=2)
+        values = [(day % 7, day, 0) for day in range(200)]
+        for counts in values:
+            history.append(counts)
+        entries = history.entries()
+        self.assertEqual(entries["start"][0], 0)
+        self.assertEqual(entries["days"].sum(), 200)
+        np.testing.assert_array_equal(entries["start"][1:], np.cumsum(entries["days"])[:-1])
+        # Aggregates are exact over the days each entry covers
+        for start, days, minimum, mean, maximum in zip(entries["start"], entries["days"],
+                                                      entries["min"], entries["mean"], entries["max"]):
+            block = np.array(values[start:start + days], dtype=np.float64)
+            np.testing.assert_array_equal(minimum, block.min(axis=0))
+            np.testing.assert_allclose(mean, block.mean(axis=0))
+            np.testing.assert_array_equal(maximum, block.max(axis=0))
+
+    def test_summary(self):
+        history = TieredHistory(full_days=3, block_days=2, factor=2, tier_size=2, tiers=1)
+        for infected in [1, 5, 9, 4, 2, 0, 0]:
+            history.append((10 - infected, infected, 0))
+        summary = history.summary()["infected"]
+        self.assertEqual((summary["peak"], summary["peak_day"], summary["last"]), (9, 2, 0))
+        self.assertAlmostEqual(summary["mean"], 3.0)
+
+    def test_extend_repeated_matches_appends(self):
+        bulk = TieredHistory(full_days=5, block_days=3, factor=2, tier_size=3, tiers=2)
+        daily = TieredHistory(full_days=5, block_days=3, factor=2, tier_size=3, tiers=2)
+        for day, repeat in enumerate([0, 1, 2, 4, 7, 0, 30, 1, 500, 3]):
+            counts = (day, 10 - day, day % 3)
+            bulk.append(counts)
+            daily.append(counts)
+            bulk.extend_repeated(counts[::-1], repeat)
+            for _ in range(repeat):
+                daily.append(counts[::-1])
+            self.assertEqual(bulk.days, daily.days)
+            for key, value in daily.entries().items():
+                np.testing.assert_array_equal(bulk.entries()[key], value)
+            self.assertEqual(bulk.summary(), daily.summary())
+
+    def test_rejects_invalid_sizes(self):
+        with self.assertRaises(ValueError):
+            TieredHistory(full_days=0)
+        with self.assertRaises(ValueError):
+            TieredHistory(factor=1)
+
+    def test_bounded_stats_tracker(self):
+        sim = Simulation()
+        sim.history_days = 20
+        sim.setup_simulation(SimulationParameters(20, 20, 20, 'Flu', 0.5, 1, 2), seed=3)
+        sim.skip_quiescent = False
+        sim.run_simulation(100)
+        self.assertEqual(len(sim.stats.i_history), 20)
+        self.assertEqual(sim.stats.history.days, 100)
+        first, recent = sim.stats.history.recent_days()
+        self.assertEqual(list(recent[-20:, 1]), list(sim.stats.i_history))
+
+
+class TestStepMetrics(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.sim.setup_simulation(SimulationParameters(100, 100, 100, 'Flu', 0.3, 1, 5), seed=7)
+        self.sim.run_simulation(60)
+
+    def test_incidence_matches_new_infections(self):
+        metrics = self.sim.metrics
+        incidence = metrics.incidence_by_group()
+        self.assertEqual(incidence.shape, (60, 3))
+        self.assertEqual(int(incidence.sum()) + 1, self.sim.cumulative_infections)
+        self.assertEqual(metrics.cumulative_infections, self.sim.cumulative_infections)
+        self.assertEqual(sum(metrics.summary()["infections_by_group"].values()), metrics.cumulative_infections)
+
+    def test_every_infection_is_credited_to_a_cohort(self):
+        metrics = self.sim.metrics
+        self.assertEqual(sum(metrics.cohort_secondary), metrics.cumulative_infections - 1)
+        self.assertEqual(sum(metrics.cohort_size), metrics.cumulative_infections)
+        rt = metrics.reproduction_numbers()
+        self.assertTrue(np.all(np.isnan(rt) == (np.array(metrics.cohort_size) == 0)))
+
+    def test_online_peak_matches_history(self):
+        metrics = self.sim.metrics
+        infected = self.sim.stats.i_history
+        self.assertEqual(metrics.peak_infected, max(infected))
+        self.assertEqual(metrics.peak_day, infected.index(max(infected)) + 1)
+        self.assertAlmostEqual(metrics.attack_rate, self.sim.cumulative_infections / 300)
+
+
+class TestInfectionLog(unittest.TestCase):
+    def make_log(self, **kwargs):
+        # 0 (patient zero) -> 1 -> 2 -> 4, 0 -> 3, and 1 is reinfected by 3 on day 9
+        log = InfectionLog(**kwargs)
+        log.record(1, [0, 0], [1, 3])
+        log.record(2, [1], [2])
+        log.record(4, [2], [4])
+        log.record(9, [3], [1])
+        return log
+
+    def test_chunks_spill_to_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log = self.make_log(chunk_size=2, directory=tmp)
+            self.assertEqual(len(log), 5)
+            self.assertEqual(len(os.listdir(tmp)), 2)
+            log.flush()
+            loaded = InfectionLog.load(tmp)
+            np.testing.assert_array_equal(loaded.events(), log.events())
+            self.assertEqual(loaded.events()[:, 2].tolist(), [1, 3, 2, 4, 1])
+
+    def test_chunks_are_iterated_lazily(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log = self.make_log(chunk_size=2, directory=tmp)
+            chunks = list(log.chunks())
+            self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+            self.assertIsInstance(chunks[0], np.memmap)
+            self.assertEqual(log.ancestors(4).tolist(), [[4, 2, 4], [2, 1, 2], [1, 0, 1]])
+            index = log._index
+            log.record(10, [4], [5])
+            self.assertIs(log._index, index)  # Rebuilt by the next query, not by record
+            self.assertEqual(log.ancestors(5)[0].tolist(), [10, 4, 5])
+            self.assertIsNot(log._index, index)
+
+    def test_ancestors(self):
+        log = self.make_log(chunk_size=3)
+        self.assertEqual(log.ancestors(4).tolist(), [[4, 2, 4], [2, 1, 2], [1, 0, 1]])
+        self.assertEqual(log.ancestors(1).tolist(), [[9, 3, 1], [1, 0, 3]])
+        self.assertEqual(log.ancestors(1, day=5).tolist(), [[1, 0, 1]])
+        self.assertEqual(len(log.ancestors(0)), 0)
+
+    def test_descendants(self):
+        log = self.make_log()
+        self.assertEqual(sorted(log.descendants(0)[:, 2].tolist()), [1, 1, 2, 3, 4])
+        self.assertEqual(log.descendants(1, day=5)[:, 2].tolist(), [2, 4])
+        self.assertEqual(len(log.descendants(1)), 0)
+        self.assertEqual(log.descendants(3)[:, 2].tolist(), [1])
+
+    def test_simulation_logs_every_infection(self):
+        sim = Simulation()
+        sim.setup_simulation(SimulationParameters(100, 100, 100, 'Flu', 0.3, 1, 5), seed=7)
+        sim.infection_log = InfectionLog(chunk_size=16)
+        sim.run_simulation(40)
+        events = sim.infection_log.events()
+        self.assertEqual(len(events), sim.cumulative_infections - 1)
+        # Every infectee was infected on the logged day
+        np.testing.assert_array_equal(sim.population.infectious_time[events[-1:, 2]], events[-1:, 0])
+        # Patient zero stays infected forever and is the root of every chain
+        patient_zero = int(np.flatnonzero((sim.population.recovery_time == NEVER)
+                                          & (sim.population.infectious_time == 0))[0])
+        self.assertEqual(len(sim.infection_log.descendants(patient_zero)), len(events))
+
+
+class TestMultiStrain(unittest.TestCase):
+    params = SimulationParameters(100, 100, 100, 'Flu', 0.3, 1, 5)
+
+    def test_single_strain_matches_simulation(self):
+        sim = Simulation()
+        sim.setup_simulation(self.params, seed=5)
+        sim.skip_quiescent = False
+        sim.run_simulation(30)
+        multi = MultiStrainSimulation()
+        multi.setup_simulation(self.params, [Disease('Flu', 0.3, 1, 5)], seed=5)
+        multi.run_simulation(30)
+        self.assertEqual(multi.strains[0].stats.get_list_report(), sim.stats.get_list_report())
+
+    def test_contacts_are_drawn_once_per_person(self):
+        multi = MultiStrainSimulation()
+        multi.setup_simulation(self.params, [Disease('A', 0.3, 1, 5), Disease('B', 0.2, 2, 4)], seed=1)
+        carriers = int((multi.status_codes() == 2).any(axis=0).sum())
+        with mock.patch.object(multi.population, 'contact_ids', wraps=multi.population.contact_ids) as contacts:
+            multi.simulate_step()
+        self.assertEqual(contacts.call_count, 1)
+        self.assertEqual(len(contacts.call_args[0][0]), carriers)
+
+    def test_full_cross_immunity_prevents_coinfection(self):
+        multi = MultiStrainSimulation()
+        multi.setup_simulation(self.params, [Disease('A', 0.5, 1, 5), Disease('B', 0.5, 1, 5)],
+                               cross_immunity=[[0, 1], [1, 0]], seed=2)
+        multi.run_simulation(40)
+        a, b = (strain.infectious_time != NEVER for strain in multi.strains)
+        self.assertGreater(a.sum() + b.sum(), 2)
+        patients_zero = (multi.strains[0].recovery_time == NEVER) & a | (multi.strains[1].recovery_time == NEVER) & b
+        self.assertEqual(int((a & b & ~patients_zero).sum()), 0)
+
+    def test_invalid_cross_immunity(self):
+        multi = MultiStrainSimulation()
+        with self.assertRaises(ValueError):
+            multi.setup_simulation(self.params, [Disease('A', 0.5, 1, 5)], cross_immunity=[[0, 1]])
+        with self.assertRaises(ValueError):
+            multi.setup_simulation(self.params, [])
+
+
+class TestProgressivePreview(unittest.TestCase):
+    params = SimulationParameters(3000, 4000, 1000, 'Flu', 0.3, 1, 5)
+
+    def test_downsampled_parameters(self):
+        small, factor = downsampled_parameters(self.params, 800)
+        self.assertEqual((small.young_population, small.middle_population, small.old_population), (300, 400, 100))
+        self.assertAlmostEqual(factor, 10.0)
+        self.assertEqual(small.transmission_rate, self.params.transmission_rate)
+        same, factor = downsampled_parameters(self.params, 10_000)
+        self.assertIs(same, self.params)
+        self.assertEqual(factor, 1.0)
+
+    def test_approximate_curve_is_scaled(self):
+        preview = ProgressivePreview(self.params, 20, max_persons=400, seed=1)
+        s, i, r = preview.approximate()
+        self.assertEqual(len(s), 20)
+        for day in range(20):
+            self.assertAlmostEqual(s[day] + i[day] + r[day], 8000, delta=3)
+
+    def test_refinement_replaces_approximate_days(self):
+        preview = ProgressivePreview(self.params, 15, max_persons=400, seed=1)
+        approximate = preview.approximate()
+        preview.start()
+        preview._thread.join()
+        self.assertTrue(preview.done)
+        self.assertIsNone(preview.error)
+        sim = Simulation()
+        sim.setup_simulation(self.params, seed=1)
+        sim.run_simulation(15)
+        self.assertEqual(preview.combined(approximate), tuple(sim.stats.get_list_report()))
+
+    def test_failed_refinement_sets_error(self):
+        preview = ProgressivePreview(self.params, 5, seed=1)
+        with mock.patch.object(Simulation, 'simulate_step', side_effect=RuntimeError("boom")):
+            preview.start()
+            preview._thread.join()
+        self.assertTrue(preview.done)
+        self.assertIsInstance(preview.error, RuntimeError)
+        self.assertEqual(preview.refined(), ([], [], []))
+
+
+class TestAsyncSimulation(unittest.IsolatedAsyncioTestCase):
+    params = SimulationParameters(100, 100, 50, 'Flu', 0.3, 1, 3)
+
+    def reference(self, days):
+        sim = Simulation()
+        sim.setup_simulation(self.params, seed=4)
+        return [dataclasses.asdict(record) for record in sim.iter_steps(days)]
+
+    async def test_run_matches_synchronous_run(self):
+        sim = AsyncSimulation(chunk_days=3)
+        await sim.setup(self.params, seed=4)
+        self.assertEqual(await sim.run(10), 10)
+        self.assertEqual(sim.current_time, 10)
+        reference = self.reference(10)
+        self.assertEqual(sim.stats.i_history, [record['infected'] for record in reference])
+
+    async def test_steps_yield_every_day(self):
+        sim = AsyncSimulation(chunk_days=4)
+        await sim.setup(self.params, seed=4)
+        records = [dataclasses.asdict(record) async for record in sim.steps(10)]
+        self.assertEqual(records, self.reference(10))
+
+    async def test_run_after_breaking_out_of_steps(self):
+        sim = AsyncSimulation(chunk_days=4)
+        await sim.setup(self.params, seed=4)
+        steps = sim.steps(10)
+        async for record in steps:
+            break
+        # The unfinished generator is still referenced, so it is not closed yet
+        self.assertEqual(await asyncio.wait_for(sim.run(3), timeout=10), 3)
+        self.assertEqual(sim.current_time, 7)
+        await steps.aclose()
+
+    async def test_stop_conditions(self):
+        sim = AsyncSimulation(chunk_days=4)
+        await sim.setup(SimulationParameters(10, 10, 10, 'Flu', 0.0, 1, 3), seed=1)
+        self.assertEqual(await sim.run(50, [NoInfections(ignore_patient_zero=True)]), 1)
+
+    async def test_event_loop_keeps_running(self):
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        simulations = [AsyncSimulation(chunk_days=1) for _ in range(3)]
+        for seed, sim in enumerate(simulations):
+            await sim.setup(self.params, seed=seed)
+        beat = asyncio.create_task(heartbeat())
+        days = await asyncio.gather(*[sim.run(20) for sim in simulations])
+        beat.cancel()
+        self.assertEqual(days, [20, 20, 20])
+        self.assertGreater(ticks, 20)
+
+    async def test_not_set_up(self):
+        with self.assertRaises(RuntimeError):
+            await AsyncSimulation().run(1)
+        with self.assertRaises(ValueError):
+            AsyncSimulation(chunk_days=0)
+
+
+class TestRasterLayout(unittest.TestCase):
+    def test_groups_form_bands(self):
+        group = np.array([2, 0, 1, 0, 2, 0, 0, 1], dtype=np.int8)
+        layout = RasterLayout(group, width=3)
+        self.assertEqual(layout.band_rows.tolist(), [0, 2, 3, 4])
+        self.assertEqual(layout.buffer.shape, (4, 3))
+        self.assertEqual(len(set(layout.positions.tolist())), len(group))
+        rows = layout.positions // 3
+        for person, person_group in enumerate(group):
+            self.assertTrue(layout.band_rows[person_group] <= rows[person] < layout.band_rows[person_group + 1])
+
+    def test_update_in_place(self):
+        population = Population(5, 3, 2)
+        layout = RasterLayout(population.group)
+        buffer = layout.buffer
+        codes = np.array([1, 2, 3, 1, 1, 2, 2, 3, 3, 1], dtype=np.int8)
+        self.assertIs(layout.update(codes), buffer)
+        self.assertEqual(np.bincount(buffer.reshape(-1), minlength=4).tolist(), [6, 4, 3, 3])
+        np.testing.assert_array_equal(buffer.reshape(-1)[layout.positions], codes)
+
+
+class TestInterventionSchedule(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.sim.setup_simulation(SimulationParameters(10, 0, 10, 'Flu', 0.5, 1, 2))
+
+    def test_activity_cap_by_group(self):
+        self.sim.set_interventions(InterventionSchedule([ActivityCap(1, 3, cap=2, groups=['young'])]))
+        pop = self.sim.population
+        self.sim.run_simulation(1)
+        self.assertTrue((pop.distancing_factor == 1.0).all())
+        # Day 1 is simulated with the cap in place
+        self.sim.run_simulation(1)
+        young = pop.persons[0]
+        self.assertAlmostEqual(young.activity_level * young.distancing_factor, 2)
+        self.assertTrue((pop.distancing_factor[10:] == 1.0).all())
+        self.sim.run_simulation(2)
+        self.assertTrue((pop.distancing_factor == 1.0).all())
+
+    def test_transmission_multiplier(self):
+        self.sim.set_interventions(InterventionSchedule([TransmissionMultiplier(0, 2, multiplier=0.5)]))
+        self.assertEqual(self.sim.disease.transmission_rate, 0.25)
+        self.sim.run_simulation(2)
+        self.sim.simulate_step()
+        self.assertEqual(self.sim.disease.transmission_rate, 0.5)
+
+    def test_combines_with_toggle(self):
+        self.sim.set_interventions(InterventionSchedule([SocialDistancing(0, groups=['old'])]))
+        self.sim.toggle_social_distancing(True)
+        old = self.sim.population.persons[15]
+        expected = 1 / (4 * old.activity_level)
+        self.assertAlmostEqual(old.distancing_factor, expected)
+        self.sim.set_interventions(None)
+        self.assertAlmostEqual(old.distancing_factor, 1 / (2 * old.activity_level ** 0.5))
+
+    def test_invalid_days(self):
+        with self.assertRaises(ValueError):
+            SocialDistancing(5, 5)
+
+
+class TestVaccination(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.sim.setup_simulation(SimulationParameters(10, 10, 10, 'Flu', 0.0, 1, 2), seed=3)
+        self.patient_zero = int(np.flatnonzero(self.sim.population.recovery_time == NEVER)[0])
+
+    def vaccinated(self):
+        return set(np.flatnonzero(self.sim.population.recovery_time != NEVER).tolist())
+
+    def test_oldest_first(self):
+        self.sim.set_vaccination(VaccinationProgram([VaccinationCampaign(0, 4, priority='age')]))
+        self.sim.run_simulation(1)
+        vaccinated = self.vaccinated()
+        self.assertEqual(len(vaccinated), 4)
+        self.assertTrue((self.sim.population.group[list(vaccinated)] == 2).all())
+        self.assertEqual(self.sim.stats.r_history[-1], 4)
+
+    def test_most_active_first(self):
+        self.sim.set_vaccination(VaccinationProgram([VaccinationCampaign(0, 5, priority='activity')]))
+        self.sim.run_simulation(1)
+        vaccinated = list(self.vaccinated())
+        others = [i for i in range(30) if i not in vaccinated and i != self.patient_zero]
+        activity = self.sim.population.activity_level
+        self.assertGreaterEqual(activity[vaccinated].min(), activity[others].max())
+
+    def test_daily_capacity_and_groups(self):
+        campaign = VaccinationCampaign(1, 3, groups=['young'])
+        program = VaccinationProgram([campaign])
+        self.sim.set_vaccination(program)
+        self.sim.run_simulation(2)
+        self.assertEqual(program.last_doses, 3)
+        self.sim.run_simulation(10)
+        young = 10 - (self.patient_zero < 10)
+        self.assertEqual(campaign.doses_given, young)
+        self.assertEqual(program.protected, young)
+        self.assertTrue(all(i < 10 for i in self.vaccinated()))
+
+    def test_efficacy(self):
+        campaign = VaccinationCampaign(0, 30, efficacy=0.0)
+        program = VaccinationProgram([campaign])
+        self.sim.set_vaccination(program)
+        self.sim.run_simulation(3)
+        self.assertEqual(campaign.doses_given, 29)
+        self.assertEqual(program.protected, 0)
+        self.assertEqual(self.vaccinated(), set())
+
+    def test_fast_forward_reaches_campaign(self):
+        histories = []
+        for skip in (True, False):
+            self.sim.setup_simulation(SimulationParameters(10, 10, 10, 'Flu', 0.0, 1, 2), seed=3)
+            self.sim.skip_quiescent = skip
+            self.sim.set_vaccination(VaccinationProgram([VaccinationCampaign(5, 10, end_day=7)]))
+            self.sim.run_simulation(20)
+            histories.append(self.sim.stats.get_list_report())
+        self.assertEqual(histories[0], histories[1])
+        self.assertEqual(histories[0][2][4:7], [0, 10, 20])
+
+    def test_invalid_campaign(self):
+        with self.assertRaises(ValueError):
+            VaccinationCampaign(0, 10, priority='height')
+        with self.assertRaises(ValueError):
+            VaccinationCampaign(0, 10, efficacy=1.5)
+        with self.assertRaises(RuntimeError):
+            VaccinationProgram([VaccinationCampaign(0, 1)]).vaccinate(0, None, None)
+
+
+class TestOutputWriters(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sim = Simulation()
+        self.sim.setup_simulation(SimulationParameters(5, 5, 5, 'Flu', 0.5, 1, 2))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_csv_writer(self):
+        self.sim.add_writer(CsvWriter(self.path('out.csv'), by_group=True, buffer_size=4))
+        self.sim.run_simulation(10)
+        self.sim.close_writers()
+        with open(self.path('out.csv'), newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[0][:4], ['day', 'susceptible', 'infected', 'recovered'])
+        last = [int(x) for x in rows[-1]]
+        self.assertEqual(last[0], 10)
+        self.assertEqual(last[1:4], [self.sim.stats.s_history[-1], self.sim.stats.i_history[-1],
+                                     self.sim.stats.r_history[-1]])
+        self.assertEqual(sum(last[4:]), 15)
+
+    def test_jsonl_writer(self):
+        with JsonLinesWriter(self.path('out.jsonl')) as writer:
+            writer.write_day(1, (3, 2, 1))
+        with open(self.path('out.jsonl')) as f:
+            self.assertEqual(json.loads(f.readline()),
+                             {'day': 1, 'susceptible': 3, 'infected': 2, 'recovered': 1})
+
+    def test_npy_writer_append(self):
+        with NpyWriter(self.path('out.npy'), buffer_size=2) as writer:
+            for day in range(5):
+                writer.write_day(day, (day, 0, 0))
+        with NpyWriter(self.path('out.npy'), append=True) as writer:
+            writer.write_day(5, (5, 0, 0))
+        data = np.load(self.path('out.npy'))
+        self.assertEqual(data.shape, (6, 4))
+        self.assertEqual(list(data[:, 0]), list(range(6)))
+
+    def test_close_twice_keeps_data(self):
+        with CsvWriter(self.path('out.csv')) as writer:
+            self.sim.add_writer(writer)
+            self.sim.run_simulation(10)
+            self.sim.close_writers()
+        writer.flush()
+        with open(self.path('out.csv'), newline='') as f:
+            self.assertEqual(len(list(csv.reader(f))), 11)
+        with self.assertRaises(RuntimeError):
+            writer.write_day(11, (1, 2, 3))
+
+    def test_append_checks_columns(self):
+        for writer_class, name in ((CsvWriter, 'out.csv'), (JsonLinesWriter, 'out.jsonl')):
+            with writer_class(self.path(name)) as writer:
+                writer.write_day(1, (3, 2, 1))
+            with self.assertRaises(ValueError):
+                writer_class(self.path(name), by_group=True, append=True).flush()
+            with writer_class(self.path(name), append=True) as writer:
+                writer.write_day(2, (3, 2, 1))
+            with open(self.path(name)) as f:
+                self.assertEqual(len(f.readlines()), 3 if writer_class is CsvWriter else 2)
+
+
+class TestIterSteps(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.sim.setup_simulation(SimulationParameters(20, 20, 20, 'Flu', 0.5, 1, 2))
+
+    def test_iter_steps_records(self):
+        records = list(self.sim.iter_steps(5))
+        self.assertEqual([r.day for r in records], [1, 2, 3, 4, 5])
+        self.assertEqual(records[-1].infected, self.sim.stats.i_history[-1])
+        self.assertEqual(records[-1].population_size, 60)
+
+    def test_stops_on_no_infections(self):
+        # Without transmission only patient zero is ever infected, so the run stops after the first day
+        self.sim.setup_simulation(SimulationParameters(20, 20, 20, 'Flu', 0.0, 1, 2))
+        days = self.sim.run_simulation(100, [NoInfections(ignore_patient_zero=True)])
+        self.assertEqual(days, 1)
+        self.assertEqual(len(self.sim.stats.i_history), 1)
+
+    def test_attack_rate_reached(self):
+        condition = AttackRateReached(0.5)
+        record = StepRecord(day=3, susceptible=5, infected=3, recovered=2,
+                            new_infections=1, cumulative_infections=5)
+        self.assertTrue(condition.should_stop(record))
+
+    def test_peak_passed(self):
+        condition = PeakPassed(patience=2)
+        stops = [condition.should_stop(StepRecord(d, 0, i, 0, 0, 0))
+                 for d, i in enumerate([1, 4, 6, 5, 4, 3])]
+        self.assertEqual(stops, [False, False, False, False, True, True])
+        self.assertEqual(condition.peak_day, 2)
+
+
+class TestFastForward(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.sim.setup_simulation(SimulationParameters(10, 10, 10, 'Flu', 0.0, 1, 2))
+
+    def test_skips_days_without_transmission(self):
+        with mock.patch.object(self.sim, 'simulate_step', wraps=self.sim.simulate_step) as step:
+            self.assertEqual(self.sim.run_simulation(1000), 1000)
+        self.assertEqual(step.call_count, 0)
+        self.assertEqual(self.sim.current_time, 1000)
+        self.assertEqual(self.sim.stats.i_history, [1] * 1000)
+        self.assertEqual(self.sim.stats.s_history, [29] * 1000)
+
+    def test_jumps_to_end_of_immunity(self):
+        pop = self.sim.population
+        self.sim.disease.transmission_rate = 0.5
+        patient_zero = pop.infectious_time == 0
+        pop.infectious_time[~patient_zero] = 0
+        pop.recovery_time[~patient_zero] = 5
+        with mock.patch.object(self.sim, 'simulate_step', wraps=self.sim.simulate_step) as step:
+            self.sim.run_simulation(100)
+        # Days 0-4 spread nothing (no susceptible persons), day 94 records the first susceptible persons
+        self.assertLess(step.call_count, 20)
+        self.assertEqual(self.sim.stats.s_history[:94], [0] * 94)
+        self.assertEqual(self.sim.stats.s_history[94], 29)
+
+    def test_matches_step_by_step_records(self):
+        records = list(self.sim.iter_steps(50, [NoInfections()]))
+        self.assertEqual(len(records), 50)
+        self.sim.skip_quiescent = False
+        self.sim.run_simulation(10)
+        self.assertEqual(len(self.sim.stats.i_history), 60)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.params = SimulationParameters(10, 10, 10, 'Flu', 0.5, 1, 2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hit_returns_same_histories(self):
+        cache = ResultCache(self.tmp.name)
+        first = cache.run(self.params, 20, seed=3)
+        with mock.patch.object(Simulation, 'run_simulation') as run:
+            second = cache.run(self.params, 20, seed=3)
+        run.assert_not_called()
+        self.assertEqual(second.get_list_report(), first.get_list_report())
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_seeded_runs_are_reproducible(self):
+        cache = ResultCache(self.tmp.name)
+        self.assertNotEqual(cache.key(self.params, 1, 20), cache.key(self.params, 2, 20))
+        first = cache.run(self.params, 20, seed=5)
+        sim = Simulation()
+        sim.setup_simulation(self.params, seed=5)
+        sim.run_simulation(20)
+        self.assertEqual(sim.stats.get_list_report(), first.get_list_report())
+
+    def test_numpy_values_in_key(self):
+        cache = ResultCache(self.tmp.name)
+        params = dataclasses.replace(self.params, young_population=np.int64(10), transmission_rate=np.float64(0.5))
+        self.assertEqual(cache.key(params, np.int32(3), np.int64(5)), cache.key(self.params, 3, 5))
+        with self.assertRaises(TypeError):
+            cache.key(self.params, object(), 5)
+
+    def test_unseeded_runs_are_not_cached(self):
+        cache = ResultCache(self.tmp.name)
+        cache.run(self.params, 10, None)
+        cache.run(self.params, 10, None)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_evicted_while_reading(self):
+        cache = ResultCache(self.tmp.name)
+        cache.run(self.params, 5, seed=1)
+        key = cache.key(self.params, 1, 5)
+        with mock.patch('os.utime', side_effect=FileNotFoundError):
+            self.assertIsNone(cache.get(key))
+
+    def test_eviction(self):
+        cache = ResultCache(self.tmp.name, max_bytes=1)
+        cache.run(self.params, 5, seed=1)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+class TestSimulationService(unittest.TestCase):
+    def setUp(self):
+        self.server = SimulationServer(('127.0.0.1', 0), workers=1)
+        self.server.start()
+        self.client = SimulationClient(self.server.address)
+        self.params = SimulationParameters(10, 10, 10, 'Flu', 0.5, 1, 2)
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def test_streams_daily_records(self):
+        job = self.client.submit(self.params, 10, seed=4)
+        records = list(job)
+        self.assertEqual([r.day for r in records], list(range(1, 11)))
+        self.assertEqual(job.status, 'done')
+        local = Simulation()
+        local.setup_simulation(self.params, seed=4)
+        local.run_simulation(10)
+        self.assertEqual([r.infected for r in records], local.stats.i_history)
+
+    def test_cancel_pending_and_running(self):
+        running = self.client.submit(self.params, 10**6, engine='stepwise')
+        pending = self.client.submit(self.params, 10)
+        self.assertTrue(self.client.cancel(pending.id))
+        self.assertEqual(list(pending), [])
+        self.assertEqual(pending.status, 'cancelled')
+        self.assertTrue(self.client.cancel(running.id))
+        for _ in running:
+            pass
+        self.assertEqual(running.status, 'cancelled')
+        self.assertFalse(self.client.cancel(running.id))
+
+    def test_rejects_invalid_job(self):
+        with self.assertRaises(RuntimeError):
+            self.client.submit(self.params, 10, engine='warp')
+
+    def test_disconnect_cancels_job(self):
+        request = {"op": "submit", "params": dataclasses.asdict(self.params), "days": 10**6, "engine": "stepwise"}
+        with socket.create_connection(self.server.address) as connection:
+            connection.sendall((json.dumps(request) + "\n").encode())
+            with connection.makefile("r") as reader:
+                reader.readline()
+        # The only worker is released for the next job
+        job = self.client.submit(self.params, 5, seed=1)
+        self.assertEqual(len(list(job)), 5)
+        self.assertEqual(job.status, 'done')
+
+    def test_crashed_worker_fails_job_and_is_replaced(self):
+        job = self.client.submit(self.params, 10**6, engine='stepwise')
+        next(iter(job))
+        self.server._workers[0].process.kill()
+        for _ in job:
+            pass
+        self.assertEqual(job.status, 'failed')
+        job = self.client.submit(self.params, 5, seed=1)
+        self.assertEqual(len(list(job)), 5)
+        self.assertEqual(job.status, 'done')
+
+    def test_keeps_files_at_socket_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'service')
+            with open(path, 'w') as file:
+                file.write('data')
+            with self.assertRaises(OSError):
+                SimulationServer(path, workers=1)
+            with open(path) as file:
+                self.assertEqual(file.read(), 'data')
+
+
+class TestCalibration(unittest.TestCase):
+    def setUp(self):
+        self.params = SimulationParameters(20, 20, 20, 'Flu', 0.3, 2, 4)
+        sim = Simulation()
+        sim.setup_simulation(self.params, seed=11)
+        sim.run_simulation(30)
+        self.target = sim.stats.i_history
+
+    def test_distance_exceeded(self):
+        condition = DistanceExceeded([1, 1, 1], threshold=5)
+        self.assertFalse(condition.should_stop(StepRecord(1, 0, 3, 0, 0, 0)))
+        self.assertTrue(condition.should_stop(StepRecord(2, 0, 3, 0, 0, 0)))
+        self.assertEqual(condition.distance, 8)
+
+    def test_rejects_early_and_accepts_close_candidates(self):
+        calibration = AbcCalibration(self.params, self.target, threshold=2000, workers=1)
+        result = calibration.run(12, seed=2)
+        self.assertEqual(result.evaluated, 12)
+        self.assertLess(result.days_simulated, result.days_full)
+        for params, distance in result.accepted:
+            self.assertLessEqual(distance, 2000)
+        self.assertEqual(len(result.posterior('transmission_rate')), len(result.accepted))
+
+    def test_unknown_parameter(self):
+        with self.assertRaises(ValueError):
+            AbcCalibration(self.params, self.target, 10, priors={'speed': None})
+
+
+class TestSensitivity(unittest.TestCase):
+    params = SimulationParameters(10, 10, 10, 'Flu', 0.3, 1, 3)
+    bounds = {'transmission_rate': (0.1, 0.5), 'infectious_period': (1, 3)}
+
+    def rate(self, simulation):
+        return simulation.disease.transmission_rate
+
+    def test_sobol_indices_of_linear_metric(self):
+        analysis = SensitivityAnalysis(self.params, 1, self.bounds, metrics={'rate': self.rate}, workers=1)
+        results = list(analysis.iter_sobol(200, batch_size=100))
+        self.assertEqual([result.samples for result in results], [100, 200])
+        first, total = results[-1].first_order['rate'], results[-1].total['rate']
+        np.testing.assert_allclose(first, [1, 0], atol=0.15)
+        np.testing.assert_allclose(total, [1, 0], atol=0.15)
+        self.assertEqual(total[1], 0)  # The period does not change the metric at all
+
+    def test_morris_effects_of_linear_metric(self):
+        analysis = SensitivityAnalysis(self.params, 1, self.bounds, metrics={'rate': self.rate}, workers=1)
+        result = analysis.morris(6, levels=4)
+        np.testing.assert_allclose(result.mu_star['rate'], [0.4, 0.0])
+        np.testing.assert_allclose(result.sigma['rate'], [0.0, 0.0], atol=1e-9)
+
+    def test_identical_points_are_simulated_once(self):
+        bounds = {'incubation_period': (0, 1), 'infectious_period': (1, 2)}
+        analysis = SensitivityAnalysis(self.params, 5, bounds, workers=1)
+        result = analysis.sobol(10)
+        self.assertLessEqual(result.evaluations, 4)
+        self.assertEqual(analysis.cache_hits + analysis.evaluations, 10 * 4)
+
+    def test_unknown_parameter(self):
+        with self.assertRaises(ValueError):
+            SensitivityAnalysis(self.params, 5, {'speed': (0, 1)})
+        with self.assertRaises(ValueError):
+            SensitivityAnalysis(self.params, 5, self.bounds, workers=1).morris(2, levels=3)
+
+
+class TestScenarioComparison(unittest.TestCase):
+    def setUp(self):
+        self.params = SimulationParameters(30, 30, 30, 'Flu', 0.3, 2, 4)
+
+    def test_same_seed_shares_population_and_patient_zero(self):
+        a, b = Simulation(), Simulation()
+        a.setup_simulation(self.params, seed=9)
+        b.setup_simulation(SimulationParameters(30, 30, 30, 'Flu', 0.9, 2, 4), seed=9)
+        self.assertTrue((a.population.susceptibility == b.population.susceptibility).all())
+        self.assertTrue((a.population.infectious_time == b.population.infectious_time).all())
+
+    def test_keyed_draws_do_not_shift(self):
+        a, b = RandomStreams(4), RandomStreams(4)
+        b.keyed_uniforms(CONTACTS, 3, np.arange(50), 0)  # Further draws do not move the others
+        np.testing.assert_array_equal(a.keyed_uniforms(TRANSMISSION, 2, 7, np.arange(5)),
+                                      b.keyed_uniforms(TRANSMISSION, 2, 7, np.arange(5)))
+        self.assertFalse((a.keyed_uniforms(TRANSMISSION, 2, 7, np.arange(5))
+                          == RandomStreams(5).keyed_uniforms(TRANSMISSION, 2, 7, np.arange(5))).any())
+        with self.assertRaises(RuntimeError):
+            RandomStreams().keyed_uniforms(CONTACTS, 0, 0, 0)
+
+    def test_fewer_contacts_are_a_prefix(self):
+        streams = RandomStreams(4)
+        pop = Population(100, 100, 100, rng=1)
+        person = pop.persons[5]
+        person.activity_level = 20
+        draws = lambda persons, slots: streams.keyed_uniforms(CONTACTS, 1, persons, slots)
+        _, many = pop.contact_ids([5, 6], draws)
+        person.distancing_factor = 0.5
+        offsets, few = pop.contact_ids([5, 6], draws)
+        self.assertEqual(len(set(many[:20].tolist())), 20)
+        self.assertEqual(few[:offsets[1]].tolist(), many[:10].tolist())
+        self.assertEqual(few[offsets[1]:].tolist(), many[20:].tolist())
+
+    def test_identical_scenarios_have_no_difference(self):
+        results = compare_scenarios(Scenario(self.params), Scenario(self.params), 15, replicates=3)
+        self.assertEqual(results['peak_infected'].mean, 0)
+        self.assertEqual(results['attack_rate'].std_error, 0)
+        self.assertFalse(results['attack_rate'].significant)
+
+    def test_attack_rate_ignores_reinfections(self):
+        sim = Simulation()
+        sim.setup_simulation(SimulationParameters(50, 50, 50, 'Flu', 0.8, 1, 5), seed=3)
+        sim.run_simulation(400)
+        self.assertGreater(sim.cumulative_infections, 150)
+        self.assertLessEqual(attack_rate(sim), 1.0)
+        self.assertEqual(attack_rate(sim), sim.ever_infected.sum() / 150)
+
+    def test_distancing_scenario(self):
+        distancing = Scenario(self.params, lambda sim: sim.toggle_social_distancing(True))
+        results = compare_scenarios(Scenario(self.params), distancing, 15, replicates=3)
+        self.assertEqual(results['peak_infected'].replicates, 3)
+        self.assertLessEqual(results['peak_infected'].ci_low, results['peak_infected'].ci_high)
+
 
 if __name__ == '__main__':
     unittest.main()